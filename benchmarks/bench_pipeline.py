@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Benchmark full poll cycles of PolymarketMonitor against a local mock of the
+data-api and Gamma API, and save the results as JSON
+
+Each cycle appends --trades-per-cycle new trades to the mock feed, then runs
+poll_trades() and process_trades() exactly as the monitor loop does (without
+the sleep). The mock runs in a separate process so its memory and CPU are not
+counted against the monitor.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--cycles 20] [--trades-per-cycle 200] [--latency 0.02] ...
+    python benchmarks/bench_pipeline.py --baseline benchmarks/results/previous.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+import mock_api  # noqa: E402
+
+# Metrics compared against a baseline: (path in the summary, higher is better)
+COMPARED = (
+    (('cycle_time', 'avg'), False),
+    (('cycle_time', 'p95'), False),
+    (('api_calls_per_cycle', 'total'), False),
+    (('market_cache', 'hit_ratio'), True),
+    (('trader_cache', 'hit_ratio'), True),
+    (('peak_rss_mb',), False),
+    (('output_bytes',), False)
+)
+
+
+def free_port():
+    """Ask the OS for an unused local port"""
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def fetch_json(url):
+    """GET a mock control endpoint"""
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.loads(response.read())
+
+
+def wait_for(url, timeout=10.0):
+    """Wait until the mock answers"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            return fetch_json(url)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+def count_calls(stats):
+    """Total requests per endpoint from the mock counters"""
+    return {endpoint: sum(statuses.values()) for endpoint, statuses in stats.items()}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def git_version():
+    """Short description of the checked-out commit, if available"""
+    try:
+        return subprocess.run(
+            ['git', 'describe', '--always', '--dirty'], cwd=os.path.dirname(BENCH_DIR),
+            capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(args):
+    """Start the mock, drive the monitor through the poll cycles and collect results"""
+    data_port, gamma_port = free_port(), free_port()
+    mock = multiprocessing.Process(target=mock_api.serve, kwargs=dict(
+        data_port=data_port, gamma_port=gamma_port, latency=args.latency,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        wallets=args.wallets, markets=args.markets, initial_trades=args.trades_per_cycle, seed=args.seed
+    ), daemon=True)
+    mock.start()
+    control = f"http://127.0.0.1:{data_port}"
+
+    output_dir = tempfile.mkdtemp(prefix='polymarket-bench-')
+    os.environ.update({
+        'DATA_API_URL': control,
+        'GAMMA_API_URL': f"http://127.0.0.1:{gamma_port}",
+        'STATE_STORE': 'none',
+        'HTTP_BACKOFF_BASE': os.getenv('HTTP_BACKOFF_BASE', '0.05'),
+        'DATA_API_RATE_LIMIT': os.getenv('DATA_API_RATE_LIMIT', '1000'),
+        'GAMMA_API_RATE_LIMIT': os.getenv('GAMMA_API_RATE_LIMIT', '1000')
+    })
+
+    import logging
+    import polymarket_monitor as pm
+
+    # Trade banners would flood the live logs
+    if not args.log_trades:
+        for trade_logger in (pm.logger, pm.unusual_logger, pm.tuna_logger, pm.whale_logger, pm.flow_logger):
+            trade_logger.setLevel(logging.WARNING)
+
+    try:
+        wait_for(f"{control}/__stats")
+        monitor = pm.PolymarketMonitor(threshold=args.threshold, data_dir=output_dir)
+        cycles = []
+        try:
+            for cycle in range(args.cycles):
+                if cycle:
+                    fetch_json(f"{control}/__advance?count={args.trades_per_cycle}")
+                before = count_calls(fetch_json(f"{control}/__stats"))
+                start = time.perf_counter()
+                trades = monitor.poll_trades()
+                new_trades = monitor.process_trades(trades) if trades else 0
+                elapsed = time.perf_counter() - start
+                after = count_calls(fetch_json(f"{control}/__stats"))
+                calls = {endpoint: count - before.get(endpoint, 0) for endpoint, count in after.items()}
+                cycles.append({
+                    'cycle': cycle,
+                    'seconds': round(elapsed, 4),
+                    'fetched': len(trades),
+                    'new_trades': new_trades,
+                    'api_calls': {endpoint: count for endpoint, count in calls.items() if count}
+                })
+                print(f"  cycle {cycle:>3}: {elapsed:7.3f}s  {len(trades):>5} fetched  {new_trades:>5} new  "
+                      f"{sum(calls.values()):>4} API calls")
+            # With PIPELINE_MODE=staged, finish the queued trades before reading the counters
+            monitor.drain_pipeline()
+            monitor.sink.flush()
+            sink_stats = monitor.sink.get_stats()
+            summary_sources = {
+                'market_cache': monitor.market_cache.get_stats(),
+                'trader_cache': monitor.trader_cache.get_stats(),
+                'transport': monitor.transport.get_stats(),
+                'stages': monitor.stage_timer.get_stats(),
+                'logged_trades': monitor.stage_timer.get_stats().get('log', {}).get('count', 0)
+            }
+        finally:
+            monitor.close()
+        mock_stats = fetch_json(f"{control}/__stats")
+    finally:
+        mock.terminate()
+        mock.join(5)
+
+    output_bytes = sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(output_dir) for name in names
+    )
+    shutil.rmtree(output_dir, ignore_errors=True)
+
+    # Cycle 0 fills the cold caches; steady-state figures leave it out when there are more cycles
+    steady = cycles[1:] if len(cycles) > 1 else cycles
+    times = [c['seconds'] for c in steady]
+    endpoints = sorted({endpoint for c in steady for endpoint in c['api_calls']})
+    calls_per_cycle = {
+        endpoint: round(sum(c['api_calls'].get(endpoint, 0) for c in steady) / len(steady), 2)
+        for endpoint in endpoints
+    }
+    calls_per_cycle['total'] = round(sum(sum(c['api_calls'].values()) for c in steady) / len(steady), 2)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+    return {
+        'label': args.label,
+        'version': git_version(),
+        'date': datetime.now().isoformat(),
+        'python': sys.version.split()[0],
+        'config': {
+            'cycles': args.cycles,
+            'trades_per_cycle': args.trades_per_cycle,
+            'threshold': args.threshold,
+            'latency': args.latency,
+            'error_rate': args.error_rate,
+            'throttle_rate': args.throttle_rate,
+            'wallets': args.wallets,
+            'markets': args.markets,
+            'seed': args.seed
+        },
+        'summary': {
+            'cycle_time': {
+                'avg': round(statistics.mean(times), 4),
+                'p50': round(percentile(times, 0.5), 4),
+                'p95': round(percentile(times, 0.95), 4),
+                'max': round(max(times), 4),
+                'first': cycles[0]['seconds']
+            },
+            'api_calls_per_cycle': calls_per_cycle,
+            'market_cache': summary_sources['market_cache'],
+            'trader_cache': summary_sources['trader_cache'],
+            'logged_trades': summary_sources['logged_trades'],
+            'peak_rss_mb': round(peak_rss_mb, 1),
+            'output_bytes': output_bytes,
+            'sink_bytes': sink_stats['bytes'],
+            'transport': summary_sources['transport'],
+            'stages': summary_sources['stages'],
+            'mock_responses': mock_stats
+        },
+        'cycles': cycles
+    }
+
+
+def lookup(summary, path):
+    """Value at a path in the summary, or None"""
+    value = summary
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def compare(results, baseline):
+    """Print the change of the key metrics against a baseline run"""
+    print(f"\nAgainst baseline {baseline.get('label') or ''} ({baseline.get('version')}, {baseline.get('date')}):")
+    for path, higher_is_better in COMPARED:
+        new, old = lookup(results['summary'], path), lookup(baseline['summary'], path)
+        if new is None or old is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < 0 if higher_is_better else change > 0
+        flag = '  <-- worse' if worse and abs(change) >= 10 else ''
+        print(f"  {'.'.join(path):<28}{old:>14,.4g} -> {new:<14,.4g}{change:+7.1f}%{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--cycles', type=int, default=20, help='Poll cycles to run')
+    parser.add_argument('--trades-per-cycle', type=int, default=200, help='New trades in the feed per cycle')
+    parser.add_argument('--threshold', type=float, default=5000, help='Minimum trade value in USD')
+    mock_api.add_arguments(parser)
+    parser.add_argument('--label', default='', help='Name stored with the results')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/pipeline-<date>.json)')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--log-trades', action='store_true', help='Write trade banners to the logs as well')
+    args = parser.parse_args()
+
+    print(f"Running {args.cycles} poll cycles, {args.trades_per_cycle} new trades each "
+          f"(latency {args.latency}s, {args.error_rate:.0%} errors, {args.throttle_rate:.0%} 429s)")
+    results = run(args)
+    summary = results['summary']
+
+    print(f"\nCycle time: {summary['cycle_time']['avg']:.3f}s avg, {summary['cycle_time']['p95']:.3f}s p95 "
+          f"(cold first cycle {summary['cycle_time']['first']:.3f}s)")
+    print("API calls per cycle: " + ", ".join(f"{k} {v}" for k, v in summary['api_calls_per_cycle'].items()))
+    print(f"Market cache hit ratio {summary['market_cache']['hit_ratio']:.1%}, "
+          f"trader cache hit ratio {summary['trader_cache']['hit_ratio']:.1%}")
+    print(f"Logged trades {summary['logged_trades']}, output {summary['output_bytes']:,} bytes, "
+          f"peak RSS {summary['peak_rss_mb']:.1f} MB")
+
+    output = args.output or os.path.join(
+        BENCH_DIR, 'results', f"pipeline-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Benchmark trade ingestion: JSON decoding, parsing into trade records,
+per-trade and batch (columnar) classification, with memory held per batch of trades
+
+Usage:
+    python benchmarks/bench_trade_records.py [--trades 10000] [--batches 20]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from polymarket_monitor import BatchClassifier, np, orjson, parse_trades  # noqa: E402
+
+THRESHOLD = 5000
+
+
+def make_payload(count, wallets=2000, markets=300, seed=1):
+    """Build a /trades response body with realistic repetition of wallets and markets"""
+    rng = random.Random(seed)
+    wallet_ids = [f"0x{rng.getrandbits(160):040x}" for _ in range(wallets)]
+    market_ids = [f"0x{rng.getrandbits(256):064x}" for _ in range(markets)]
+    trades = []
+    for i in range(count):
+        market = rng.randrange(markets)
+        wallet = rng.randrange(wallets)
+        trades.append({
+            'proxyWallet': wallet_ids[wallet],
+            'side': rng.choice(('BUY', 'SELL')),
+            'asset': f"{market}{rng.randrange(2)}" * 8,
+            'conditionId': market_ids[market],
+            'size': round(rng.lognormvariate(4, 2), 2),
+            'price': round(rng.uniform(0.01, 0.99), 3),
+            'timestamp': 1760000000 - i,
+            'title': f"Will market {market} resolve yes?",
+            'slug': f"market-{market}",
+            'icon': f"https://example.com/icons/{market}.png",
+            'eventSlug': f"event-{market // 3}",
+            'outcome': rng.choice(('Yes', 'No')),
+            'name': f"trader-{wallet}",
+            'pseudonym': 'Some-Pseudonym',
+            'transactionHash': f"0x{rng.getrandbits(256):064x}"
+        })
+    return json.dumps(trades).encode()
+
+
+def classify_dicts(trades):
+    """Threshold check on raw dicts; the value is parsed again at logging time"""
+    found = 0
+    for trade in trades:
+        if float(trade.get('size', 0)) * float(trade.get('price', 0)) >= THRESHOLD:
+            float(trade.get('size', 0)) * float(trade.get('price', 0))
+            found += 1
+    return found
+
+
+def classify_records(records):
+    """Threshold check on trade records using the precomputed value"""
+    found = 0
+    for record in records:
+        if record.value >= THRESHOLD:
+            record.value
+            found += 1
+    return found
+
+
+def timed(func, *args, batches):
+    """Best per-batch time in milliseconds and the last result"""
+    best = float('inf')
+    result = None
+    for _ in range(batches):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def held_memory(build):
+    """Bytes still allocated by the object that build() returns"""
+    tracemalloc.start()
+    obj = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del obj
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--trades', type=int, default=10000, help='Trades per batch')
+    parser.add_argument('--batches', type=int, default=20, help='Timed repetitions (best is reported)')
+    args = parser.parse_args()
+
+    payload = make_payload(args.trades)
+    scale = 10000 / args.trades
+    print(f"{args.trades} trades per batch, {len(payload) / 1024:.0f} KB payload, best of {args.batches}\n")
+
+    decode_ms, dicts = timed(json.loads, payload, batches=args.batches)
+    rows = [('decode (json)', decode_ms)]
+    if orjson is not None:
+        rows.append(('decode (orjson)', timed(orjson.loads, payload, batches=args.batches)[0]))
+    else:
+        rows.append(('decode (orjson)', None))
+
+    parse_ms, records = timed(parse_trades, dicts, batches=args.batches)
+    rows.append(('parse into TradeRecord', parse_ms))
+
+    dict_ms, dict_found = timed(classify_dicts, dicts, batches=args.batches)
+    record_ms, record_found = timed(classify_records, records, batches=args.batches)
+    assert dict_found == record_found
+    rows.append(('classify dicts', dict_ms))
+    rows.append(('classify records', record_ms))
+
+    for backend in ('numpy', 'python'):
+        if backend == 'numpy' and np is None:
+            rows.append(('  masks (numpy)', None))
+            continue
+        classifier = BatchClassifier(THRESHOLD, 5000, 100000, 100000, use_numpy=backend == 'numpy')
+        columns_ms, columns = timed(classifier.columns, records, batches=args.batches)
+        mask_ms, (indices, _) = timed(classifier.classify, columns, batches=args.batches)
+        assert len(indices) == record_found
+        rows.append((f'  to columns ({backend})', columns_ms))
+        rows.append((f'  masks ({backend})', mask_ms))
+
+    print(f"{'stage':<26}{'ms/batch':>10}{'ms/10k':>10}")
+    for label, ms in rows:
+        if ms is None:
+            print(f"{label:<26}{'n/a':>10}{'n/a':>10}   (not installed)")
+        else:
+            print(f"{label:<26}{ms:>10.2f}{ms * scale:>10.2f}")
+    print(f"\n{record_found} of {args.trades} trades at or above ${THRESHOLD:,}")
+
+    dict_bytes = held_memory(lambda: json.loads(payload))
+    record_bytes = held_memory(lambda: parse_trades(json.loads(payload)))
+    print(f"\n{'held memory':<26}{'KB/batch':>10}{'KB/10k':>10}")
+    for label, size in (('dicts', dict_bytes), ('TradeRecord', record_bytes)):
+        print(f"{label:<26}{size / 1024:>10.0f}{size / 1024 * scale:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Polymarket data-api (/trades, global and user=) and
+Gamma API (/markets), with configurable latency, error rate, 429s and trade volume
+
+The data-api server also streams new trades over a WebSocket at /ws (each
+trade sent as {"topic": "activity", "type": "trades", "payload": trade}) and
+exposes control endpoints:
+    /__advance?count=N   append N new trades to the global feed
+    /__stats             request counters by endpoint and status
+    /__ws?drop=1         close every open WebSocket connection
+    /__ws?accept=0|1     refuse or accept new WebSocket connections
+
+Usage:
+    python benchmarks/mock_api.py [--data-port 8701] [--gamma-port 8702] [--latency 0.02] ...
+
+Then point the monitor at it:
+    DATA_API_URL=http://127.0.0.1:8701 GAMMA_API_URL=http://127.0.0.1:8702 python polymarket_monitor.py
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import random
+import select
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class MockMarketData:
+    """
+    Deterministic synthetic trades, wallet histories and markets
+
+    The global feed grows only when advance() is called, so a benchmark decides
+    exactly how many new trades each poll cycle sees. Wallet histories combine
+    the wallet's trades in the feed with an older, seeded backlog whose size
+    varies per wallet (most wallets are small, a few have thousands of trades).
+    """
+
+    def __init__(self, wallets=2000, markets=300, seed=1, start_time=1760000000):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.wallets = [f"0x{self.rng.getrandbits(160):040x}" for _ in range(wallets)]
+        self.markets = [f"0x{self.rng.getrandbits(256):064x}" for _ in range(markets)]
+        self.market_index = {condition_id: i for i, condition_id in enumerate(self.markets)}
+        self.start_time = start_time
+        self.feed = []
+        self.feed_by_wallet = {}
+        self.backlogs = {}
+        self.lock = threading.Lock()
+        self.ws_accept = True
+        self.ws_generation = 0
+
+    def make_trade(self, rng, wallet, timestamp):
+        """Build one API-style trade"""
+        market = rng.randrange(len(self.markets))
+        return {
+            'proxyWallet': wallet,
+            'side': rng.choice(('BUY', 'SELL')),
+            'asset': f"{market}{rng.randrange(2)}" * 8,
+            'conditionId': self.markets[market],
+            'size': round(rng.lognormvariate(4, 2.2), 2),
+            'price': round(rng.uniform(0.01, 0.99), 3),
+            'timestamp': timestamp,
+            'title': f"Will market {market} resolve yes?",
+            'slug': f"market-{market}",
+            'icon': f"https://example.com/icons/{market}.png",
+            'eventSlug': f"event-{market // 3}",
+            'outcome': rng.choice(('Yes', 'No')),
+            'name': f"trader-{wallet[2:10]}",
+            'pseudonym': 'Mock-Trader',
+            'transactionHash': f"0x{rng.getrandbits(256):064x}"
+        }
+
+    def advance(self, count):
+        """Append count new trades to the global feed, a few per second of trade time"""
+        with self.lock:
+            for _ in range(count):
+                timestamp = self.start_time + len(self.feed) // 4
+                # A small group of active wallets makes up 30% of the volume
+                if self.rng.random() < 0.3:
+                    wallet = self.wallets[self.rng.randrange(max(1, len(self.wallets) // 20))]
+                else:
+                    wallet = self.rng.choice(self.wallets)
+                trade = self.make_trade(self.rng, wallet, timestamp)
+                self.feed.append(trade)
+                self.feed_by_wallet.setdefault(wallet, []).append(trade)
+            return len(self.feed)
+
+    def recent_trades(self, limit, offset, min_cash=None):
+        """Newest-first page of the global feed, optionally filtered by cash value"""
+        with self.lock:
+            page = []
+            skipped = 0
+            for trade in reversed(self.feed):
+                if min_cash is not None and trade['size'] * trade['price'] < min_cash:
+                    continue
+                if skipped < offset:
+                    skipped += 1
+                    continue
+                page.append(trade)
+                if len(page) >= limit:
+                    break
+            return page
+
+    def backlog(self, wallet):
+        """Older history of a wallet, generated once from a wallet-specific seed"""
+        with self.lock:
+            trades = self.backlogs.get(wallet)
+            if trades is None:
+                digest = hashlib.sha256(f"{self.seed}:{wallet}".encode()).digest()
+                rng = random.Random(digest)
+                count = min(int(rng.paretovariate(0.6)) - 1, 5000)
+                trades = [
+                    self.make_trade(rng, wallet, self.start_time - 60 * (i + 1))
+                    for i in range(count)
+                ]
+                self.backlogs[wallet] = trades
+            return trades
+
+    def user_trades(self, wallet, limit, offset):
+        """Newest-first page of a wallet's history"""
+        with self.lock:
+            recent = list(reversed(self.feed_by_wallet.get(wallet, [])))
+        history = recent + self.backlog(wallet)
+        return history[offset:offset + limit]
+
+    def market(self, condition_id):
+        """Gamma market object, or None for an unknown condition ID"""
+        index = self.market_index.get(condition_id)
+        if index is None:
+            return None
+        return {
+            'conditionId': condition_id,
+            'question': f"Will market {index} resolve yes?",
+            'slug': f"market-{index}",
+            'category': ('Politics', 'Sports', 'Crypto', 'Economics')[index % 4],
+            'tags': [f"tag-{index % 7}"]
+        }
+
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+
+def ws_frame(opcode, payload=b''):
+    """Encode one final, unmasked server frame"""
+    length = len(payload)
+    if length < 126:
+        header = bytes([0x80 | opcode, length])
+    elif length < 65536:
+        header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, 'big')
+    else:
+        header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, 'big')
+    return header + payload
+
+
+def read_ws_frame(sock):
+    """Read one (masked) client frame as (opcode, payload)"""
+    def read(n):
+        data = b''
+        while len(data) < n:
+            chunk = sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError('connection closed')
+            data += chunk
+        return data
+
+    first, second = read(2)
+    length = second & 0x7F
+    if length == 126:
+        length = int.from_bytes(read(2), 'big')
+    elif length == 127:
+        length = int.from_bytes(read(8), 'big')
+    mask = read(4) if second & 0x80 else b'\0\0\0\0'
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(read(length)))
+    return first & 0x0F, payload
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """Request handler shared by the data-api and Gamma servers"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        server = self.server
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+
+        if url.path == '/__advance':
+            total = server.data.advance(int(params.get('count', ['1'])[0]))
+            return self.send_json(200, {'feed_size': total})
+        if url.path == '/__stats':
+            with server.stats_lock:
+                return self.send_json(200, server.shared_stats)
+        if url.path == '/__ws':
+            if 'accept' in params:
+                server.data.ws_accept = params['accept'][0] == '1'
+            if params.get('drop', ['0'])[0] == '1':
+                server.data.ws_generation += 1
+            return self.send_json(200, {'accept': server.data.ws_accept, 'generation': server.data.ws_generation})
+        if url.path == '/ws':
+            return self.serve_websocket()
+
+        endpoint = self.endpoint(url.path, params)
+        if server.latency > 0:
+            time.sleep(server.latency * server.rng.uniform(0.5, 1.5))
+
+        roll = server.rng.random()
+        if roll < server.throttle_rate:
+            status = 429
+        elif roll < server.throttle_rate + server.error_rate:
+            status = 500
+        else:
+            status = 200
+        with server.stats_lock:
+            counts = server.shared_stats.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+
+        if status == 429:
+            return self.send_json(429, {'error': 'rate limited'}, {'Retry-After': str(server.retry_after)})
+        if status == 500:
+            return self.send_json(500, {'error': 'internal error'})
+
+        limit = int(params.get('limit', ['100'])[0])
+        offset = int(params.get('offset', ['0'])[0])
+        if endpoint == 'markets':
+            markets = [server.data.market(c) for c in params.get('condition_ids', [])]
+            return self.send_json(200, [m for m in markets if m][:limit])
+        if endpoint == 'user_trades':
+            return self.send_json(200, server.data.user_trades(params['user'][0], limit, offset))
+        if endpoint == 'trades':
+            min_cash = None
+            if params.get('filterType', [''])[0] == 'CASH':
+                min_cash = float(params.get('filterAmount', ['0'])[0])
+            return self.send_json(200, server.data.recent_trades(limit, offset, min_cash))
+        return self.send_json(404, {'error': 'not found'})
+
+    def serve_websocket(self):
+        """Upgrade to a WebSocket and push every trade added to the feed from now on"""
+        server = self.server
+        data = server.data
+        key = self.headers.get('Sec-WebSocket-Key')
+        if not data.ws_accept or not key:
+            return self.send_json(503 if key else 400, {'error': 'websocket unavailable'})
+        with server.stats_lock:
+            counts = server.shared_stats.setdefault('ws', {})
+            counts['101'] = counts.get('101', 0) + 1
+
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        self.send_response(101)
+        self.send_header('Upgrade', 'websocket')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Sec-WebSocket-Accept', accept)
+        self.end_headers()
+        self.wfile.flush()
+        self.close_connection = True
+
+        sock = self.connection
+        generation = data.ws_generation
+        with data.lock:
+            position = len(data.feed)
+        try:
+            while data.ws_generation == generation:
+                if select.select([sock], [], [], 0.05)[0]:
+                    opcode, payload = read_ws_frame(sock)
+                    if opcode == 0x8:
+                        sock.sendall(ws_frame(0x8, payload[:2]))
+                        return
+                    if opcode == 0x9:
+                        sock.sendall(ws_frame(0xA, payload))
+                with data.lock:
+                    trades = data.feed[position:]
+                    position = len(data.feed)
+                for trade in trades:
+                    message = {'topic': 'activity', 'type': 'trades', 'payload': trade}
+                    sock.sendall(ws_frame(0x1, json.dumps(message).encode()))
+        except (OSError, ConnectionError):
+            pass
+
+    def endpoint(self, path, params):
+        """Label used for the request counters"""
+        if path.rstrip('/') == '/markets':
+            return 'markets'
+        if path.rstrip('/') == '/trades':
+            return 'user_trades' if 'user' in params else 'trades'
+        return path
+
+
+def make_server(port, data, stats, stats_lock, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+                retry_after=0.1, seed=1):
+    """Build one mock server; data and counters are shared between servers"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockHandler)
+    server.daemon_threads = True
+    server.data = data
+    server.shared_stats = stats
+    server.stats_lock = stats_lock
+    server.latency = latency
+    server.error_rate = error_rate
+    server.throttle_rate = throttle_rate
+    server.retry_after = retry_after
+    server.rng = random.Random(seed + port)
+    return server
+
+
+def serve(data_port=8701, gamma_port=8702, latency=0.0, error_rate=0.0, throttle_rate=0.0,
+          retry_after=0.1, wallets=2000, markets=300, initial_trades=1000, seed=1):
+    """Run the data-api and Gamma mocks until interrupted"""
+    data = MockMarketData(wallets=wallets, markets=markets, seed=seed)
+    data.advance(initial_trades)
+    stats = {}
+    stats_lock = threading.Lock()
+    options = dict(latency=latency, error_rate=error_rate, throttle_rate=throttle_rate,
+                   retry_after=retry_after, seed=seed)
+    servers = [
+        make_server(data_port, data, stats, stats_lock, **options),
+        make_server(gamma_port, data, stats, stats_lock, **options)
+    ]
+    threads = [threading.Thread(target=s.serve_forever, daemon=True) for s in servers]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for server in servers:
+            server.shutdown()
+            server.server_close()
+
+
+def add_arguments(parser):
+    """Mock options shared with the benchmark harness"""
+    parser.add_argument('--latency', type=float, default=0.02, help='Mean response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--throttle-rate', type=float, default=0.01, help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--retry-after', type=float, default=0.1, help='Retry-After seconds sent with a 429')
+    parser.add_argument('--wallets', type=int, default=2000, help='Distinct wallets trading')
+    parser.add_argument('--markets', type=int, default=300, help='Distinct markets traded')
+    parser.add_argument('--seed', type=int, default=1, help='Random seed')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--data-port', type=int, default=8701, help='data-api port')
+    parser.add_argument('--gamma-port', type=int, default=8702, help='Gamma API port')
+    parser.add_argument('--initial-trades', type=int, default=1000, help='Trades in the feed at startup')
+    add_arguments(parser)
+    args = parser.parse_args()
+    print(f"data-api mock on http://127.0.0.1:{args.data_port}, Gamma mock on http://127.0.0.1:{args.gamma_port}")
+    serve(
+        data_port=args.data_port, gamma_port=args.gamma_port, latency=args.latency,
+        error_rate=args.error_rate, throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+        wallets=args.wallets, markets=args.markets, initial_trades=args.initial_trades, seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    main()
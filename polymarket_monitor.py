@@ -5,16 +5,59 @@ Monitors trades on Polymarket and categorizes them by size and trader experience
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+import argparse
 import time
 import json
 import os
+import random
+import select
+import socket
+import ssl
+import threading
+import atexit
+import base64
+import gzip
+import hashlib
+import itertools
+import math
+import multiprocessing
+import queue
+import shutil
+import signal
+import sqlite3
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, List, Optional
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+from urllib.parse import urlparse
 import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import sys
+import bisect
+from array import array
+from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Decoder for API responses: orjson when installed, otherwise the standard library
+json_loads = orjson.loads if orjson is not None else json.loads
 
 # Configure logging
-# Check if running in Docker (data directory exists)
-logs_dir = '/app/logs' if os.path.exists('/app/logs') else 'logs'
+# LOG_DIR overrides the default (/app/logs in Docker, else logs)
+logs_dir = os.getenv('LOG_DIR') or ('/app/logs' if os.path.exists('/app/logs') else 'logs')
 os.makedirs(logs_dir, exist_ok=True)
 
 # Create separate log files for each category
@@ -22,17 +65,215 @@ log_files = {
     'main': os.path.join(logs_dir, 'polymarket_trades.log'),
     'unusual': os.path.join(logs_dir, 'unusual_trades.log'),
     'tuna': os.path.join(logs_dir, 'tuna_trades.log'),
-    'whale': os.path.join(logs_dir, 'whale_trades.log')
+    'whale': os.path.join(logs_dir, 'whale_trades.log'),
+    'flow': os.path.join(logs_dir, 'flow_spike_trades.log')
 }
 
+# Log output settings: format is 'text' (multi-line trade banners), 'compact'
+# (one line per trade) or 'json' (one JSON object per line)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+
+CATEGORY_LOGGERS = ('unusual_trades', 'tuna_trades', 'whale_trades', 'flow_spike_trades')
+
+
+class TradeMessage:
+    """
+    Log message for a detected trade, rendered only when a handler formats it
+    
+    Building the multi-line banner is deferred to the logging thread, and
+    skipped entirely when no handler emits the record.
+    """
+    
+    def __init__(self, record: Dict, label: str):
+        """
+        Initialize the message
+        
+        Args:
+            record: Trade record as written to the JSON output
+            label: Category label (e.g. "WHALE + UNUSUAL")
+        """
+        self.record = record
+        self.label = label
+    
+    def banner(self) -> str:
+        """Render the multi-line text banner"""
+        trade = self.record['trade']
+        trader = self.record['trader']
+        
+        # Build trader display name
+        username = trader.get('username', 'Anonymous')
+        pseudonym = trader.get('pseudonym', '')
+        trader_display = f"{username} ({pseudonym})" if pseudonym else username
+        
+        # Build tags display
+        tags_display = ', '.join(trade['market_tags']) if trade['market_tags'] else 'None'
+        
+        # Format trade count with "500+" indicator if applicable
+        trade_count = trader['total_trades']
+        trade_count_display = f"{trade_count}+" if trader.get('has_more_trades', False) else str(trade_count)
+        partial_note = f" (last {trade_count} trades)" if trader.get('partial') else ''
+        
+        def field(name, default='N/A'):
+            value = trade.get(name)
+            return default if value is None else value
+        
+        flow_display = ''.join(f"\n  - {describe_flow(spike)}" for spike in self.record.get('flow', ()))
+        if flow_display:
+            flow_display = f"\nFlow Spike:{flow_display}\n"
+        
+        return f"""
+{'='*80}
+TRADE DETECTED: ${trade['value']:,.2f} [{self.label}]
+{'='*80}
+Trade Details:
+  - Transaction Hash: {field('transaction_hash')}
+  - Market: {trade['market_title']}
+  - Market ID: {trade['market_id']}
+  - Market Slug: {trade['market_slug']}
+  - Event Slug: {trade['event_slug']}
+  - Category: {trade['market_category']}
+  - Tags: {tags_display}
+  - Outcome: {field('outcome')}
+  - Side: {field('side')}
+  - Size: {field('size', 0)} tokens
+  - Price: ${field('price', 0)}
+  - Timestamp: {field('trade_timestamp')}
+
+Trader Information:
+  - Wallet: {trader['wallet']}
+  - Username: {trader_display}
+  - Total Historical Trades: {trade_count_display}
+  - Total Volume Traded: ${trader['total_volume']:,.2f}{partial_note}
+  - Markets Traded: {trader['markets_traded']}{partial_note}
+  - First Trade: {trader.get('first_trade', 'N/A')}
+  - Latest Trade: {trader.get('latest_trade', 'N/A')}
+{flow_display}{'='*80}
+        """
+    
+    def compact(self) -> str:
+        """Render a single summary line"""
+        trade = self.record['trade']
+        trader = self.record['trader']
+        more = '+' if trader.get('has_more_trades') else ''
+        return (
+            f"TRADE ${trade['value']:,.2f} [{self.label}] {trade.get('side')} {trade.get('outcome')} "
+            f"\"{trade['market_title']}\" wallet={trader['wallet']} "
+            f"trades={trader['total_trades']}{more} volume=${trader['total_volume']:,.2f} "
+            f"tx={trade.get('transaction_hash')}"
+            + ''.join(f" flow=\"{describe_flow(spike)}\"" for spike in self.record.get('flow', ()))
+        )
+    
+    def __str__(self) -> str:
+        return self.banner()
+
+
+def describe_flow(spike: Dict) -> str:
+    """
+    One-line summary of a flow spike
+    
+    Args:
+        spike: Spike description from FlowTracker.observe
+        
+    Returns:
+        e.g. "market 0xabc: $512,000.00 in 300s, 41 trades, ~37 wallets, imbalance +0.82 (volume)"
+    """
+    distinct = (f"~{spike['unique_wallets']} wallets" if 'unique_wallets' in spike
+                else f"~{spike['unique_markets']} markets")
+    return (
+        f"{spike['dimension']} {spike['key']}: ${spike['volume']:,.2f} in {spike['window']:g}s, "
+        f"{spike['trades']} trades, {distinct}, imbalance {spike['imbalance']:+.2f} ({', '.join(spike['rules'])})"
+    )
+
+
+class TradeLogFormatter(logging.Formatter):
+    """Formatter rendering TradeMessage records as a text banner, a compact line or JSON"""
+    
+    def __init__(self, style: str = 'text'):
+        super().__init__('%(asctime)s - %(levelname)s - %(message)s')
+        self.style = style
+    
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.msg
+        if self.style == 'json':
+            entry = {
+                'time': self.formatTime(record),
+                'level': record.levelname,
+                'logger': record.name
+            }
+            if isinstance(message, TradeMessage):
+                entry['label'] = message.label
+                entry.update(message.record)
+            else:
+                entry['message'] = record.getMessage()
+            if record.exc_info:
+                entry['exception'] = self.formatException(record.exc_info)
+            elif record.exc_text:
+                entry['exception'] = record.exc_text
+            return json.dumps(entry)
+        
+        if self.style == 'compact' and isinstance(message, TradeMessage):
+            record = logging.makeLogRecord(dict(record.__dict__, msg=message.compact(), args=None))
+        return super().format(record)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler that leaves message formatting to the listener thread
+    
+    The stock QueueHandler renders the message on the calling thread, which
+    would build every trade banner on the poll loop.
+    """
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        if record.exc_info and not record.exc_text:
+            # Tracebacks can only be rendered while the exception is live
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+def _log_file_handler(path: str) -> logging.Handler:
+    """
+    Create a file handler for a log file, rotating by size when configured
+    
+    The file is opened on the first record, so shard worker processes (which
+    import this module but send their records to the parent) never open it.
+    """
+    if LOG_MAX_BYTES > 0:
+        return RotatingFileHandler(path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True)
+    return logging.FileHandler(path, delay=True)
+
+
+log_formatter = TradeLogFormatter(LOG_FORMAT)
+
+# Main log file and console receive everything except the category loggers
+main_handlers = [_log_file_handler(log_files['main']), logging.StreamHandler()]
+for handler in main_handlers:
+    handler.addFilter(lambda record: record.name not in CATEGORY_LOGGERS)
+
+# Category log files receive only their own logger's records
+category_handlers = []
+for name in CATEGORY_LOGGERS:
+    handler = _log_file_handler(log_files[name.split('_')[0]])
+    handler.addFilter(logging.Filter(name))
+    category_handlers.append(handler)
+
+for handler in main_handlers + category_handlers:
+    handler.setFormatter(log_formatter)
+
+# All handlers run on a listener thread so the poll loop never blocks on disk or stdout
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, *main_handlers, *category_handlers, respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
+
 # Configure main logger
 logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_files['main']),
-        logging.StreamHandler()
-    ]
+    level=getattr(logging, LOG_LEVEL, logging.INFO),
+    handlers=[LazyQueueHandler(log_queue)]
 )
 
 logger = logging.getLogger(__name__)
@@ -40,374 +281,4892 @@ logger = logging.getLogger(__name__)
 # Create separate loggers for each category
 unusual_logger = logging.getLogger('unusual_trades')
 unusual_logger.setLevel(logging.INFO)
-unusual_handler = logging.FileHandler(log_files['unusual'])
-unusual_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-unusual_logger.addHandler(unusual_handler)
 
 tuna_logger = logging.getLogger('tuna_trades')
 tuna_logger.setLevel(logging.INFO)
-tuna_handler = logging.FileHandler(log_files['tuna'])
-tuna_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-tuna_logger.addHandler(tuna_handler)
 
 whale_logger = logging.getLogger('whale_trades')
 whale_logger.setLevel(logging.INFO)
-whale_handler = logging.FileHandler(log_files['whale'])
-whale_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-whale_logger.addHandler(whale_handler)
 
+flow_logger = logging.getLogger('flow_spike_trades')
+flow_logger.setLevel(logging.INFO)
 
-class PolymarketMonitor:
-    """Monitor and analyze Polymarket trades"""
-    
-    BASE_URL = "https://data-api.polymarket.com"
-    GAMMA_API_URL = "https://gamma-api.polymarket.com"
+# Trade category bits used by the trade store
+CATEGORY_UNUSUAL = 1
+CATEGORY_TUNA = 2
+CATEGORY_WHALE = 4
+CATEGORY_FLOW_SPIKE = 8
+CATEGORY_BITS = {
+    'is_unusual': CATEGORY_UNUSUAL,
+    'is_tuna': CATEGORY_TUNA,
+    'is_whale': CATEGORY_WHALE,
+    'is_flow_spike': CATEGORY_FLOW_SPIKE
+}
+CATEGORY_NAMES = {
+    'unusual': CATEGORY_UNUSUAL,
+    'tuna': CATEGORY_TUNA,
+    'whale': CATEGORY_WHALE,
+    'flow_spike': CATEGORY_FLOW_SPIKE
+}
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is unbounded
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class TokenBucket:
+    """Thread-safe token bucket limiting the request rate to a single API host"""
     
-    def __init__(self, threshold: float = 5000, poll_interval: int = 30):
+    def __init__(self, rate: float, capacity: Optional[float] = None):
         """
-        Initialize the monitor
+        Initialize the bucket
         
         Args:
-            threshold: Minimum trade size in USD to log (default: 5000)
-            poll_interval: Seconds between API polls (default: 30)
+            rate: Tokens added per second (requests per second)
+            capacity: Maximum burst size (default: one second worth of tokens)
         """
-        self.threshold = threshold
-        self.poll_interval = poll_interval
-        self.seen_transactions = set()
-        self.market_cache = {}  # Cache market details by condition ID
+        self.rate = rate
+        self.capacity = max(1.0, capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self) -> float:
+        """
+        Block until a token is available and take it
         
-        # Trade category thresholds (configurable via environment variables)
-        self.TUNA_MIN = float(os.getenv('TUNA_MIN', '5000'))
-        self.TUNA_MAX = float(os.getenv('TUNA_MAX', '100000'))
-        self.WHALE_MIN = float(os.getenv('WHALE_MIN', '100000'))
-        self.UNUSUAL_TRADER_THRESHOLD = int(os.getenv('UNUSUAL_TRADER_THRESHOLD', '10'))
+        Returns:
+            Seconds spent waiting for the token
+        """
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class HttpTransport:
+    """
+    Shared HTTP client for the Polymarket APIs
+    
+    Provides pooled keep-alive connections, explicit timeouts, retries with
+    jittered exponential backoff and a token-bucket rate limiter per API host.
+    Latency, error and retry counters are kept per endpoint.
+    """
+    
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+    
+    def __init__(self, timeout: float = 10.0, max_retries: int = 3, backoff_base: float = 0.5,
+                 backoff_max: float = 30.0, pool_size: int = 10,
+                 rate_limits: Optional[Dict[str, float]] = None):
+        """
+        Initialize the transport
         
-        # Create data directory for JSON files
-        self.data_dir = '/app/data' if os.path.exists('/app/data') else 'data'
-        os.makedirs(self.data_dir, exist_ok=True)
+        Args:
+            timeout: Connect/read timeout in seconds for each attempt
+            max_retries: Retries after the first attempt on retryable failures
+            backoff_base: Base delay in seconds for exponential backoff
+            backoff_max: Upper bound for a single backoff delay
+            pool_size: Maximum pooled connections kept per host
+            rate_limits: Requests per second allowed per host (<= 0 disables limiting)
+        """
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
         
-    def get_recent_trades(self, limit: int = 100) -> List[Dict]:
+        self.limiters = {
+            host: TokenBucket(rate)
+            for host, rate in (rate_limits or {}).items()
+            if rate > 0
+        }
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+    
+    def get_json(self, url: str, params: Optional[Dict] = None, endpoint: Optional[str] = None) -> Any:
         """
-        Fetch recent trades from Polymarket
+        Perform a GET request and decode the JSON body, retrying transient failures
         
         Args:
-            limit: Number of trades to fetch (max 10000)
+            url: Request URL
+            params: Query parameters
+            endpoint: Label used for metrics (default: host and path)
             
         Returns:
-            List of trade dictionaries
+            Decoded JSON response
+            
+        Raises:
+            requests.exceptions.RequestException: When the request still fails after all retries
         """
-        url = f"{self.BASE_URL}/trades"
-        params = {
-            'limit': limit,
-            'offset': 0
-        }
+        parsed = urlparse(url)
+        endpoint = endpoint or f"{parsed.netloc}{parsed.path}"
+        limiter = self.limiters.get(parsed.netloc)
+        attempt = 0
         
+        while True:
+            if limiter:
+                limiter.acquire()
+            
+            start = time.monotonic()
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._record(endpoint, parsed.netloc, time.monotonic() - start, error=True)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                reason = str(e)
+            else:
+                retryable = response.status_code in self.RETRY_STATUSES
+                self._record(endpoint, parsed.netloc, time.monotonic() - start, error=retryable or not response.ok)
+                if not retryable or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return json_loads(response.content)
+                delay = self._retry_after(response)
+                if delay is None:
+                    delay = self._backoff(attempt)
+                reason = f"HTTP {response.status_code}"
+            
+            attempt += 1
+            with self.stats_lock:
+                self.stats[endpoint]['retries'] += 1
+            logger.debug(f"Retrying {endpoint} in {delay:.2f}s ({reason}, attempt {attempt}/{self.max_retries})")
+            time.sleep(delay)
+    
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for a retry attempt"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+    
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        """Delay requested by the server via the Retry-After header, if any"""
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching trades: {e}")
-            return []
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.backoff_max, max(0.0, delay))
+    
+    def _record(self, endpoint: str, host: str, latency: float, error: bool = False):
+        """Update the counters for one request attempt"""
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, latency)
+        with self.stats_lock:
+            stats = self.stats.get(endpoint)
+            if stats is None:
+                stats = self.stats[endpoint] = {
+                    'host': host,
+                    'requests': 0,
+                    'errors': 0,
+                    'retries': 0,
+                    'total_latency': 0.0,
+                    'max_latency': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            stats['requests'] += 1
+            stats['errors'] += int(error)
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+            stats['buckets'][bucket] += 1
     
-    def get_user_trade_history(self, wallet_address: str) -> List[Dict]:
+    def get_stats(self) -> Dict[str, Dict]:
         """
-        Get all trades for a specific wallet address
+        Get per-endpoint request counters
         
-        Args:
-            wallet_address: The user's proxy wallet address
-            
         Returns:
-            List of all trades by this user (max 500 due to API limit)
+            Dictionary keyed by endpoint with host, requests, errors, retries, latency
+            figures and latency histogram counts (one per LATENCY_BUCKETS bound, then +Inf)
         """
-        url = f"{self.BASE_URL}/trades"
-        params = {
-            'user': wallet_address,
-            'limit': 500  # API maximum per request
-        }
+        with self.stats_lock:
+            return {
+                endpoint: {
+                    'host': stats['host'],
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'retries': stats['retries'],
+                    'avg_latency': round(stats['total_latency'] / stats['requests'], 4) if stats['requests'] else 0.0,
+                    'max_latency': round(stats['max_latency'], 4),
+                    'total_latency': stats['total_latency'],
+                    'buckets': list(stats['buckets'])
+                }
+                for endpoint, stats in self.stats.items()
+            }
+    
+    def close(self):
+        """Close pooled connections"""
+        self.session.close()
+
+
+def env_flag(name: str, default: bool = False) -> bool:
+    """
+    Read a boolean environment variable
+    
+    Args:
+        name: Variable name
+        default: Value when the variable is unset
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            return response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching user history for {wallet_address}: {e}")
-            return []
+    Returns:
+        True for 1/true/yes/on (case-insensitive)
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class TradeFetchError(Exception):
+    """A page of trades could not be fetched (the request error has been logged)"""
+
+
+def trade_key(trade: Dict) -> str:
+    """
+    Build a key identifying a single fill
     
-    def get_market_details(self, condition_id: str) -> Optional[Dict]:
+    One transaction can settle several fills, so the transaction hash alone
+    would merge them.
+    
+    Args:
+        trade: Trade dictionary from API
+        
+    Returns:
+        Composite key string
+    """
+    if isinstance(trade, TradeRecord):
+        return trade.key
+    return (
+        f"{trade.get('transactionHash')}:{trade.get('proxyWallet')}:{trade.get('asset')}:"
+        f"{trade.get('side')}:{trade.get('size')}:{trade.get('price')}"
+    )
+
+
+class TradeRecord:
+    """
+    Compact trade parsed once from an API response
+    
+    Size, price, value and the dedup key are computed up front and repeated
+    strings (wallets, condition IDs, titles) are interned, so a batch of
+    records holding the same wallet or market shares one copy of each string.
+    Supports the read-only dict access used on raw trades (get, [], in), with
+    API field names as keys.
+    """
+    
+    # API field name -> attribute name
+    FIELDS = {
+        'transactionHash': 'transaction_hash',
+        'proxyWallet': 'proxy_wallet',
+        'asset': 'asset',
+        'conditionId': 'condition_id',
+        'side': 'side',
+        'outcome': 'outcome',
+        'size': 'size',
+        'price': 'price',
+        'timestamp': 'timestamp',
+        'title': 'title',
+        'slug': 'slug',
+        'eventSlug': 'event_slug',
+        'icon': 'icon',
+        'name': 'name',
+        'pseudonym': 'pseudonym'
+    }
+    __slots__ = tuple(FIELDS.values()) + ('value', 'key')
+    
+    @classmethod
+    def from_api(cls, trade: Dict) -> 'TradeRecord':
         """
-        Get market details including category/tags from Gamma API
+        Parse one trade dictionary from the data-api
         
         Args:
-            condition_id: The market condition ID
+            trade: Trade dictionary from API
             
         Returns:
-            Market details dictionary or None if not found
+            TradeRecord (fields missing from the response are None)
         """
-        # Check cache first
-        if condition_id in self.market_cache:
-            return self.market_cache[condition_id]
+        get = trade.get
+        intern = _intern
+        record = cls.__new__(cls)
+        record.transaction_hash = get('transactionHash')
+        record.proxy_wallet = intern(get('proxyWallet'))
+        record.asset = intern(get('asset'))
+        record.condition_id = intern(get('conditionId'))
+        record.side = intern(get('side'))
+        record.outcome = intern(get('outcome'))
+        record.timestamp = get('timestamp')
+        record.title = intern(get('title'))
+        record.slug = intern(get('slug'))
+        record.event_slug = intern(get('eventSlug'))
+        record.icon = intern(get('icon'))
+        record.name = intern(get('name'))
+        record.pseudonym = intern(get('pseudonym'))
+        # The key is built from the raw size/price so it matches keys from earlier runs
+        size = get('size')
+        price = get('price')
+        record.key = f"{record.transaction_hash}:{record.proxy_wallet}:{record.asset}:{record.side}:{size}:{price}"
+        # Numbers are kept as sent (an int stays an int) so output records show
+        # them unchanged; only other values (e.g. strings) are converted
+        record.size = size if type(size) in (int, float) else float(size or 0)
+        record.price = price if type(price) in (int, float) else float(price or 0)
+        record.value = float(record.size) * float(record.price)
+        return record
+    
+    def get(self, name: str, default: Any = None) -> Any:
+        """Value of an API field, or default when it is missing"""
+        attr = self.FIELDS.get(name)
+        value = getattr(self, attr) if attr else None
+        return default if value is None else value
+    
+    def __getitem__(self, name: str) -> Any:
+        value = self.get(name)
+        if value is None:
+            raise KeyError(name)
+        return value
+    
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+    
+    def to_dict(self) -> Dict:
+        """API-style dictionary of the fields present"""
+        return {name: getattr(self, attr) for name, attr in self.FIELDS.items() if getattr(self, attr) is not None}
+
+
+def _intern(value: Any) -> Any:
+    """Intern a string field so repeated values share one object"""
+    return sys.intern(value) if type(value) is str else value
+
+
+def parse_trades(data: Any) -> List[TradeRecord]:
+    """
+    Parse a decoded /trades response into trade records
+    
+    Args:
+        data: Decoded JSON response (a list of trade dictionaries)
         
-        url = f"{self.GAMMA_API_URL}/markets"
-        params = {
-            'id': condition_id,
-            'limit': 1
-        }
+    Returns:
+        List of TradeRecord, empty if the response is not a list
+    """
+    if not isinstance(data, list):
+        return []
+    return [TradeRecord.from_api(trade) for trade in data]
+
+
+class TradeColumns:
+    """
+    Columnar view of a batch of trades
+    
+    value is a float array of trade values in USD: a NumPy array when NumPy is
+    used, otherwise array.array. Only the columns the classifier and the flow
+    windows read are built.
+    """
+    
+    __slots__ = ('value',)
+    
+    def __len__(self) -> int:
+        return len(self.value)
+
+
+class BatchClassifier:
+    """
+    Classify whole batches of trades by value in one pass
+    
+    A batch is converted to columns once, then the threshold mask and the
+    size-based category bits (tuna, whale) are computed over the value column,
+    vectorized with NumPy when it is installed and with a plain loop otherwise.
+    Only the trades that pass the threshold go on to the per-trade path, where
+    the unusual bit is added from the trader's history.
+    """
+    
+    def __init__(self, threshold: float, tuna_min: float, tuna_max: float, whale_min: float,
+                 use_numpy: Optional[bool] = None):
+        """
+        Initialize the classifier
         
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            markets = response.json()
-            
-            if markets and len(markets) > 0:
-                market_details = markets[0]
-                # Cache the result
-                self.market_cache[condition_id] = market_details
-                return market_details
-            
-            return None
-        except requests.exceptions.RequestException as e:
-            logger.debug(f"Could not fetch market details for {condition_id}: {e}")
-            return None
+        Args:
+            threshold: Minimum trade value in USD to qualify
+            tuna_min: Lower bound of the tuna range (inclusive)
+            tuna_max: Upper bound of the tuna range (exclusive)
+            whale_min: Minimum whale trade value
+            use_numpy: Force the NumPy (True) or pure-Python (False) backend; default: NumPy when installed
+        """
+        self.threshold = threshold
+        self.tuna_min = tuna_min
+        self.tuna_max = tuna_max
+        self.whale_min = whale_min
+        self.use_numpy = np is not None if use_numpy is None else use_numpy
+        if self.use_numpy and np is None:
+            raise ImportError("NumPy is not installed")
     
-    def calculate_trade_value(self, trade: Dict) -> float:
+    def columns(self, trades: List[Dict]) -> TradeColumns:
         """
-        Calculate the USD value of a trade
+        Convert trades (records or raw dictionaries) to columns
         
         Args:
-            trade: Trade dictionary from API
+            trades: List of trades
             
         Returns:
-            Trade value in USD
+            TradeColumns for the batch
         """
-        # size is in tokens, price is per token (typically in USDC)
-        size = float(trade.get('size', 0))
-        price = float(trade.get('price', 0))
-        
-        # For SELL orders, calculate based on (1 - price) for the opposite outcome
-        # But for value calculation, we use the actual amount traded
-        return size * price
+        # Records carry their value already; only raw dictionaries are multiplied out
+        values = (
+            trade.value if type(trade) is TradeRecord
+            else float(trade.get('size', 0)) * float(trade.get('price', 0))
+            for trade in trades
+        )
+        columns = TradeColumns()
+        if self.use_numpy:
+            columns.value = np.fromiter(values, np.float64, len(trades))
+        else:
+            columns.value = array('d', values)
+        return columns
     
-    def analyze_trader(self, wallet_address: str) -> Dict:
+    def classify(self, columns: TradeColumns) -> Tuple[List[int], List[int]]:
         """
-        Analyze a trader's history
+        Find the trades at or above the threshold and their size categories
         
         Args:
-            wallet_address: The user's proxy wallet address
+            columns: Batch columns from columns()
             
         Returns:
-            Dictionary with trader statistics
+            Tuple of (indices of qualifying trades, CATEGORY_TUNA/CATEGORY_WHALE bitmask of each)
         """
-        trades = self.get_user_trade_history(wallet_address)
+        value = columns.value
+        if self.use_numpy:
+            categories = (
+                ((value >= self.tuna_min) & (value < self.tuna_max)) * CATEGORY_TUNA
+                + (value >= self.whale_min) * CATEGORY_WHALE
+            )
+            indices = np.flatnonzero(value >= self.threshold)
+            return indices.tolist(), categories[indices].tolist()
         
-        if not trades:
-            return {
-                'wallet': wallet_address,
-                'total_trades': 0,
-                'total_volume': 0,
-                'markets_traded': 0,
-                'has_more_trades': False
-            }
+        indices = [i for i, v in enumerate(value) if v >= self.threshold]
+        return indices, [self.size_categories(value[i]) for i in indices]
+    
+    def size_categories(self, value: float) -> int:
+        """
+        Size-based category bits of a single trade
         
-        total_volume = sum(self.calculate_trade_value(t) for t in trades)
-        # conditionId is the unique market identifier
-        unique_markets = set(t.get('conditionId', '') for t in trades if t.get('conditionId'))
+        Args:
+            value: Trade value in USD
+            
+        Returns:
+            Bitmask of CATEGORY_TUNA and CATEGORY_WHALE
+        """
+        mask = 0
+        if self.tuna_min <= value < self.tuna_max:
+            mask |= CATEGORY_TUNA
+        if value >= self.whale_min:
+            mask |= CATEGORY_WHALE
+        return mask
+
+
+class DedupWindow:
+    """
+    Bounded record of seen trades
+    
+    Keys are kept in a ring buffer of (timestamp, key) backed by a set. Entries
+    older than the window (relative to the newest trade timestamp seen) or past
+    the entry cap are evicted. The highest evicted timestamp becomes a floor:
+    trades at or below it are treated as already seen, so nothing is ever
+    reported twice.
+    """
+    
+    def __init__(self, window: float = 21600, max_entries: int = 200000):
+        """
+        Initialize the window
         
-        # Get user info from first trade (fields are at top level)
-        username = trades[0].get('name', 'Anonymous')
-        pseudonym = trades[0].get('pseudonym', '')
+        Args:
+            window: Seconds of trade time to remember
+            max_entries: Maximum number of keys kept
+        """
+        self.window = window
+        self.max_entries = max_entries
+        self.entries = deque()
+        self.keys = set()
+        self.floor = None
+        self.newest = None
+        self.evictions = 0
+        self.late = 0
+        # Entries at the tail not yet returned by snapshot(), and discarded keys
+        self.unsaved = 0
+        self.removed = set()
+        self.lock = threading.Lock()
+    
+    def add(self, key: str, timestamp: Optional[float] = None) -> bool:
+        """
+        Record a trade
         
-        # Check if trader likely has more than 500 trades
-        # If we got exactly 500 trades, there are probably more
-        has_more_trades = len(trades) >= 500
+        Args:
+            key: Trade key
+            timestamp: Trade timestamp (default: now)
+            
+        Returns:
+            True if the trade had not been seen before
+        """
+        if timestamp is None:
+            timestamp = time.time()
         
-        return {
-            'wallet': wallet_address,
-            'username': username,
-            'pseudonym': pseudonym,
-            'total_trades': len(trades),
-            'total_volume': round(total_volume, 2),
-            'markets_traded': len(unique_markets),
-            'first_trade': trades[-1].get('timestamp', 'Unknown') if trades else 'Unknown',
-            'latest_trade': trades[0].get('timestamp', 'Unknown') if trades else 'Unknown',
-            'has_more_trades': has_more_trades
-        }
+        with self.lock:
+            if key in self.keys:
+                return False
+            if self.floor is not None and timestamp <= self.floor:
+                self.late += 1
+                return False
+            
+            self.keys.add(key)
+            self.entries.append((timestamp, key))
+            self.unsaved += 1
+            if self.newest is None or timestamp > self.newest:
+                self.newest = timestamp
+            self._evict()
+            return True
     
-    def log_trade(self, trade: Dict, trader_stats: Dict):
+    def discard(self, keys: Iterable[str]) -> int:
         """
-        Log details about a trade and trader history to appropriate logs
+        Forget trades, so they count as new when seen again
         
         Args:
-            trade: Trade dictionary
-            trader_stats: Trader statistics dictionary
+            keys: Trade keys
+            
+        Returns:
+            Number of keys that were in the window
         """
-        trade_value = self.calculate_trade_value(trade)
-        
-        # Determine trade categories
-        is_unusual = trader_stats['total_trades'] < self.UNUSUAL_TRADER_THRESHOLD
-        is_tuna = self.TUNA_MIN <= trade_value < self.TUNA_MAX
-        is_whale = trade_value >= self.WHALE_MIN
+        with self.lock:
+            keys = self.keys.intersection(keys)
+            if keys:
+                self.keys -= keys
+                self.removed |= keys
+                start = len(self.entries) - self.unsaved
+                kept = deque()
+                self.unsaved = 0
+                for i, entry in enumerate(self.entries):
+                    if entry[1] not in keys:
+                        kept.append(entry)
+                        self.unsaved += i >= start
+                self.entries = kept
+            return len(keys)
+    
+    def _evict(self):
+        """Drop entries behind the time window or past the entry cap"""
+        cutoff = self.newest - self.window
+        while self.entries and (self.entries[0][0] < cutoff or len(self.entries) > self.max_entries):
+            timestamp, key = self.entries.popleft()
+            self.keys.discard(key)
+            self.evictions += 1
+            if self.floor is None or timestamp > self.floor:
+                self.floor = timestamp
+        self.unsaved = min(self.unsaved, len(self.entries))
+    
+    def snapshot(self, changes: bool = False) -> Dict:
+        """
+        Get the window contents for persistence
         
-        # Extract fields from top-level trade object
-        market_title = trade.get('title', 'Unknown Market')
-        market_id = trade.get('conditionId', 'N/A')
-        market_slug = trade.get('slug', 'N/A')
-        event_slug = trade.get('eventSlug', 'N/A')
+        Entries behind the floor need not be saved: trades at or below it are
+        treated as seen anyway, so a store can prune by timestamp.
         
-        # Try to get market category/tags from Gamma API
-        market_category = 'N/A'
-        market_tags = []
+        Args:
+            changes: Only return the entries added and the keys discarded since the previous snapshot
+            
+        Returns:
+            Dictionary with the floor, newest timestamp and (timestamp, key) entries,
+            plus 'changes' and the 'removed' keys
+        """
+        with self.lock:
+            if changes:
+                entries = list(itertools.islice(reversed(self.entries), self.unsaved))[::-1]
+            else:
+                entries = list(self.entries)
+            snapshot = {
+                'mode': 'window',
+                'floor': self.floor,
+                'newest': self.newest,
+                'entries': entries,
+                'changes': changes,
+                'removed': sorted(self.removed)
+            }
+            self.unsaved = 0
+            self.removed = set()
+            return snapshot
+    
+    def restore(self, snapshot: Dict):
+        """
+        Load window contents saved by snapshot()
         
-        if market_id and market_id != 'N/A':
-            market_details = self.get_market_details(market_id)
-            if market_details:
-                market_category = market_details.get('category', 'N/A')
+        Args:
+            snapshot: Dictionary returned by snapshot()
+        """
+        with self.lock:
+            self.floor = snapshot.get('floor')
+            self.newest = snapshot.get('newest')
+            self.entries = deque(sorted(tuple(e) for e in snapshot.get('entries', [])))
+            self.keys = set(key for _, key in self.entries)
+            if self.newest is not None:
+                self._evict()
+            self.unsaved = 0
+            self.removed = set()
+    
+    def __contains__(self, key: str) -> bool:
+        return key in self.keys
+    
+    def __len__(self) -> int:
+        return len(self.keys)
+    
+    def get_stats(self) -> Dict:
+        """
+        Get dedup counters
+        
+        Returns:
+            Dictionary with size, evictions, late trades and the timestamp floor
+        """
+        with self.lock:
+            return {
+                'mode': 'window',
+                'size': len(self.keys),
+                'evictions': self.evictions,
+                'late': self.late,
+                'floor': self.floor
+            }
+
+
+class BloomDedup:
+    """
+    Fixed-memory record of seen trades using two rotating Bloom filters
+    
+    The current filter takes inserts until it holds `capacity` keys, then
+    replaces the previous one. Lookups check both, so at least the last
+    `capacity` trades are remembered. The newest timestamp of a discarded
+    filter becomes a floor, as in DedupWindow. False positives cause a new
+    trade to be skipped at roughly `error_rate`, never a duplicate report.
+    Bits cannot be cleared, so discarded keys are kept in a small released
+    set that is let through once.
+    """
+    
+    def __init__(self, capacity: int = 200000, error_rate: float = 0.001):
+        """
+        Initialize the filters
+        
+        Args:
+            capacity: Keys per filter generation
+            error_rate: Target false positive rate per filter
+        """
+        self.capacity = max(1, capacity)
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.current = bytearray((self.num_bits + 7) // 8)
+        self.previous = bytearray((self.num_bits + 7) // 8)
+        self.released = set()
+        self.count = 0
+        self.current_newest = None
+        self.previous_newest = None
+        self.floor = None
+        self.rotations = 0
+        self.evictions = 0
+        self.late = 0
+        self.lock = threading.Lock()
+    
+    def _positions(self, key: str) -> List[int]:
+        """Bit positions for a key using double hashing"""
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    @staticmethod
+    def _test(bits: bytearray, positions: List[int]) -> bool:
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in positions)
+    
+    def add(self, key: str, timestamp: Optional[float] = None) -> bool:
+        """
+        Record a trade
+        
+        Args:
+            key: Trade key
+            timestamp: Trade timestamp (default: now)
+            
+        Returns:
+            True if the trade had not been seen before
+        """
+        if timestamp is None:
+            timestamp = time.time()
+        positions = self._positions(key)
+        
+        with self.lock:
+            if key in self.released:
+                if self.floor is not None and timestamp <= self.floor:
+                    self.late += 1
+                    return False
+                self.released.discard(key)
+                return True
+            if self._test(self.current, positions) or self._test(self.previous, positions):
+                return False
+            if self.floor is not None and timestamp <= self.floor:
+                self.late += 1
+                return False
+            
+            for p in positions:
+                self.current[p >> 3] |= 1 << (p & 7)
+            self.count += 1
+            if self.current_newest is None or timestamp > self.current_newest:
+                self.current_newest = timestamp
+            
+            if self.count >= self.capacity:
+                if self.previous_newest is not None:
+                    if self.floor is None or self.previous_newest > self.floor:
+                        self.floor = self.previous_newest
+                    self.evictions += self.capacity
+                self.previous, self.current = self.current, bytearray(len(self.current))
+                self.previous_newest, self.current_newest = self.current_newest, None
+                self.count = 0
+                self.rotations += 1
+            return True
+    
+    def discard(self, keys: Iterable[str]) -> int:
+        """
+        Forget trades, so they count as new when seen again
+        
+        Args:
+            keys: Trade keys
+            
+        Returns:
+            Number of keys that were in the filters
+        """
+        with self.lock:
+            released = {key for key in keys if key not in self.released and key in self}
+            self.released |= released
+            return len(released)
+    
+    def snapshot(self, changes: bool = False) -> Dict:
+        """
+        Get the filter state for persistence
+        
+        Args:
+            changes: Ignored; the filters are fixed-size and always saved whole
+            
+        Returns:
+            Dictionary with both filter generations, the released keys and their bookkeeping
+        """
+        with self.lock:
+            return {
+                'mode': 'bloom',
+                'num_bits': self.num_bits,
+                'num_hashes': self.num_hashes,
+                'current': bytes(self.current),
+                'previous': bytes(self.previous),
+                'released': sorted(self.released),
+                'count': self.count,
+                'current_newest': self.current_newest,
+                'previous_newest': self.previous_newest,
+                'floor': self.floor,
+                'rotations': self.rotations
+            }
+    
+    def restore(self, snapshot: Dict):
+        """
+        Load filter state saved by snapshot(); ignored if the filter geometry changed
+        
+        Args:
+            snapshot: Dictionary returned by snapshot()
+        """
+        if snapshot.get('num_bits') != self.num_bits or snapshot.get('num_hashes') != self.num_hashes:
+            logger.warning("Bloom filter size changed since the last checkpoint; starting with empty filters")
+            return
+        with self.lock:
+            self.current = bytearray(snapshot['current'])
+            self.previous = bytearray(snapshot['previous'])
+            self.released = set(snapshot.get('released', ()))
+            self.count = snapshot['count']
+            self.current_newest = snapshot['current_newest']
+            self.previous_newest = snapshot['previous_newest']
+            self.floor = snapshot['floor']
+            self.rotations = snapshot['rotations']
+    
+    def __contains__(self, key: str) -> bool:
+        if key in self.released:
+            return False
+        positions = self._positions(key)
+        return self._test(self.current, positions) or self._test(self.previous, positions)
+    
+    def __len__(self) -> int:
+        return self.count + (self.capacity if self.rotations else 0)
+    
+    def get_stats(self) -> Dict:
+        """
+        Get dedup counters
+        
+        Returns:
+            Dictionary with size, memory, rotations, evictions and late trades
+        """
+        with self.lock:
+            return {
+                'mode': 'bloom',
+                'size': len(self),
+                'memory_bytes': len(self.current) * 2,
+                'rotations': self.rotations,
+                'evictions': self.evictions,
+                'late': self.late,
+                'floor': self.floor
+            }
+
+
+class FlowWindow:
+    """
+    Rolling aggregates of one market or wallet over a time window
+    
+    The window is a ring of time buckets; each slot holds the bucket number
+    it belongs to, so a slot left over from an earlier lap is recognised as
+    stale and reset when it is reused. Distinct counterparts (wallets of a
+    market, markets of a wallet) are sketched per bucket as a bitmap for
+    linear counting, so the window's estimate is the OR of its buckets.
+    """
+    
+    __slots__ = ('epochs', 'volume', 'count', 'buy', 'sell', 'sketch', 'newest', 'alerted')
+    
+    def __init__(self, buckets: int):
+        """
+        Initialize an empty window
+        
+        Args:
+            buckets: Number of buckets in the ring
+        """
+        self.epochs = [-1] * buckets
+        self.volume = [0.0] * buckets
+        self.count = [0] * buckets
+        self.buy = [0.0] * buckets
+        self.sell = [0.0] * buckets
+        self.sketch = [0] * buckets
+        self.newest = -1
+        self.alerted = None
+    
+    def add(self, bucket: int, value: float, side: Optional[str], bit: int) -> bool:
+        """
+        Add a trade to its bucket
+        
+        Args:
+            bucket: Bucket number (trade timestamp // bucket length)
+            value: Trade value in USD
+            side: 'BUY' or 'SELL'
+            bit: Sketch bit of the counterpart
+            
+        Returns:
+            False if the trade is older than the window and was ignored
+        """
+        size = len(self.epochs)
+        if bucket <= self.newest - size:
+            return False
+        slot = bucket % size
+        if self.epochs[slot] != bucket:
+            self.epochs[slot] = bucket
+            self.volume[slot] = 0.0
+            self.count[slot] = 0
+            self.buy[slot] = 0.0
+            self.sell[slot] = 0.0
+            self.sketch[slot] = 0
+        self.volume[slot] += value
+        self.count[slot] += 1
+        if side == 'BUY':
+            self.buy[slot] += value
+        elif side == 'SELL':
+            self.sell[slot] += value
+        self.sketch[slot] |= bit
+        if bucket > self.newest:
+            self.newest = bucket
+        return True
+    
+    def totals(self, sketch_bits: int) -> Dict:
+        """
+        Sum the buckets inside the window ending at the newest bucket
+        
+        Args:
+            sketch_bits: Width of the sketch bitmaps
+            
+        Returns:
+            Dictionary with volume, trades, buy_volume, sell_volume, imbalance
+            ((buy - sell) / (buy + sell)) and the distinct counterpart estimate
+        """
+        oldest = self.newest - len(self.epochs)
+        volume = buy = sell = 0.0
+        count = sketch = 0
+        for slot, epoch in enumerate(self.epochs):
+            if epoch > oldest:
+                volume += self.volume[slot]
+                count += self.count[slot]
+                buy += self.buy[slot]
+                sell += self.sell[slot]
+                sketch |= self.sketch[slot]
+        # Linear counting; a full bitmap only says "at least sketch_bits"
+        zeros = sketch_bits - bin(sketch).count('1')
+        distinct = sketch_bits if zeros == 0 else round(-sketch_bits * math.log(zeros / sketch_bits))
+        return {
+            'volume': volume,
+            'trades': count,
+            'buy_volume': buy,
+            'sell_volume': sell,
+            'imbalance': (buy - sell) / (buy + sell) if buy + sell else 0.0,
+            'distinct': distinct
+        }
+
+
+class FlowTracker:
+    """
+    Rolling flow aggregates per key (market or wallet) over one time window,
+    with spike rules
+    
+    Each trade updates one FlowWindow in constant time. Keys are kept in LRU
+    order; keys with nothing inside the window, and the least recently
+    traded keys past `max_keys`, are evicted. A key alerts when a rule is met
+    and then stays quiet for one window length.
+    """
+    
+    SKETCH_BITS = 256
+    
+    def __init__(self, dimension: str, window: float, buckets: int = 12, max_keys: int = 50000,
+                 volume: float = 0, trades: int = 0, distinct: int = 0, imbalance: float = 0,
+                 imbalance_min_volume: float = 0, min_value: float = 0):
+        """
+        Initialize the tracker (a rule set to 0 is off)
+        
+        Args:
+            dimension: 'market' (keyed by conditionId) or 'wallet' (keyed by proxyWallet)
+            window: Window length in seconds
+            buckets: Buckets per window
+            max_keys: Maximum number of keys held
+            volume: Alert when the window volume reaches this many USD
+            trades: Alert when the window holds this many trades
+            distinct: Alert when this many distinct wallets (markets for a wallet) traded
+            imbalance: Alert when |buy - sell| / (buy + sell) reaches this fraction...
+            imbalance_min_volume: ...and the window volume is at least this much
+            min_value: Only trades of at least this value are counted
+        """
+        self.dimension = dimension
+        self.window = window
+        self.buckets = buckets
+        self.bucket_seconds = window / buckets
+        self.max_keys = max_keys
+        self.rules = {'volume': volume, 'trades': trades, 'distinct': distinct, 'imbalance': imbalance}
+        self.imbalance_min_volume = imbalance_min_volume
+        self.min_value = min_value
+        self.keys = OrderedDict()
+        self.stats = {
+            'observed': 0,
+            'late': 0,
+            'evictions': 0,
+            'spikes': 0
+        }
+    
+    def observe(self, trade: Dict, value: float) -> Optional[Dict]:
+        """
+        Add a trade to its key's window and check the rules
+        
+        Args:
+            trade: Trade dictionary
+            value: Trade value in USD
+            
+        Returns:
+            Spike description (dimension, key, window, the window totals and the
+            rules met) when this trade sets off an alert, otherwise None
+        """
+        if value < self.min_value:
+            return None
+        if self.dimension == 'market':
+            key, counterpart = trade.get('conditionId'), trade.get('proxyWallet')
+        else:
+            key, counterpart = trade.get('proxyWallet'), trade.get('conditionId')
+        if not key:
+            return None
+        
+        timestamp = trade.get('timestamp') or time.time()
+        bucket = int(timestamp // self.bucket_seconds)
+        flow = self.keys.get(key)
+        if flow is None:
+            flow = self.keys[key] = FlowWindow(self.buckets)
+        else:
+            self.keys.move_to_end(key)
+        bit = 1 << (zlib.crc32((counterpart or '').encode()) % self.SKETCH_BITS)
+        if not flow.add(bucket, value, trade.get('side'), bit):
+            self.stats['late'] += 1
+            return None
+        self.stats['observed'] += 1
+        self._evict(bucket)
+        
+        if flow.alerted is not None and flow.newest - flow.alerted < self.buckets:
+            return None
+        totals = flow.totals(self.SKETCH_BITS)
+        met = [
+            rule for rule, limit in self.rules.items()
+            if limit and (abs(totals[rule]) if rule == 'imbalance' else totals[rule]) >= limit
+        ]
+        if 'imbalance' in met and totals['volume'] < self.imbalance_min_volume:
+            met.remove('imbalance')
+        if not met:
+            return None
+        
+        flow.alerted = flow.newest
+        self.stats['spikes'] += 1
+        totals['unique_wallets' if self.dimension == 'market' else 'unique_markets'] = totals.pop('distinct')
+        return dict(dimension=self.dimension, key=key, window=self.window, rules=met, **totals)
+    
+    def _evict(self, bucket: int):
+        """Drop cold keys from the LRU end, and the least recently traded past max_keys"""
+        keys = self.keys
+        while keys:
+            key, flow = next(iter(keys.items()))
+            if len(keys) <= self.max_keys and flow.newest > bucket - self.buckets:
+                break
+            del keys[key]
+            self.stats['evictions'] += 1
+    
+    def get_stats(self) -> Dict:
+        """
+        Get tracker counters
+        
+        Returns:
+            Dictionary with dimension, window, keys held and observed/late/evicted/spike counts
+        """
+        return dict(self.stats, dimension=self.dimension, window=self.window, keys=len(self.keys))
+
+
+class TraderAggregate:
+    """Running statistics for one wallet, built from its trade history"""
+    
+    def __init__(self, wallet: str):
+        self.wallet = wallet
+        self.username = 'Anonymous'
+        self.pseudonym = ''
+        self.total_trades = 0
+        self.total_volume = 0.0
+        self.markets = set()
+        self.first_trade = None
+        self.latest_trade = None
+        # Keys of the trades seen at the latest timestamp, so a trade is never folded twice
+        self.latest_keys = set()
+        self.has_more_trades = False
+        # Built from a short probe of the most recent trades rather than the full history
+        self.partial = False
+        self.expires = 0.0
+    
+    @classmethod
+    def from_history(cls, wallet: str, trades: List[Dict], values: List[float],
+                     has_more_trades: bool = False, partial: bool = False) -> 'TraderAggregate':
+        """
+        Build an aggregate from a newest-first trade history
+        
+        Args:
+            wallet: The user's proxy wallet address
+            trades: Trade history, newest first
+            values: USD value of each trade in the history
+            has_more_trades: Whether the history was truncated
+            partial: Whether the history is only a short probe of recent trades
+        """
+        aggregate = cls(wallet)
+        aggregate.username = trades[0].get('name', 'Anonymous')
+        aggregate.pseudonym = trades[0].get('pseudonym', '')
+        aggregate.total_trades = len(trades)
+        aggregate.total_volume = sum(values)
+        # conditionId is the unique market identifier
+        aggregate.markets = set(t.get('conditionId') for t in trades if t.get('conditionId'))
+        aggregate.first_trade = trades[-1].get('timestamp')
+        aggregate.latest_trade = trades[0].get('timestamp')
+        aggregate.latest_keys = set(
+            trade_key(t) for t in trades if t.get('timestamp') == aggregate.latest_trade
+        )
+        aggregate.has_more_trades = has_more_trades
+        aggregate.partial = partial
+        return aggregate
+    
+    def add_history_page(self, trades: List[Dict], values: List[float], newest: bool = False):
+        """
+        Fold one page of history into the aggregate; pages may arrive in any order
+        
+        Args:
+            trades: One page of the trade history, newest first
+            values: USD value of each trade on the page
+            newest: Whether this is the first (most recent) page
+        """
+        if not trades:
+            return
+        self.total_trades += len(trades)
+        self.total_volume += sum(values)
+        self.markets.update(t.get('conditionId') for t in trades if t.get('conditionId'))
+        
+        oldest = trades[-1].get('timestamp')
+        if oldest is not None and (self.first_trade is None or oldest < self.first_trade):
+            self.first_trade = oldest
+        
+        if newest:
+            self.username = trades[0].get('name', 'Anonymous')
+            self.pseudonym = trades[0].get('pseudonym', '')
+            self.latest_trade = trades[0].get('timestamp')
+            self.latest_keys = set(trade_key(t) for t in trades if t.get('timestamp') == self.latest_trade)
+    
+    def is_known(self, trade: Dict) -> bool:
+        """
+        Check whether a trade is at or behind the high-water mark of this aggregate
+        
+        Args:
+            trade: Trade dictionary
+            
+        Returns:
+            True if the trade has already been counted
+        """
+        timestamp = trade.get('timestamp')
+        if timestamp is None or self.latest_trade is None:
+            return False
+        if timestamp == self.latest_trade:
+            return trade_key(trade) in self.latest_keys
+        return timestamp < self.latest_trade
+    
+    def fold(self, trade: Dict, value: float) -> bool:
+        """
+        Add a single new trade to the aggregate
+        
+        Trades older than the latest trade already counted are assumed to be
+        part of the history and are ignored.
+        
+        Args:
+            trade: Trade dictionary
+            value: USD value of the trade
+            
+        Returns:
+            True if the trade was counted
+        """
+        if self.is_known(trade):
+            return False
+        
+        timestamp = trade.get('timestamp')
+        self.total_trades += 1
+        self.total_volume += value
+        if trade.get('conditionId'):
+            self.markets.add(trade['conditionId'])
+        if timestamp is not None:
+            if self.latest_trade is None or timestamp > self.latest_trade:
+                self.latest_trade = timestamp
+                self.latest_keys = set()
+            self.latest_keys.add(trade_key(trade))
+            if self.first_trade is None:
+                self.first_trade = timestamp
+        if self.username == 'Anonymous' and trade.get('name'):
+            self.username = trade['name']
+            self.pseudonym = trade.get('pseudonym', '')
+        return True
+    
+    def to_dict(self) -> Dict:
+        """
+        Get the aggregate as a JSON-serializable dictionary for persistence
+        
+        Returns:
+            Dictionary accepted by from_dict()
+        """
+        return {
+            'wallet': self.wallet,
+            'username': self.username,
+            'pseudonym': self.pseudonym,
+            'total_trades': self.total_trades,
+            'total_volume': self.total_volume,
+            'markets': sorted(self.markets),
+            'first_trade': self.first_trade,
+            'latest_trade': self.latest_trade,
+            'latest_keys': sorted(self.latest_keys),
+            'has_more_trades': self.has_more_trades,
+            'partial': self.partial
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'TraderAggregate':
+        """
+        Rebuild an aggregate saved by to_dict()
+        
+        The aggregate is returned stale, so its next lookup syncs newer trades.
+        
+        Args:
+            data: Dictionary returned by to_dict()
+        """
+        aggregate = cls(data['wallet'])
+        aggregate.username = data.get('username', 'Anonymous')
+        aggregate.pseudonym = data.get('pseudonym', '')
+        aggregate.total_trades = data.get('total_trades', 0)
+        aggregate.total_volume = data.get('total_volume', 0.0)
+        aggregate.markets = set(data.get('markets', []))
+        aggregate.first_trade = data.get('first_trade')
+        aggregate.latest_trade = data.get('latest_trade')
+        aggregate.latest_keys = set(data.get('latest_keys', []))
+        aggregate.has_more_trades = data.get('has_more_trades', False)
+        aggregate.partial = data.get('partial', False)
+        return aggregate
+    
+    def to_stats(self) -> Dict:
+        """
+        Get the statistics dictionary used by log_trade
+        
+        Returns:
+            Dictionary with trader statistics
+        """
+        stats = {
+            'wallet': self.wallet,
+            'username': self.username,
+            'pseudonym': self.pseudonym,
+            'total_trades': self.total_trades,
+            'total_volume': round(self.total_volume, 2),
+            'markets_traded': len(self.markets),
+            'first_trade': self.first_trade if self.first_trade is not None else 'Unknown',
+            'latest_trade': self.latest_trade if self.latest_trade is not None else 'Unknown',
+            'has_more_trades': self.has_more_trades
+        }
+        if self.partial:
+            # Volume, markets and first trade only cover the probed trades
+            stats['partial'] = True
+        return stats
+
+
+class TraderStatsCache:
+    """
+    Thread-safe LRU cache of trader aggregates keyed by proxy wallet
+    
+    Entries older than the TTL are not dropped; they are reported as stale so
+    the caller can sync only the trades newer than the aggregate's watermark.
+    """
+    
+    def __init__(self, max_size: int = 5000, ttl: float = 900, clock: Callable[[], float] = time.monotonic):
+        """
+        Initialize the cache
+        
+        Args:
+            max_size: Maximum number of wallets kept (0 disables the cache)
+            ttl: Seconds before a cached wallet is synced again (0 disables the cache)
+            clock: Time source for expiry (a replay passes its trade-time clock)
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.changed = set()  # wallets updated since the last snapshot
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0  # lookups that found an entry past its TTL
+        self.syncs = 0
+        self.synced_trades = 0
+        self.evictions = 0
+    
+    def lookup(self, wallet: str, trade: Optional[Dict] = None, value: float = 0.0,
+               allow_partial: bool = False) -> Tuple[Optional[Dict], Optional[TraderAggregate]]:
+        """
+        Get cached statistics for a wallet, patched with the trade that triggered the lookup
+        
+        Args:
+            wallet: The user's proxy wallet address
+            trade: Trade to fold into the cached statistics
+            value: USD value of the trade
+            allow_partial: Accept an aggregate built from a short probe (otherwise it counts as a miss)
+            
+        Returns:
+            (stats, aggregate): stats is set on a fresh hit; on a stale hit only
+            the aggregate is returned; both are None on a miss
+        """
+        with self.lock:
+            aggregate = self.entries.get(wallet)
+            if aggregate is None or (aggregate.partial and not allow_partial):
+                self.misses += 1
+                return None, None
+            
+            self.entries.move_to_end(wallet)
+            if aggregate.expires <= self.clock():
+                self.stale += 1
+                return None, aggregate
+            
+            self.hits += 1
+            if trade is not None and aggregate.fold(trade, value):
+                self.changed.add(wallet)
+            return aggregate.to_stats(), aggregate
+    
+    def store(self, aggregate: TraderAggregate, trade: Optional[Dict] = None, value: float = 0.0,
+              new_trades: Optional[List[Dict]] = None, new_values: Optional[List[float]] = None) -> Dict:
+        """
+        Cache an aggregate, folding in freshly synced trades and the triggering trade
+        
+        Args:
+            aggregate: Aggregate built from or synced against the wallet's history
+            trade: Trade that triggered the lookup
+            value: USD value of the trade
+            new_trades: Trades newer than the aggregate's watermark, newest first
+            new_values: USD value of each new trade
+            
+        Returns:
+            Trader statistics dictionary
+        """
+        with self.lock:
+            if new_trades is not None:
+                self.syncs += 1
+                # Fold oldest first so the watermark advances monotonically
+                for new_trade, new_value in zip(reversed(new_trades), reversed(new_values)):
+                    self.synced_trades += int(aggregate.fold(new_trade, new_value))
+            if trade is not None:
+                aggregate.fold(trade, value)
+            if self.max_size > 0 and self.ttl > 0:
+                aggregate.expires = self.clock() + self.ttl
+                self.entries[aggregate.wallet] = aggregate
+                self.entries.move_to_end(aggregate.wallet)
+                self.changed.add(aggregate.wallet)
+                while len(self.entries) > self.max_size:
+                    wallet, _ = self.entries.popitem(last=False)
+                    self.changed.discard(wallet)
+                    self.evictions += 1
+            return aggregate.to_stats()
+    
+    def discard(self, wallet: str):
+        """
+        Drop a wallet's aggregate, e.g. when syncing it failed
+        
+        Args:
+            wallet: The user's proxy wallet address
+        """
+        with self.lock:
+            self.entries.pop(wallet, None)
+            self.changed.discard(wallet)
+    
+    def snapshot(self, changes: bool = False) -> List[Dict]:
+        """
+        Get cached aggregates for persistence
+        
+        Args:
+            changes: Only return the aggregates updated since the previous snapshot
+            
+        Returns:
+            List of dictionaries from TraderAggregate.to_dict()
+        """
+        with self.lock:
+            wallets = self.changed if changes else self.entries
+            snapshot = [self.entries[wallet].to_dict() for wallet in wallets]
+            self.changed = set()
+            return snapshot
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get_stats(self) -> Dict:
+        """
+        Get cache counters
+        
+        Returns:
+            Dictionary with size, hits, misses, stale hits, hit ratio (fresh hits over
+            all lookups), incremental syncs and evictions
+        """
+        with self.lock:
+            lookups = self.hits + self.misses + self.stale
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'syncs': self.syncs,
+                'synced_trades': self.synced_trades,
+                'evictions': self.evictions
+            }
+
+
+class StageTimer:
+    """Thread-safe latency counters and histograms for the stages of the processing pipeline"""
+    
+    def __init__(self):
+        """Initialize empty counters"""
+        self.stats = {}
+        self.lock = threading.Lock()
+    
+    @contextmanager
+    def time(self, stage: str) -> Iterator[None]:
+        """
+        Time the enclosed block as one run of a stage
+        
+        Args:
+            stage: Stage name
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - start)
+    
+    def record(self, stage: str, seconds: float):
+        """
+        Add one run of a stage
+        
+        Args:
+            stage: Stage name
+            seconds: Time the run took
+        """
+        bucket = bisect.bisect_left(LATENCY_BUCKETS, seconds)
+        with self.lock:
+            stats = self.stats.get(stage)
+            if stats is None:
+                stats = self.stats[stage] = {
+                    'count': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            stats['count'] += 1
+            stats['total'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+            stats['buckets'][bucket] += 1
+    
+    def get_stats(self) -> Dict[str, Dict]:
+        """
+        Get per-stage latency figures
+        
+        Returns:
+            Dictionary keyed by stage with count, total seconds, average and maximum
+            milliseconds and latency histogram counts (one per LATENCY_BUCKETS bound, then +Inf)
+        """
+        with self.lock:
+            return {
+                stage: {
+                    'count': stats['count'],
+                    'total': round(stats['total'], 4),
+                    'avg_ms': round(stats['total'] / stats['count'] * 1000, 3) if stats['count'] else 0.0,
+                    'max_ms': round(stats['max'] * 1000, 3),
+                    'buckets': list(stats['buckets'])
+                }
+                for stage, stats in self.stats.items()
+            }
+
+
+class AdaptivePollScheduler:
+    """
+    Poll interval controller driven by how much each batch overlaps the previous ones
+    
+    Little overlap means trades are arriving faster than we poll, so the interval
+    shrinks; mostly duplicate batches mean requests are wasted, so it grows.
+    """
+    
+    def __init__(self, interval: float, min_interval: float, max_interval: float,
+                 low_overlap: float = 0.2, high_overlap: float = 0.8,
+                 shrink_factor: float = 0.5, grow_factor: float = 1.25):
+        """
+        Initialize the scheduler
+        
+        Args:
+            interval: Starting interval in seconds
+            min_interval: Lower bound for the interval
+            max_interval: Upper bound for the interval
+            low_overlap: Overlap ratio below which the interval shrinks
+            high_overlap: Overlap ratio above which the interval grows
+            shrink_factor: Multiplier applied when shrinking
+            grow_factor: Multiplier applied when growing
+        """
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        self.low_overlap = low_overlap
+        self.high_overlap = high_overlap
+        self.shrink_factor = shrink_factor
+        self.grow_factor = grow_factor
+    
+    def update(self, fetched: int, new: int, gap: bool = False) -> float:
+        """
+        Adjust the interval after a poll
+        
+        Args:
+            fetched: Trades returned by the poll
+            new: Trades not seen before
+            gap: Whether the poll hit its page cap before reaching the previous poll
+            
+        Returns:
+            The interval to use for the next cycle
+        """
+        if fetched == 0:
+            return self.interval
+        
+        overlap = 1 - new / fetched
+        previous = self.interval
+        if gap or overlap < self.low_overlap:
+            self.interval = max(self.min_interval, self.interval * self.shrink_factor)
+        elif overlap > self.high_overlap:
+            self.interval = min(self.max_interval, self.interval * self.grow_factor)
+        
+        if self.interval != previous:
+            reason = "gap detected" if gap else f"overlap {overlap:.0%}"
+            logger.info(f"Poll interval {previous:.1f}s -> {self.interval:.1f}s ({reason}, {new}/{fetched} new trades)")
+        return self.interval
+
+
+class MarketCache:
+    """
+    Thread-safe LRU cache of Gamma market details keyed by condition ID
+    
+    Misses (unknown markets or failed lookups) are cached as negative entries
+    with a shorter TTL so they are not re-queried on every trade.
+    """
+    
+    def __init__(self, max_size: int = 10000, ttl: float = 3600, negative_ttl: float = 300):
+        """
+        Initialize the cache
+        
+        Args:
+            max_size: Maximum number of markets kept
+            ttl: Seconds a market's details are kept
+            negative_ttl: Seconds a miss is remembered
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.entries = OrderedDict()  # condition ID -> (expires, details or None)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, condition_id: str) -> Tuple[bool, Optional[Dict]]:
+        """
+        Look up a market
+        
+        Args:
+            condition_id: The market condition ID
+            
+        Returns:
+            (found, details): found is False when the market must be fetched;
+            details is None for a cached miss
+        """
+        with self.lock:
+            entry = self.entries.get(condition_id)
+            if entry is None or entry[0] <= time.monotonic():
+                if entry is not None:
+                    del self.entries[condition_id]
+                self.misses += 1
+                return False, None
+            
+            self.entries.move_to_end(condition_id)
+            if entry[1] is None:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+            return True, entry[1]
+    
+    def put(self, condition_id: str, details: Optional[Dict], ttl: Optional[float] = None):
+        """
+        Cache a market's details, or a miss when details is None
+        
+        Args:
+            condition_id: The market condition ID
+            details: Market details dictionary or None
+            ttl: Seconds to keep the entry (default: the cache TTL for hits or misses)
+        """
+        if ttl is None:
+            ttl = self.ttl if details is not None else self.negative_ttl
+        with self.lock:
+            self.entries[condition_id] = (time.monotonic() + ttl, details)
+            self.entries.move_to_end(condition_id)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    
+    def snapshot(self) -> List[Tuple[str, Dict, float]]:
+        """
+        Get cached markets for persistence (misses are not persisted)
+        
+        Returns:
+            List of (condition ID, details, expiry as a Unix timestamp)
+        """
+        offset = time.time() - time.monotonic()
+        with self.lock:
+            return [
+                (condition_id, details, expires + offset)
+                for condition_id, (expires, details) in self.entries.items()
+                if details is not None
+            ]
+    
+    def __contains__(self, condition_id: str) -> bool:
+        with self.lock:
+            entry = self.entries.get(condition_id)
+            return entry is not None and entry[0] > time.monotonic()
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get_stats(self) -> Dict:
+        """
+        Get cache counters
+        
+        Returns:
+            Dictionary with size, hits, negative hits, misses, hit ratio and evictions
+        """
+        with self.lock:
+            lookups = self.hits + self.negative_hits + self.misses
+            return {
+                'size': len(self.entries),
+                'hits': self.hits,
+                'negative_hits': self.negative_hits,
+                'misses': self.misses,
+                'hit_ratio': round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions
+            }
+
+
+class TradeStore:
+    """
+    SQLite store holding each logged trade once, with a category bitmask
+    
+    Indexed by wallet, market, trade timestamp and (through partial indexes)
+    category. Per-category views are plain queries over the one table.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS trades (
+            id INTEGER PRIMARY KEY,
+            logged_at TEXT,
+            trade_timestamp INTEGER,
+            wallet TEXT,
+            condition_id TEXT,
+            transaction_hash TEXT,
+            value REAL,
+            categories INTEGER NOT NULL DEFAULT 0,
+            record TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_trades_wallet ON trades (wallet, trade_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_trades_market ON trades (condition_id, trade_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_trades_timestamp ON trades (trade_timestamp);
+        CREATE INDEX IF NOT EXISTS idx_trades_unusual ON trades (trade_timestamp) WHERE categories & 1;
+        CREATE INDEX IF NOT EXISTS idx_trades_tuna ON trades (trade_timestamp) WHERE categories & 2;
+        CREATE INDEX IF NOT EXISTS idx_trades_whale ON trades (trade_timestamp) WHERE categories & 4;
+        CREATE INDEX IF NOT EXISTS idx_trades_flow_spike ON trades (trade_timestamp) WHERE categories & 8;
+        CREATE VIEW IF NOT EXISTS unusual_trades AS SELECT * FROM trades WHERE categories & 1;
+        CREATE VIEW IF NOT EXISTS tuna_trades AS SELECT * FROM trades WHERE categories & 2;
+        CREATE VIEW IF NOT EXISTS whale_trades AS SELECT * FROM trades WHERE categories & 4;
+        CREATE VIEW IF NOT EXISTS flow_spike_trades AS SELECT * FROM trades WHERE categories & 8;
+    """
+    
+    def __init__(self, path: str):
+        """
+        Initialize the store (the database is opened on first use)
+        
+        Args:
+            path: SQLite database file
+        """
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema if needed"""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(self.SCHEMA)
+        return self.conn
+    
+    @staticmethod
+    def category_mask(categories: Dict[str, bool]) -> int:
+        """
+        Convert the categories of a trade record to a bitmask
+        
+        Args:
+            categories: The record's categories dictionary (is_unusual, is_tuna, ...)
+            
+        Returns:
+            Bitmask of CATEGORY_* values
+        """
+        return sum(bit for name, bit in CATEGORY_BITS.items() if categories.get(name))
+    
+    def insert_many(self, records: List[Dict], lines: List[str]):
+        """
+        Insert a batch of trade records in one transaction
+        
+        Args:
+            records: Trade records as built by log_trade
+            lines: The same records already serialized to JSON
+        """
+        rows = [
+            (
+                record.get('timestamp'),
+                record['trade'].get('trade_timestamp'),
+                record['trader'].get('wallet'),
+                record['trade'].get('market_id'),
+                record['trade'].get('transaction_hash'),
+                record['trade'].get('value'),
+                self.category_mask(record.get('categories', {})),
+                line
+            )
+            for record, line in zip(records, lines)
+        ]
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'INSERT INTO trades (logged_at, trade_timestamp, wallet, condition_id, transaction_hash, '
+                    'value, categories, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    rows
+                )
+    
+    def query(self, category: Optional[str] = None, wallet: Optional[str] = None,
+              condition_id: Optional[str] = None, since: Optional[int] = None,
+              until: Optional[int] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Get logged trades, newest first
+        
+        Args:
+            category: 'unusual', 'tuna', 'whale' or 'flow_spike'
+            wallet: Trader proxy wallet
+            condition_id: Market condition ID
+            since: Minimum trade timestamp (inclusive)
+            until: Maximum trade timestamp (exclusive)
+            limit: Maximum number of trades
+            
+        Returns:
+            Trade records as written by log_trade
+        """
+        clauses = []
+        params = []
+        if category is not None:
+            clauses.append(f'categories & {CATEGORY_NAMES[category]}')
+        if wallet is not None:
+            clauses.append('wallet = ?')
+            params.append(wallet)
+        if condition_id is not None:
+            clauses.append('condition_id = ?')
+            params.append(condition_id)
+        if since is not None:
+            clauses.append('trade_timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('trade_timestamp < ?')
+            params.append(until)
+        
+        sql = 'SELECT record FROM trades'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY trade_timestamp DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        
+        with self.lock:
+            rows = self._connect().execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+class JsonlSink:
+    """
+    Buffered writer for JSON Lines output files and the trade store
+    
+    Records are handed over on an in-memory queue and written by a background
+    thread that keeps file handles open, batches writes by size and time,
+    fsyncs on a cadence and rotates files by size or day. The same batches are
+    inserted into the trade store when one is attached. A full queue blocks
+    the caller (backpressure) instead of dropping records.
+    """
+    
+    def __init__(self, directory: str, flush_interval: float = 1.0, flush_records: int = 100,
+                 fsync_interval: float = 10.0, max_bytes: int = 0, rotate_daily: bool = False,
+                 compress: bool = False, queue_size: int = 10000, store: Optional[TradeStore] = None,
+                 timer: Optional[StageTimer] = None):
+        """
+        Initialize the sink (the writer thread starts on the first write)
+        
+        Args:
+            directory: Directory holding the output files
+            flush_interval: Maximum seconds a record waits in the buffer
+            flush_records: Buffered records that trigger a flush
+            fsync_interval: Seconds between fsyncs of written files (0 disables fsync)
+            max_bytes: Rotate a file once it reaches this size (0 disables)
+            rotate_daily: Rotate files when the local date changes
+            compress: Gzip rotated segments
+            queue_size: Maximum records waiting for the writer
+            store: Trade store receiving every record
+            timer: Stage timer recording file write and trade store insert latency
+        """
+        self.directory = directory
+        self.store = store
+        self.timer = timer
+        self.flush_interval = flush_interval
+        self.flush_records = max(1, flush_records)
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.start_lock = threading.Lock()
+        self.handles = {}  # filename -> (file object, current size, opened date)
+        self.stats = {
+            'records': 0,
+            'bytes': 0,
+            'flushes': 0,
+            'fsyncs': 0,
+            'rotations': 0,
+            'backpressure': 0,
+            'errors': 0
+        }
+    
+    def write(self, filenames: List[str], line: str, record: Optional[Dict] = None):
+        """
+        Queue one serialized record for one or more files and the trade store
+        
+        Args:
+            filenames: File names relative to the output directory
+            line: JSON-encoded record without the trailing newline
+            record: The record itself, for the trade store
+        """
+        self._start()
+        item = (filenames, line, record)
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.stats['backpressure'] += 1
+            if self.stats['backpressure'] == 1:
+                logger.warning("Output queue full; waiting for the writer to catch up")
+            self.queue.put(item)
+    
+    def flush(self):
+        """Block until every queued record has been written and flushed"""
+        if self.thread is None:
+            return
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+    
+    def close(self):
+        """Write everything still queued, fsync and close all files"""
+        if self.thread is None:
+            return
+        self.queue.put(None)
+        self.thread.join()
+        self.thread = None
+    
+    def _start(self):
+        """Start the writer thread if it is not running"""
+        if self.thread is None:
+            with self.start_lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name='jsonl-sink', daemon=True)
+                    self.thread.start()
+    
+    def _run(self):
+        """Writer loop: batch queued records and flush them by size or age"""
+        pending = {}
+        pending_records = []
+        pending_count = 0
+        oldest = None
+        last_fsync = time.monotonic()
+        unsynced = False
+        
+        while True:
+            # Wake for the next flush, and for the next fsync while written data
+            # is unsynced, so an idle feed still gets its data to disk in time
+            deadlines = []
+            if oldest is not None:
+                deadlines.append(oldest + self.flush_interval)
+            if unsynced and self.fsync_interval > 0:
+                deadlines.append(last_fsync + self.fsync_interval)
+            timeout = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = False
+            
+            if isinstance(item, tuple):
+                filenames, line, record = item
+                for filename in filenames:
+                    pending.setdefault(filename, []).append(line)
+                if record is not None and self.store is not None:
+                    pending_records.append((record, line))
+                pending_count += 1
+                if oldest is None:
+                    oldest = time.monotonic()
+                if pending_count < self.flush_records and time.monotonic() - oldest < self.flush_interval:
+                    continue
+            
+            if pending_count:
+                start = time.perf_counter()
+                self._write_pending(pending)
+                if self.timer is not None:
+                    self.timer.record('file_write', time.perf_counter() - start)
+                if pending_records:
+                    start = time.perf_counter()
+                    self._insert_pending(pending_records)
+                    if self.timer is not None:
+                        self.timer.record('store_insert', time.perf_counter() - start)
+                self.stats['records'] += pending_count
+                pending, pending_records, pending_count, oldest = {}, [], 0, None
+                unsynced = True
+            
+            fsync_due = (
+                unsynced and self.fsync_interval > 0 and time.monotonic() - last_fsync >= self.fsync_interval
+            )
+            if item is None or fsync_due:
+                self._fsync()
+                last_fsync = time.monotonic()
+                unsynced = False
+            
+            if item is None:
+                for handle, _, _ in self.handles.values():
+                    handle.close()
+                self.handles = {}
+                if self.store is not None:
+                    self.store.close()
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+    
+    def _write_pending(self, pending: Dict[str, List[str]]):
+        """Append buffered lines to each file, rotating first if needed"""
+        for filename, lines in pending.items():
+            data = ''.join(line + '\n' for line in lines)
+            try:
+                handle = self._handle(filename)
+                handle.write(data)
+                handle.flush()
+                entry = self.handles[filename]
+                self.handles[filename] = (entry[0], entry[1] + len(data), entry[2])
+                self.stats['bytes'] += len(data)
+            except OSError as e:
+                self.stats['errors'] += 1
+                logger.error(f"Error writing to {os.path.join(self.directory, filename)}: {e}")
+        if pending:
+            self.stats['flushes'] += 1
+    
+    def _insert_pending(self, pending_records: List[Tuple[Dict, str]]):
+        """Insert buffered records into the trade store in one transaction"""
+        try:
+            self.store.insert_many([r for r, _ in pending_records], [line for _, line in pending_records])
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error writing {len(pending_records)} trades to {self.store.path}: {e}")
+    
+    def _handle(self, filename: str):
+        """Get the open handle for a file, rotating it by size or day first"""
+        today = datetime.now().date()
+        entry = self.handles.get(filename)
+        if entry is not None:
+            handle, size, opened = entry
+            if (self.max_bytes and size >= self.max_bytes) or (self.rotate_daily and opened != today):
+                handle.close()
+                del self.handles[filename]
+                self._rotate(filename, opened)
+                entry = None
+        
+        if entry is None:
+            path = os.path.join(self.directory, filename)
+            if self.rotate_daily and os.path.exists(path):
+                opened = datetime.fromtimestamp(os.path.getmtime(path)).date()
+                if opened != today:
+                    self._rotate(filename, opened)
+            handle = open(path, 'a')
+            entry = self.handles[filename] = (handle, handle.tell(), today)
+        return entry[0]
+    
+    def _rotate(self, filename: str, opened):
+        """Rename a full or outdated file to a dated segment, gzipping it if configured"""
+        path = os.path.join(self.directory, filename)
+        stem, ext = os.path.splitext(path)
+        segment = f"{stem}.{opened.strftime('%Y-%m-%d')}{ext}"
+        counter = 1
+        while os.path.exists(segment) or os.path.exists(segment + '.gz'):
+            segment = f"{stem}.{opened.strftime('%Y-%m-%d')}.{counter}{ext}"
+            counter += 1
+        
+        try:
+            os.replace(path, segment)
+            if self.compress:
+                with open(segment, 'rb') as src, gzip.open(segment + '.gz', 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(segment)
+        except OSError as e:
+            self.stats['errors'] += 1
+            logger.error(f"Error rotating {path}: {e}")
+            return
+        self.stats['rotations'] += 1
+    
+    def _fsync(self):
+        """Flush written data to disk"""
+        for filename, (handle, _, _) in self.handles.items():
+            try:
+                os.fsync(handle.fileno())
+            except OSError as e:
+                self.stats['errors'] += 1
+                logger.error(f"Error syncing {filename}: {e}")
+        self.stats['fsyncs'] += 1
+    
+    def get_stats(self) -> Dict:
+        """
+        Get writer counters
+        
+        Returns:
+            Dictionary with records, bytes, flushes, fsyncs, rotations, backpressure events,
+            errors and current queue depth
+        """
+        return dict(self.stats, queue_depth=self.queue.qsize())
+
+
+class WorkQueue:
+    """
+    Bounded priority queue of tasks run by a fixed set of worker threads
+    
+    Used as the enrichment stage of the staged pipeline: the poller submits
+    one task per qualifying trade and returns to polling while workers run
+    them. Lower priorities run first, equal priorities in submission order.
+    A full queue blocks the submitter (backpressure) instead of dropping
+    tasks. Time spent waiting in the queue and from submission to completion
+    is recorded as the 'queue_wait' and 'pipeline_lag' stages.
+    """
+    
+    def __init__(self, workers: int = 4, queue_size: int = 1000, timer: Optional[StageTimer] = None,
+                 name: str = 'pipeline'):
+        """
+        Initialize the queue and start the workers
+        
+        Args:
+            workers: Worker threads
+            queue_size: Maximum tasks waiting for a worker
+            timer: Stage timer recording queue wait and end-to-end lag
+            name: Thread name prefix
+        """
+        self.queue = queue.PriorityQueue(maxsize=max(1, queue_size))
+        self.timer = timer
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'errors': 0,
+            'backpressure': 0,
+            'discarded': 0
+        }
+        self.threads = [
+            threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for thread in self.threads:
+            thread.start()
+    
+    def submit(self, priority: float, func: Callable, *args):
+        """
+        Queue func(*args), blocking while the queue is full
+        
+        Args:
+            priority: Lower runs first
+            func: Task to run on a worker
+            *args: Arguments for func
+        """
+        with self.lock:
+            self.seq += 1
+            item = (priority, self.seq, time.monotonic(), func, args)
+            self.stats['submitted'] += 1
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            with self.lock:
+                self.stats['backpressure'] += 1
+                first = self.stats['backpressure'] == 1
+            if first:
+                logger.warning("Enrichment queue full; polling waits for the workers to catch up")
+            self.queue.put(item)
+    
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every submitted task has finished
+        
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely)
+            
+        Returns:
+            True if the queue drained, False on timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+    
+    def close(self, timeout: Optional[float] = None) -> List[Tuple[Callable, tuple]]:
+        """
+        Drain the queue, discard whatever is left after the timeout and stop the workers
+        
+        Args:
+            timeout: Maximum seconds to wait for queued tasks (None waits indefinitely)
+            
+        Returns:
+            (func, args) of every task discarded without running
+        """
+        discarded = []
+        if not self.threads:
+            return discarded
+        if not self.drain(timeout):
+            while True:
+                try:
+                    _, _, _, func, args = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                self.queue.task_done()
+                discarded.append((func, args))
+            with self.lock:
+                self.stats['discarded'] += len(discarded)
+            logger.warning(f"Discarded {len(discarded)} queued tasks that were not run in time")
+        # Stop markers sort after any task and carry no function
+        for _ in self.threads:
+            with self.lock:
+                self.seq += 1
+                marker = (math.inf, self.seq, 0.0, None, ())
+            self.queue.put(marker)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        return discarded
+    
+    def _run(self):
+        """Worker loop: run tasks in priority order until a stop marker arrives"""
+        while True:
+            _, _, submitted_at, func, args = self.queue.get()
+            if func is None:
+                self.queue.task_done()
+                return
+            if self.timer is not None:
+                self.timer.record('queue_wait', time.monotonic() - submitted_at)
+            try:
+                func(*args)
+                stat = 'completed'
+            except Exception as e:
+                stat = 'errors'
+                logger.error(f"Error in pipeline task {getattr(func, '__name__', func)}: {e}", exc_info=True)
+            if self.timer is not None:
+                self.timer.record('pipeline_lag', time.monotonic() - submitted_at)
+            with self.lock:
+                self.stats[stat] += 1
+            self.queue.task_done()
+    
+    def get_stats(self) -> Dict:
+        """
+        Get queue counters
+        
+        Returns:
+            Dictionary with submitted, completed, errors, backpressure and discarded
+            counts, the current queue depth, worker count and the age in seconds of
+            the oldest queued task
+        """
+        now = time.monotonic()
+        with self.queue.mutex:
+            oldest = min((item[2] for item in self.queue.queue if item[3] is not None), default=None)
+            depth = len(self.queue.queue)
+        with self.lock:
+            return dict(
+                self.stats,
+                queue_depth=depth,
+                workers=len(self.threads),
+                oldest_age=round(now - oldest, 3) if oldest is not None else 0.0
+            )
+
+
+def shard_for(wallet: Optional[str], shards: int) -> int:
+    """
+    Pick the shard owning a wallet (stable across processes and restarts)
+    
+    Args:
+        wallet: Proxy wallet address
+        shards: Number of shards
+        
+    Returns:
+        Shard index in range(shards)
+    """
+    digest = hashlib.blake2b((wallet or '').lower().encode(), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') % shards
+
+
+class ShardLogHandler(QueueHandler):
+    """Forward a shard worker's log records to the parent over the result queue"""
+    
+    def enqueue(self, record: logging.LogRecord):
+        self.queue.put(('log', record))
+
+
+class ShardPool:
+    """
+    Trader enrichment spread over worker processes, partitioned by wallet
+    
+    Each qualifying trade is sent to the process owning its wallet
+    (shard_for), so every process keeps its own trader cache and HTTP
+    transport with no cross-process locking. Results come back on one queue
+    and a merger thread hands them to the callback in submission order,
+    holding early results until the trades before them are done. Task queues
+    are bounded; a full queue blocks the submitter (backpressure). A worker
+    that dies is restarted and the trades it held are counted as lost.
+    """
+    
+    def __init__(self, processes: int, threshold: float, data_dir: str,
+                 on_result: Callable[[Dict, Dict], None], queue_size: int = 1000,
+                 timer: Optional[StageTimer] = None, worker: Optional[Callable] = None,
+                 check_interval: float = 1.0):
+        """
+        Start the worker processes and the merger thread
+        
+        Args:
+            processes: Worker processes (shards)
+            threshold: Trade threshold passed to the workers' monitors
+            data_dir: Data directory passed to the workers' monitors
+            on_result: Called with (trade, trader_stats) in submission order
+            queue_size: Maximum trades queued per worker
+            timer: Stage timer recording submission-to-merge lag
+            worker: Process entry point with _shard_worker's signature (default: _shard_worker)
+            check_interval: Seconds between worker liveness checks
+        """
+        self.context = multiprocessing.get_context('spawn')
+        self.worker = worker or _shard_worker
+        self.shards = max(1, processes)
+        self.threshold = threshold
+        self.data_dir = data_dir
+        self.on_result = on_result
+        self.queue_size = max(1, queue_size)
+        self.timer = timer
+        self.check_interval = check_interval
+        self.results = self.context.Queue()
+        self.tasks = [None] * self.shards
+        self.processes = [None] * self.shards
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.next_seq = 1
+        self.pending = {}  # seq -> (trade, shard, submitted at)
+        self.ready = {}  # seq -> (trader_stats, error), waiting for earlier trades
+        self.lost = set()
+        self.closing = False
+        self.stats = {
+            'submitted': 0,
+            'completed': 0,
+            'errors': 0,
+            'backpressure': 0,
+            'discarded': 0,
+            'restarts': 0
+        }
+        for shard in range(self.shards):
+            self._start_worker(shard)
+        self.merger = threading.Thread(target=self._merge, name='shard-merger', daemon=True)
+        self.merger.start()
+    
+    def _start_worker(self, shard: int):
+        """Start (or restart) the process for a shard with a fresh task queue"""
+        self.tasks[shard] = self.context.Queue(maxsize=self.queue_size)
+        process = self.context.Process(
+            target=self.worker,
+            args=(shard, self.shards, self.threshold, self.data_dir, self.tasks[shard], self.results),
+            name=f"shard-{shard}",
+            daemon=True
+        )
+        process.start()
+        self.processes[shard] = process
+    
+    def submit(self, trade: Dict):
+        """
+        Queue a trade for the worker owning its wallet, blocking while that queue is full
+        
+        Args:
+            trade: Qualifying trade
+        """
+        shard = shard_for(trade.get('proxyWallet'), self.shards)
+        with self.cond:
+            self.seq += 1
+            seq = self.seq
+            self.pending[seq] = (trade, shard, time.monotonic())
+            self.stats['submitted'] += 1
+            tasks = self.tasks[shard]
+        try:
+            tasks.put_nowait((seq, trade))
+        except queue.Full:
+            with self.cond:
+                self.stats['backpressure'] += 1
+                first = self.stats['backpressure'] == 1
+            if first:
+                logger.warning(f"Shard {shard} queue full; polling waits for the workers to catch up")
+            tasks.put((seq, trade))
+    
+    def _merge(self):
+        """
+        Merger loop: collect results and release them in submission order
+        
+        Workers are checked on a timer rather than only when the result queue
+        goes quiet, so a dead shard is noticed while the others keep producing.
+        """
+        next_check = time.monotonic() + self.check_interval
+        while True:
+            try:
+                item = self.results.get(timeout=max(0.0, next_check - time.monotonic()))
+            except queue.Empty:
+                item = None
+            if time.monotonic() >= next_check:
+                self._check_workers()
+                next_check = time.monotonic() + self.check_interval
+            if item is None:
+                continue
+            kind = item[0]
+            if kind == 'stop':
+                return
+            if kind == 'log':
+                record = item[1]
+                logging.getLogger(record.name).handle(record)
+                continue
+            _, seq, trader_stats, error = item
+            with self.cond:
+                if seq not in self.pending or seq in self.lost:
+                    continue
+                self.ready[seq] = (trader_stats, error)
+            self._release()
+    
+    def _release(self):
+        """Hand every result that is next in order to the callback"""
+        with self.cond:
+            batch = []
+            while True:
+                if self.next_seq in self.ready:
+                    trade, _, submitted_at = self.pending[self.next_seq]
+                    batch.append((self.next_seq, trade, submitted_at, *self.ready.pop(self.next_seq)))
+                elif self.next_seq in self.lost:
+                    self.lost.discard(self.next_seq)
+                else:
+                    break
+                self.next_seq += 1
+        
+        for seq, trade, submitted_at, trader_stats, error in batch:
+            if error is None:
+                try:
+                    self.on_result(trade, trader_stats)
+                except Exception as e:
+                    error = str(e)
+                    logger.error(f"Error logging trade {trade.get('transactionHash')}: {e}", exc_info=True)
+            else:
+                logger.error(f"Error enriching trade {trade.get('transactionHash')} in a shard worker: {error}")
+            if self.timer is not None:
+                self.timer.record('pipeline_lag', time.monotonic() - submitted_at)
+            with self.cond:
+                self.pending.pop(seq, None)
+                self.stats['completed' if error is None else 'errors'] += 1
+                self.cond.notify_all()
+    
+    def _check_workers(self):
+        """Restart dead workers; the trades they held are lost"""
+        if self.closing:
+            return
+        for shard, process in enumerate(self.processes):
+            if process.is_alive():
+                continue
+            with self.cond:
+                lost = [seq for seq, (_, owner, _) in self.pending.items() if owner == shard and seq not in self.ready]
+                for seq in lost:
+                    self.pending.pop(seq)
+                    self.lost.add(seq)
+                self.stats['errors'] += len(lost)
+                self.stats['restarts'] += 1
+                self._start_worker(shard)
+                self.cond.notify_all()
+            logger.error(f"Shard worker {shard} exited with code {process.exitcode}; "
+                         f"restarted it, {len(lost)} queued trades lost")
+            self._release()
+    
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every submitted trade has been merged
+        
+        Args:
+            timeout: Maximum seconds to wait (None waits indefinitely)
+            
+        Returns:
+            True if everything was merged, False on timeout
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending, timeout)
+    
+    def close(self, timeout: Optional[float] = None) -> List[Dict]:
+        """
+        Drain, stop the workers (terminating them if trades are still queued
+        after the timeout) and stop the merger
+        
+        Args:
+            timeout: Maximum seconds to wait for queued trades (None waits indefinitely)
+            
+        Returns:
+            Trades discarded without being logged, in submission order
+        """
+        if self.merger is None:
+            return []
+        drained = self.drain(timeout)
+        self.closing = True
+        if drained:
+            for tasks in self.tasks:
+                tasks.put(None)
+            for process in self.processes:
+                process.join(10)
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        with self.cond:
+            discarded = [self.pending[seq][0] for seq in sorted(self.pending)]
+            self.stats['discarded'] += len(discarded)
+            self.pending.clear()
+            self.ready.clear()
+        if discarded:
+            logger.warning(f"Discarded {len(discarded)} queued trades that were not enriched in time")
+        self.results.put(('stop',))
+        self.merger.join()
+        self.merger = None
+        return discarded
+    
+    def get_stats(self) -> Dict:
+        """
+        Get pool counters
+        
+        Returns:
+            Dictionary with submitted, completed, errors, backpressure, discarded and
+            restart counts, the trades in flight overall (queue_depth) and per shard,
+            trades held for ordering, worker count and the age in seconds of the
+            oldest trade in flight
+        """
+        now = time.monotonic()
+        with self.cond:
+            per_shard = [0] * self.shards
+            for _, shard, _ in self.pending.values():
+                per_shard[shard] += 1
+            oldest = min((submitted_at for _, _, submitted_at in self.pending.values()), default=None)
+            return dict(
+                self.stats,
+                queue_depth=len(self.pending),
+                shard_depth=per_shard,
+                reorder_buffer=len(self.ready),
+                workers=sum(1 for process in self.processes if process.is_alive()),
+                oldest_age=round(now - oldest, 3) if oldest is not None else 0.0
+            )
+
+
+class StateStore:
+    """
+    SQLite store for monitor state, so restarts resume where the last run stopped
+    
+    Holds the dedup window, the poll watermark, market details and trader
+    aggregates. Each checkpoint is a single transaction in WAL mode, so a crash
+    leaves the previous checkpoint intact. A checkpoint of changes only writes
+    the seen trades and traders added since the previous one and prunes
+    seen trades at or below the dedup floor.
+    """
+    
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS seen_trades (
+            key TEXT PRIMARY KEY,
+            timestamp REAL
+        );
+        CREATE INDEX IF NOT EXISTS seen_trades_timestamp ON seen_trades (timestamp);
+        CREATE TABLE IF NOT EXISTS bloom (
+            generation TEXT PRIMARY KEY,
+            bits BLOB
+        );
+        CREATE TABLE IF NOT EXISTS markets (
+            condition_id TEXT PRIMARY KEY,
+            details TEXT,
+            expires_at REAL
+        );
+        CREATE TABLE IF NOT EXISTS traders (
+            wallet TEXT PRIMARY KEY,
+            data TEXT,
+            updated_at REAL
+        );
+    """
+    
+    def __init__(self, path: str, retention: float = 604800):
+        """
+        Initialize the store (the database is opened on first use)
+        
+        Args:
+            path: SQLite database file
+            retention: Seconds a trader aggregate is kept after it was last updated
+        """
+        self.path = path
+        self.retention = retention
+        self.conn = None
+        self.lock = threading.Lock()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database and create the schema if needed"""
+        if self.conn is None:
+            self.conn = sqlite3.connect(self.path, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('PRAGMA synchronous=NORMAL')
+            self.conn.executescript(self.SCHEMA)
+        return self.conn
+    
+    def load_meta(self, key: str) -> Any:
+        """
+        Get a JSON value from the meta table
+        
+        Args:
+            key: Meta key
+            
+        Returns:
+            Decoded value or None
+        """
+        with self.lock:
+            row = self._connect().execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+    
+    def load_dedup(self) -> Optional[Dict]:
+        """
+        Get the dedup snapshot saved by the last checkpoint
+        
+        Returns:
+            Snapshot dictionary for DedupWindow/BloomDedup.restore(), or None
+        """
+        snapshot = self.load_meta('dedup')
+        if snapshot is None:
+            return None
+        
+        with self.lock:
+            conn = self._connect()
+            if snapshot.get('mode') == 'bloom':
+                bits = dict(conn.execute('SELECT generation, bits FROM bloom').fetchall())
+                snapshot['current'] = bits.get('current', b'')
+                snapshot['previous'] = bits.get('previous', b'')
+            else:
+                snapshot['entries'] = conn.execute('SELECT timestamp, key FROM seen_trades').fetchall()
+        return snapshot
+    
+    def load_markets(self, condition_ids: List[str]) -> Dict[str, Tuple[Dict, float]]:
+        """
+        Get unexpired market details
+        
+        Args:
+            condition_ids: Market condition IDs
+            
+        Returns:
+            (details, remaining TTL in seconds) keyed by condition ID
+        """
+        if not condition_ids:
+            return {}
+        now = time.time()
+        placeholders = ','.join('?' * len(condition_ids))
+        with self.lock:
+            rows = self._connect().execute(
+                f'SELECT condition_id, details, expires_at FROM markets '
+                f'WHERE condition_id IN ({placeholders}) AND expires_at > ?',
+                (*condition_ids, now)
+            ).fetchall()
+        return {condition_id: (json.loads(details), expires_at - now) for condition_id, details, expires_at in rows}
+    
+    def load_trader(self, wallet: str) -> Optional[TraderAggregate]:
+        """
+        Get a wallet's saved aggregate
+        
+        Args:
+            wallet: The user's proxy wallet address
+            
+        Returns:
+            Stale TraderAggregate or None
+        """
+        with self.lock:
+            row = self._connect().execute('SELECT data FROM traders WHERE wallet = ?', (wallet,)).fetchone()
+        return TraderAggregate.from_dict(json.loads(row[0])) if row else None
+    
+    def checkpoint(self, meta: Dict[str, Any], dedup: Dict, markets: List[Tuple[str, Dict, float]],
+                   traders: List[Dict]):
+        """
+        Save monitor state in one transaction
+        
+        Args:
+            meta: JSON-serializable values stored by key (e.g. the poll watermark)
+            dedup: Snapshot from DedupWindow/BloomDedup.snapshot(); with 'changes' set
+                only its entries are added and its 'removed' keys deleted
+            markets: (condition ID, details, expiry timestamp) from MarketCache.snapshot()
+            traders: Aggregates from TraderStatsCache.snapshot() (all, or the changed ones)
+        """
+        now = time.time()
+        dedup = dict(dedup)
+        entries = dedup.pop('entries', None)
+        removed = dedup.pop('removed', [])
+        changes = dedup.pop('changes', False) and entries is not None
+        current = dedup.pop('current', None)
+        previous = dedup.pop('previous', None)
+        meta = dict(meta, dedup=dedup)
+        
+        with self.lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany(
+                    'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                    [(key, json.dumps(value)) for key, value in meta.items()]
+                )
+                if changes:
+                    conn.executemany('DELETE FROM seen_trades WHERE key = ?', [(key,) for key in removed])
+                else:
+                    conn.execute('DELETE FROM seen_trades')
+                conn.execute('DELETE FROM bloom')
+                if entries is not None:
+                    conn.executemany(
+                        'INSERT OR REPLACE INTO seen_trades (timestamp, key) VALUES (?, ?)', entries
+                    )
+                if changes and dedup.get('floor') is not None:
+                    conn.execute('DELETE FROM seen_trades WHERE timestamp <= ?', (dedup['floor'],))
+                if current is not None:
+                    conn.executemany(
+                        'INSERT INTO bloom (generation, bits) VALUES (?, ?)',
+                        [('current', current), ('previous', previous)]
+                    )
+                conn.executemany(
+                    'INSERT OR REPLACE INTO markets (condition_id, details, expires_at) VALUES (?, ?, ?)',
+                    [(condition_id, json.dumps(details), expires_at) for condition_id, details, expires_at in markets]
+                )
+                conn.execute('DELETE FROM markets WHERE expires_at <= ?', (now,))
+                conn.executemany(
+                    'INSERT OR REPLACE INTO traders (wallet, data, updated_at) VALUES (?, ?, ?)',
+                    [(data['wallet'], json.dumps(data), now) for data in traders]
+                )
+                conn.execute('DELETE FROM traders WHERE updated_at <= ?', (now - self.retention,))
+    
+    def close(self):
+        """Close the database"""
+        with self.lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
+
+
+def _prometheus_labels(labels: Dict[str, Any]) -> str:
+    """Format a label set, escaping values as the text format requires"""
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def render_prometheus(metrics: Dict) -> str:
+    """
+    Render a metrics snapshot from PolymarketMonitor.get_metrics() in the
+    Prometheus text exposition format
+    
+    Args:
+        metrics: Metrics snapshot
+        
+    Returns:
+        Exposition text
+    """
+    lines = []
+    
+    def family(name: str, kind: str, help_text: str, samples: List[Tuple[Dict, Any]]):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if value is not None:
+                lines.append(f"{name}{_prometheus_labels(labels)} {value}")
+    
+    def histogram(name: str, help_text: str, series: List[Tuple[Dict, List[int], float]]):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels, buckets, total in series:
+            cumulative = 0
+            for bound, count in zip(list(LATENCY_BUCKETS) + ['+Inf'], buckets):
+                cumulative += count
+                lines.append(f"{name}_bucket{_prometheus_labels(dict(labels, le=bound))} {cumulative}")
+            lines.append(f"{name}_sum{_prometheus_labels(labels)} {total}")
+            lines.append(f"{name}_count{_prometheus_labels(labels)} {cumulative}")
+    
+    poll = metrics['poll']
+    family('polymarket_uptime_seconds', 'gauge', 'Seconds since the monitor started', [({}, round(metrics['uptime'], 3))])
+    family('polymarket_poll_cycles_total', 'counter', 'Poll cycles run', [({}, poll['cycles'])])
+    family('polymarket_poll_pages_total', 'counter', 'Trade feed pages fetched', [({}, poll['pages'])])
+    family('polymarket_poll_trades_total', 'counter', 'Trades fetched from the feed', [({}, poll['trades'])])
+    family('polymarket_poll_gaps_total', 'counter', 'Polls that hit the page cap before the watermark', [({}, poll['gaps'])])
+    family('polymarket_poll_samples_total', 'counter', 'Unfiltered pages sampled to start a cash-filtered feed',
+           [({}, poll['samples'])])
+    family('polymarket_poll_interval_seconds', 'gauge', 'Current poll interval', [({}, poll['interval'])])
+    family('polymarket_poll_watermark_timestamp', 'gauge', 'Newest trade timestamp seen by the poller', [({}, poll['watermark'])])
+    
+    dedup = metrics['dedup']
+    family('polymarket_dedup_entries', 'gauge', 'Trades remembered by the dedup window', [({'mode': dedup['mode']}, dedup['size'])])
+    family('polymarket_dedup_evictions_total', 'counter', 'Trades dropped from the dedup window', [({}, dedup['evictions'])])
+    family('polymarket_dedup_late_total', 'counter', 'Trades older than the dedup floor', [({}, dedup['late'])])
+    
+    for cache in ('market_cache', 'trader_cache'):
+        stats = metrics[cache]
+        family(f'polymarket_{cache}_entries', 'gauge', f'Entries in the {cache.replace("_", " ")}', [({}, stats['size'])])
+        family(f'polymarket_{cache}_hits_total', 'counter', f'Hits in the {cache.replace("_", " ")}', [({}, stats['hits'])])
+        family(f'polymarket_{cache}_misses_total', 'counter', f'Misses in the {cache.replace("_", " ")}', [({}, stats['misses'])])
+        family(f'polymarket_{cache}_evictions_total', 'counter', f'Evictions from the {cache.replace("_", " ")}', [({}, stats['evictions'])])
+    family('polymarket_market_cache_negative_hits_total', 'counter', 'Hits on remembered market misses',
+           [({}, metrics['market_cache']['negative_hits'])])
+    family('polymarket_trader_cache_stale_total', 'counter', 'Trader cache lookups that found an expired entry',
+           [({}, metrics['trader_cache']['stale'])])
+    family('polymarket_trader_cache_syncs_total', 'counter', 'Incremental trader history syncs',
+           [({}, metrics['trader_cache']['syncs'])])
+    
+    sink = metrics['sink']
+    family('polymarket_sink_records_total', 'counter', 'Records written by the output sink', [({}, sink['records'])])
+    family('polymarket_sink_bytes_total', 'counter', 'Bytes written to output files', [({}, sink['bytes'])])
+    family('polymarket_sink_errors_total', 'counter', 'Output write errors', [({}, sink['errors'])])
+    family('polymarket_sink_backpressure_total', 'counter', 'Writes that waited on a full sink queue', [({}, sink['backpressure'])])
+    family('polymarket_sink_queue_depth', 'gauge', 'Records waiting for the writer thread', [({}, sink['queue_depth'])])
+    
+    profiles = metrics.get('profiles')
+    if profiles:
+        family('polymarket_profile_trades_total', 'counter', 'Trades logged per profile and category',
+               [({'profile': name, 'category': category}, stats[category])
+                for name, stats in profiles.items() for category in ('trades', 'unusual', 'tuna', 'whale', 'flow_spike')])
+    
+    flow = metrics.get('flow')
+    if flow:
+        family('polymarket_flow_keys', 'gauge', 'Markets or wallets held by a flow window',
+               [({'dimension': t['dimension'], 'window': t['window']}, t['keys']) for t in flow])
+        for key, help_text in (('observed', 'Trades added to a flow window'),
+                               ('late', 'Trades older than their flow window'),
+                               ('evictions', 'Cold keys evicted from a flow window'),
+                               ('spikes', 'Flow spike alerts')):
+            family(f'polymarket_flow_{key}_total', 'counter', help_text,
+                   [({'dimension': t['dimension'], 'window': t['window']}, t[key]) for t in flow])
+    
+    pipeline = metrics.get('pipeline')
+    if pipeline is not None:
+        family('polymarket_pipeline_queue_depth', 'gauge', 'Trades waiting for an enrichment worker',
+               [({}, pipeline['queue_depth'])])
+        family('polymarket_pipeline_oldest_age_seconds', 'gauge', 'Age of the oldest trade waiting for a worker',
+               [({}, pipeline['oldest_age'])])
+        family('polymarket_pipeline_workers', 'gauge', 'Enrichment workers', [({}, pipeline['workers'])])
+        family('polymarket_pipeline_tasks_total', 'counter', 'Pipeline tasks by outcome',
+               [({'status': status}, pipeline[status]) for status in ('submitted', 'completed', 'errors', 'discarded')])
+        family('polymarket_pipeline_backpressure_total', 'counter', 'Submissions that waited on a full queue',
+               [({}, pipeline['backpressure'])])
+        if 'shard_depth' in pipeline:
+            family('polymarket_pipeline_shard_depth', 'gauge', 'Trades in flight per shard worker process',
+                   [({'shard': shard}, depth) for shard, depth in enumerate(pipeline['shard_depth'])])
+            family('polymarket_pipeline_reorder_buffer', 'gauge', 'Enriched trades held back until earlier trades finish',
+                   [({}, pipeline['reorder_buffer'])])
+            family('polymarket_pipeline_worker_restarts_total', 'counter', 'Shard worker processes restarted',
+                   [({}, pipeline['restarts'])])
+    
+    source = metrics.get('source')
+    if source is not None and source['source'] == 'stream':
+        family('polymarket_stream_connected', 'gauge', 'Whether the trade stream is connected',
+               [({}, int(source['connected']))])
+        family('polymarket_stream_queue_depth', 'gauge', 'Streamed trades waiting to be processed',
+               [({}, source['queue_depth'])])
+        for key, help_text in (('connects', 'Trade stream connections opened'),
+                               ('disconnects', 'Trade stream connections lost'),
+                               ('messages', 'Trade stream messages received'),
+                               ('streamed', 'Trades received from the stream'),
+                               ('dropped', 'Streamed trades dropped on a full buffer'),
+                               ('catchups', 'REST catch-up polls after a (re)connect or overflow'),
+                               ('fallback_polls', 'REST polls while the stream was disconnected')):
+            family(f'polymarket_stream_{key}_total', 'counter', help_text, [({}, source[key])])
+    
+    transport = metrics['transport']
+    family('polymarket_api_requests_total', 'counter', 'API request attempts',
+           [({'endpoint': e, 'host': t['host']}, t['requests']) for e, t in transport.items()])
+    family('polymarket_api_errors_total', 'counter', 'API request attempts that failed',
+           [({'endpoint': e, 'host': t['host']}, t['errors']) for e, t in transport.items()])
+    family('polymarket_api_retries_total', 'counter', 'API request retries',
+           [({'endpoint': e, 'host': t['host']}, t['retries']) for e, t in transport.items()])
+    histogram('polymarket_api_request_duration_seconds', 'Latency of API request attempts',
+              [({'endpoint': e, 'host': t['host']}, t['buckets'], t['total_latency']) for e, t in transport.items()])
+    histogram('polymarket_stage_duration_seconds', 'Latency of pipeline stages',
+              [({'stage': stage}, stats['buckets'], stats['total']) for stage, stats in metrics['stages'].items()])
+    
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsServer:
+    """
+    Small HTTP server exposing the monitor's metrics on a background thread
+    
+    GET /metrics returns the Prometheus text format, GET /metrics.json the raw
+    snapshot. Metrics are only gathered when a request arrives.
+    """
+    
+    def __init__(self, monitor: 'PolymarketMonitor', host: str = '127.0.0.1', port: int = 9108):
+        """
+        Start serving
+        
+        Args:
+            monitor: Monitor whose metrics are served
+            host: Address to bind
+            port: Port to bind (0 picks a free port)
+            
+        Raises:
+            OSError: When the address cannot be bound
+        """
+        self.server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+        self.server.daemon_threads = True
+        self.server.monitor = monitor
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+        self.thread.start()
+    
+    def close(self):
+        """Stop serving and release the port"""
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """Request handler for MetricsServer"""
+    
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path == '/metrics':
+            body = render_prometheus(self.server.monitor.get_metrics()).encode()
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif path == '/metrics.json':
+            body = json.dumps(self.server.monitor.get_metrics()).encode()
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format: str, *args):
+        # Scrapes every few seconds would drown the trade log
+        logger.debug(f"Metrics request from {self.address_string()}: {format % args}")
+
+
+class WebSocketClient:
+    """
+    Minimal WebSocket client (RFC 6455) on the standard library
+    
+    Supports ws:// and wss://, text messages (fragmented or not), answers
+    pings and close frames, and sends pings. Enough for a JSON event feed.
+    """
+    
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+    
+    def __init__(self, url: str, timeout: float = 10.0):
+        """
+        Initialize the client (connect() opens the connection)
+        
+        Args:
+            url: ws:// or wss:// URL
+            timeout: Seconds allowed for connecting and for reading a started frame
+        """
+        self.url = url
+        self.timeout = timeout
+        self.sock = None
+        self.buffer = b''
+        self.last_received = 0.0
+    
+    def connect(self):
+        """
+        Open the connection and complete the opening handshake
+        
+        Raises:
+            ConnectionError: When the server does not accept the upgrade
+            OSError: On network errors
+        """
+        parsed = urlparse(self.url)
+        secure = parsed.scheme == 'wss'
+        port = parsed.port or (443 if secure else 80)
+        sock = socket.create_connection((parsed.hostname, port), timeout=self.timeout)
+        if secure:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=parsed.hostname)
+        self.sock = sock
+        self.buffer = b''
+        
+        key = base64.b64encode(os.urandom(16)).decode()
+        path = (parsed.path or '/') + (f"?{parsed.query}" if parsed.query else '')
+        sock.sendall((
+            f"GET {path} HTTP/1.1\r\nHost: {parsed.netloc}\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\nSec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        
+        while b'\r\n\r\n' not in self.buffer:
+            self._fill()
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        headers = dict(line.split(':', 1) for line in lines[1:] if ':' in line)
+        headers = {name.strip().lower(): value.strip() for name, value in headers.items()}
+        expected = base64.b64encode(hashlib.sha1((key + self.GUID).encode()).digest()).decode()
+        if ' 101 ' not in f"{lines[0]} " or headers.get('sec-websocket-accept') != expected:
+            raise ConnectionError(f"WebSocket upgrade refused: {lines[0]}")
+        self.last_received = time.monotonic()
+    
+    def _fill(self):
+        """Read more bytes into the buffer"""
+        data = self._socket().recv(65536)
+        if not data:
+            raise ConnectionError("Connection closed")
+        self.buffer += data
+    
+    def _socket(self) -> socket.socket:
+        """The open socket (close() may run on another thread)"""
+        sock = self.sock
+        if sock is None:
+            raise ConnectionError("Connection closed")
+        return sock
+    
+    def _read(self, n: int) -> bytes:
+        """Take exactly n bytes from the connection"""
+        while len(self.buffer) < n:
+            self._fill()
+        data, self.buffer = self.buffer[:n], self.buffer[n:]
+        return data
+    
+    @staticmethod
+    def _frame(opcode: int, payload: bytes = b'') -> bytes:
+        """Encode one final, masked frame"""
+        header = bytearray([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(0x80 | length)
+        elif length < 65536:
+            header.append(0x80 | 126)
+            header += length.to_bytes(2, 'big')
+        else:
+            header.append(0x80 | 127)
+            header += length.to_bytes(8, 'big')
+        mask = os.urandom(4)
+        return bytes(header) + mask + bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    
+    def _send_frame(self, opcode: int, payload: bytes = b''):
+        """Send one frame"""
+        self._socket().sendall(self._frame(opcode, payload))
+    
+    def send_text(self, text: str):
+        """Send a text message"""
+        self._send_frame(0x1, text.encode())
+    
+    def ping(self):
+        """Send a ping; the server's pong counts as activity"""
+        self._send_frame(0x9)
+    
+    def recv(self, timeout: float) -> Optional[str]:
+        """
+        Wait for the next text message
+        
+        Args:
+            timeout: Seconds to wait for a message to start
+            
+        Returns:
+            The message, or None if nothing arrived in time
+            
+        Raises:
+            ConnectionError: When the server closes the connection
+            OSError: On network errors
+        """
+        deadline = time.monotonic() + timeout
+        fragments = []
+        while True:
+            if not self.buffer and not fragments:
+                sock = self._socket()
+                pending = sock.pending() if isinstance(sock, ssl.SSLSocket) else 0
+                remaining = deadline - time.monotonic()
+                if not pending and (remaining <= 0 or not select.select([sock], [], [], remaining)[0]):
+                    return None
+            
+            first, second = self._read(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = int.from_bytes(self._read(2), 'big')
+            elif length == 127:
+                length = int.from_bytes(self._read(8), 'big')
+            mask = self._read(4) if second & 0x80 else None
+            payload = self._read(length)
+            if mask:
+                payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+            self.last_received = time.monotonic()
+            
+            if opcode == 0x8:
+                try:
+                    self._send_frame(0x8, payload[:2])
+                except OSError:
+                    pass
+                raise ConnectionError("Connection closed by server")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            fragments.append(payload)
+            if first & 0x80:
+                return b''.join(fragments).decode('utf-8', errors='replace')
+    
+    def close(self):
+        """Send a close frame (best effort) and close the socket; safe to call from another thread"""
+        sock, self.sock = self.sock, None
+        if sock is None:
+            return
+        try:
+            sock.sendall(self._frame(0x8, (1000).to_bytes(2, 'big')))
+        except OSError:
+            pass
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+class TradeSource(ABC):
+    """
+    Where PolymarketMonitor.run() gets its trades from
+    
+    Every source hands batches of trade records to the same dedup, classify,
+    enrich and log path. A paced source is polled: run() sleeps for the poll
+    interval between batches. An unpaced source blocks in next_batch() until
+    trades arrive (or a short wait passes) and is asked again right away.
+    Subclasses implement next_batch(); the other hooks default to no-ops.
+    """
+    
+    name = 'base'
+    paced = False
+    
+    def start(self):
+        """Start any background work (called once by run())"""
+    
+    @abstractmethod
+    def next_batch(self) -> Optional[List[TradeRecord]]:
+        """
+        Get the next batch of trades
+        
+        Returns:
+            Trade records (possibly empty), or None when the source is exhausted
+        """
+    
+    def close(self):
+        """Stop background work and release connections"""
+    
+    def get_stats(self) -> Dict:
+        """Get source counters"""
+        return {'source': self.name}
+
+
+class RestPollSource(TradeSource):
+    """Polls GET /trades back to the previous poll's watermark (the original behaviour)"""
+    
+    name = 'rest'
+    paced = True
+    
+    def __init__(self, monitor: 'PolymarketMonitor'):
+        """
+        Args:
+            monitor: Monitor whose poll_trades() is called
+        """
+        self.monitor = monitor
+    
+    def next_batch(self) -> Optional[List[TradeRecord]]:
+        return self.monitor.poll_trades()
+
+
+class StreamTradeSource(TradeSource):
+    """
+    Trades pushed over a long-lived WebSocket subscription
+    
+    A reader thread keeps the connection open (pinging it, reconnecting with
+    exponential backoff and jitter) and queues every trade it receives.
+    next_batch() returns whatever has arrived, waiting at most max_wait
+    seconds. Streamed trades advance the monitor's poll watermark; after every
+    (re)connect, and when the queue overflowed, the next batch first runs a
+    REST catch-up poll, which pages back to that watermark so trades missed
+    while disconnected are recovered. The watermark is held while a catch-up
+    is pending or trades have been dropped since the last one succeeded, so
+    streamed trades never move it past a gap. While disconnected the REST feed is
+    polled every poll interval.
+    """
+    
+    name = 'stream'
+    
+    def __init__(self, monitor: 'PolymarketMonitor', url: str, subscribe: Optional[str] = None,
+                 max_wait: float = 1.0, max_batch: int = 1000, queue_size: int = 10000,
+                 backoff_base: float = 1.0, backoff_max: float = 60.0, ping_interval: float = 20.0,
+                 idle_timeout: float = 60.0):
+        """
+        Args:
+            monitor: Monitor used for REST catch-up polls
+            url: ws:// or wss:// URL of the trade feed
+            subscribe: Message sent after connecting (e.g. a JSON subscription)
+            max_wait: Longest next_batch() blocks waiting for a trade
+            max_batch: Most streamed trades returned in one batch
+            queue_size: Trades buffered between the reader thread and next_batch()
+            backoff_base: First reconnect delay in seconds, doubled per failed attempt
+            backoff_max: Longest reconnect delay
+            ping_interval: Seconds between pings on a quiet connection
+            idle_timeout: Reconnect when nothing has been received for this long
+        """
+        self.monitor = monitor
+        self.url = url
+        self.subscribe = subscribe
+        self.max_wait = max_wait
+        self.max_batch = max(1, max_batch)
+        self.queue = queue.Queue(maxsize=max(1, queue_size))
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.client = None
+        self.thread = None
+        self.stopping = threading.Event()
+        self.connected = threading.Event()
+        # The first batch is a REST poll, like the first poll of the REST source
+        self.resync = threading.Event()
+        self.resync.set()
+        self.last_rest_poll = 0.0
+        # Drop count covered by the last successful catch-up poll
+        self.synced_drops = 0
+        self.stats = {
+            'connects': 0,
+            'disconnects': 0,
+            'messages': 0,
+            'streamed': 0,
+            'dropped': 0,
+            'catchups': 0,
+            'fallback_polls': 0
+        }
+    
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='trade-stream', daemon=True)
+        self.thread.start()
+    
+    def _run(self):
+        """Reader loop: connect, subscribe and queue trades until stopped"""
+        attempt = 0
+        while not self.stopping.is_set():
+            self.client = WebSocketClient(self.url)
+            try:
+                self.client.connect()
+                if self.subscribe:
+                    self.client.send_text(self.subscribe)
+                attempt = 0
+                self.stats['connects'] += 1
+                # Anything between the last streamed trade and now comes from REST
+                self.resync.set()
+                self.connected.set()
+                logger.info(f"Trade stream connected to {self.url}")
+                self._read(self.client)
+            except (OSError, ConnectionError, ValueError) as e:
+                if self.stopping.is_set():
+                    break
+                if self.connected.is_set():
+                    self.stats['disconnects'] += 1
+                logger.warning(f"Trade stream disconnected: {e}")
+            finally:
+                self.connected.clear()
+                self.client.close()
+            
+            delay = min(self.backoff_max, self.backoff_base * 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            self.stopping.wait(delay)
+    
+    def _read(self, client: WebSocketClient):
+        """Read messages from an open connection until it fails or the source stops"""
+        last_ping = time.monotonic()
+        while not self.stopping.is_set():
+            message = client.recv(timeout=min(self.ping_interval, self.idle_timeout, 1.0))
+            now = time.monotonic()
+            if message is None:
+                if now - client.last_received > self.idle_timeout:
+                    raise ConnectionError(f"No data for {self.idle_timeout:.0f}s")
+                if now - max(last_ping, client.last_received) >= self.ping_interval:
+                    client.ping()
+                    last_ping = now
+                continue
+            
+            self.stats['messages'] += 1
+            for trade in self.parse_message(message):
+                try:
+                    self.queue.put_nowait(trade)
+                except queue.Full:
+                    # The REST catch-up recovers what the buffer could not hold
+                    self.stats['dropped'] += 1
+                    self.resync.set()
+    
+    @staticmethod
+    def parse_message(message: str) -> List[TradeRecord]:
+        """
+        Extract trades from a feed message
+        
+        Accepts a trade object, a list of trades, or an event envelope whose
+        'payload' holds either (e.g. {"topic": "activity", "type": "trades", "payload": {...}}).
+        Messages without trades (acknowledgements, heartbeats) give an empty list.
+        
+        Args:
+            message: Text message
+            
+        Returns:
+            Trade records
+        """
+        try:
+            data = json_loads(message)
+        except ValueError:
+            return []
+        if isinstance(data, dict) and 'payload' in data:
+            data = data['payload']
+        items = data if isinstance(data, list) else [data]
+        return [
+            TradeRecord.from_api(item) for item in items
+            if isinstance(item, dict) and 'size' in item and 'price' in item
+        ]
+    
+    def next_batch(self) -> Optional[List[TradeRecord]]:
+        monitor = self.monitor
+        trades = []
+        now = time.monotonic()
+        if self.resync.is_set() or (not self.connected.is_set() and now - self.last_rest_poll >= monitor.poll_interval):
+            if self.resync.is_set():
+                self.resync.clear()
+                self.stats['catchups'] += 1
+            else:
+                self.stats['fallback_polls'] += 1
+            self.last_rest_poll = now
+            dropped = self.stats['dropped']
+            trades = monitor.poll_trades()
+            if monitor.poll_failed:
+                # Try the catch-up again on the next batch
+                self.resync.set()
+            else:
+                self.synced_drops = dropped
+        
+        streamed = []
+        try:
+            streamed.append(self.queue.get(timeout=0 if trades else self.max_wait))
+            while len(streamed) < self.max_batch:
+                streamed.append(self.queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if streamed:
+            self.stats['streamed'] += len(streamed)
+            # Until a catch-up has covered every dropped trade, the next one must page back past them
+            gap = self.resync.is_set() or self.stats['dropped'] != self.synced_drops
+            newest = max((t.timestamp for t in streamed if t.timestamp is not None), default=None)
+            if not gap and newest is not None and (monitor.poll_watermark is None or newest > monitor.poll_watermark):
+                monitor.poll_watermark = newest
+        return trades + streamed
+    
+    def close(self):
+        self.stopping.set()
+        client = self.client
+        if client is not None:
+            client.close()
+        if self.thread is not None:
+            self.thread.join(5)
+            self.thread = None
+    
+    def get_stats(self) -> Dict:
+        return dict(
+            self.stats,
+            source=self.name,
+            connected=self.connected.is_set(),
+            queue_depth=self.queue.qsize()
+        )
+
+
+class FileTradeSource(TradeSource):
+    """
+    Trades read from JSONL files (captured /trades responses, single API trades
+    or the monitor's own trades.json records), in batches of batch_seconds of
+    trade time; exhausted at the end of the last file
+    """
+    
+    name = 'file'
+    
+    def __init__(self, paths: List[str], batch_seconds: float = 30):
+        """
+        Args:
+            paths: JSONL files, oldest first
+            batch_seconds: Seconds of trade time per batch for single trades
+        """
+        self.paths = paths
+        self.batches = read_trade_batches(paths, batch_seconds)
+        self.stats = {'batches': 0, 'trades': 0}
+    
+    def next_batch(self) -> Optional[List[TradeRecord]]:
+        batch = next(self.batches, None)
+        if batch is not None:
+            self.stats['batches'] += 1
+            self.stats['trades'] += len(batch)
+        return batch
+    
+    def get_stats(self) -> Dict:
+        return dict(self.stats, source=self.name)
+
+
+class MonitorProfile:
+    """
+    One threshold configuration (e.g. a desk) watching the shared trade feed
+    
+    Profiles share the monitor's poll, dedup window, market cache and trader
+    cache; each has its own thresholds, output directory and sink.
+    """
+    
+    def __init__(self, name: str, threshold: float, tuna_min: float, tuna_max: float, whale_min: float,
+                 unusual_trader_threshold: int, data_dir: Optional[str] = None):
+        """
+        Initialize the profile (the sink is attached by the monitor)
+        
+        Args:
+            name: Profile name, shown in trade banners and output records
+            threshold: Minimum trade size in USD to log
+            tuna_min: Lower bound of tuna trades in USD
+            tuna_max: Upper bound (exclusive) of tuna trades in USD
+            whale_min: Lower bound of whale trades in USD
+            unusual_trader_threshold: Traders with fewer previous trades are unusual
+            data_dir: Output directory (default: <monitor data dir>/<name>)
+        """
+        self.name = name
+        self.threshold = threshold
+        self.tuna_min = tuna_min
+        self.tuna_max = tuna_max
+        self.whale_min = whale_min
+        self.unusual_trader_threshold = unusual_trader_threshold
+        self.data_dir = data_dir
+        self.classifier = BatchClassifier(threshold, tuna_min, tuna_max, whale_min, use_numpy=False)
+        self.sink = None
+        # Trades are logged from the enrichment workers, so the counters take a lock
+        self.lock = threading.Lock()
+        self.stats = {
+            'trades': 0,
+            'unusual': 0,
+            'tuna': 0,
+            'whale': 0,
+            'flow_spike': 0
+        }
+    
+    @classmethod
+    def from_dict(cls, spec: Dict, defaults: 'PolymarketMonitor') -> 'MonitorProfile':
+        """
+        Build a profile from its JSON description; missing values come from the monitor
+        
+        Args:
+            spec: Object with name and optionally threshold, tuna_min, tuna_max,
+                whale_min, unusual_trader_threshold and data_dir
+            defaults: Monitor whose settings fill in missing values
+            
+        Returns:
+            MonitorProfile
+            
+        Raises:
+            ValueError: When the name is missing
+        """
+        if not spec.get('name'):
+            raise ValueError(f"Profile without a name: {spec}")
+        return cls(
+            name=str(spec['name']),
+            threshold=float(spec.get('threshold', defaults.threshold)),
+            tuna_min=float(spec.get('tuna_min', defaults.TUNA_MIN)),
+            tuna_max=float(spec.get('tuna_max', defaults.TUNA_MAX)),
+            whale_min=float(spec.get('whale_min', defaults.WHALE_MIN)),
+            unusual_trader_threshold=int(spec.get('unusual_trader_threshold', defaults.UNUSUAL_TRADER_THRESHOLD)),
+            data_dir=spec.get('data_dir')
+        )
+    
+    def count_trade(self, is_unusual: bool, is_tuna: bool, is_whale: bool, is_flow_spike: bool):
+        """
+        Count a logged trade under its categories
+        
+        Args:
+            is_unusual: Whether the trader is unusual
+            is_tuna: Whether the trade is a tuna trade
+            is_whale: Whether the trade is a whale trade
+            is_flow_spike: Whether the trade set off a flow spike
+        """
+        with self.lock:
+            self.stats['trades'] += 1
+            self.stats['unusual'] += is_unusual
+            self.stats['tuna'] += is_tuna
+            self.stats['whale'] += is_whale
+            self.stats['flow_spike'] += is_flow_spike
+    
+    def get_stats(self) -> Dict:
+        """
+        Get the profile's counters
+        
+        Returns:
+            Dictionary with logged trade counts by category, the threshold and sink counters
+        """
+        with self.lock:
+            stats = dict(self.stats)
+        return dict(
+            stats,
+            threshold=self.threshold,
+            sink=self.sink.get_stats() if self.sink is not None else None
+        )
+
+
+class PolymarketMonitor:
+    """Monitor and analyze Polymarket trades"""
+    
+    BASE_URL = "https://data-api.polymarket.com"
+    GAMMA_API_URL = "https://gamma-api.polymarket.com"
+    
+    def __init__(self, threshold: float = 5000, poll_interval: int = 30, data_dir: Optional[str] = None):
+        """
+        Initialize the monitor
+        
+        Args:
+            threshold: Minimum trade size in USD to log (default: 5000)
+            poll_interval: Seconds between API polls (default: 30)
+            data_dir: Directory for JSON output and databases (default: /app/data in Docker, else data)
+        """
+        self.threshold = threshold
+        self.poll_interval = poll_interval
+        
+        # Bounded record of processed trades: 'window' keeps exact keys for a
+        # time window, 'bloom' caps memory with rotating Bloom filters
+        dedup_mode = os.getenv('DEDUP_MODE', 'window').lower()
+        if dedup_mode == 'bloom':
+            self.seen_transactions = BloomDedup(
+                capacity=int(os.getenv('DEDUP_BLOOM_CAPACITY', '200000')),
+                error_rate=float(os.getenv('DEDUP_BLOOM_ERROR_RATE', '0.001'))
+            )
+        else:
+            self.seen_transactions = DedupWindow(
+                window=float(os.getenv('DEDUP_WINDOW', '21600')),
+                max_entries=int(os.getenv('DEDUP_MAX_ENTRIES', '200000'))
+            )
+        # 'composite' keeps separate fills of one transaction apart; 'transaction' keys on the hash alone
+        self.DEDUP_KEY = os.getenv('DEDUP_KEY', 'composite').lower()
+        
+        # Cache market details by condition ID (bounded, with negative entries)
+        self.market_cache = MarketCache(
+            max_size=int(os.getenv('MARKET_CACHE_SIZE', '10000')),
+            ttl=float(os.getenv('MARKET_CACHE_TTL', '3600')),
+            negative_ttl=float(os.getenv('MARKET_NEGATIVE_TTL', '300'))
+        )
+        # Market prefetch per batch: 'batch' asks Gamma for many condition IDs in
+        # one request, 'fanout' looks each one up concurrently
+        self.MARKET_PREFETCH_MODE = os.getenv('MARKET_PREFETCH_MODE', 'batch').lower()
+        self.MARKET_BATCH_SIZE = max(1, int(os.getenv('MARKET_BATCH_SIZE', '50')))
+        
+        # Trader statistics cache so repeat wallets are not re-fetched
+        self.trader_cache = TraderStatsCache(
+            max_size=int(os.getenv('TRADER_CACHE_SIZE', '5000')),
+            ttl=float(os.getenv('TRADER_CACHE_TTL', '900'))
+        )
+        
+        # Incremental history sync for stale cached wallets: page size and page cap
+        # before falling back to a full history fetch
+        self.HISTORY_SYNC_PAGE_SIZE = max(1, int(os.getenv('HISTORY_SYNC_PAGE_SIZE', '50')))
+        self.HISTORY_SYNC_MAX_PAGES = max(1, int(os.getenv('HISTORY_SYNC_MAX_PAGES', '10')))
+        
+        # Trade category thresholds (configurable via environment variables)
+        self.TUNA_MIN = float(os.getenv('TUNA_MIN', '5000'))
+        self.TUNA_MAX = float(os.getenv('TUNA_MAX', '100000'))
+        self.WHALE_MIN = float(os.getenv('WHALE_MIN', '100000'))
+        self.UNUSUAL_TRADER_THRESHOLD = int(os.getenv('UNUSUAL_TRADER_THRESHOLD', '10'))
+        
+        # Profiles: several threshold configurations sharing one poll, dedup window and
+        # cache set. The monitor itself then screens for the loosest of them: the lowest
+        # threshold and whale bound, and a probe deep enough for every unusual threshold
+        self.profiles = []
+        profiles_file = os.getenv('PROFILES_FILE')
+        if profiles_file:
+            with open(profiles_file) as f:
+                self.profiles = [MonitorProfile.from_dict(spec, self) for spec in json.load(f)]
+            if len({profile.name for profile in self.profiles}) < len(self.profiles):
+                raise ValueError(f"Profile names in {profiles_file} must be unique")
+        if self.profiles:
+            self.threshold = min(profile.threshold for profile in self.profiles)
+            self.WHALE_MIN = min(profile.whale_min for profile in self.profiles)
+            self.UNUSUAL_TRADER_THRESHOLD = max(profile.unusual_trader_threshold for profile in self.profiles)
+        
+        # Batch classification: 'auto' uses NumPy when installed, 'numpy' or 'python' force a backend
+        backend = os.getenv('CLASSIFIER_BACKEND', 'auto').lower()
+        self.classifier = BatchClassifier(
+            threshold=self.threshold,
+            tuna_min=self.TUNA_MIN,
+            tuna_max=self.TUNA_MAX,
+            whale_min=self.WHALE_MIN,
+            use_numpy=None if backend == 'auto' else backend == 'numpy'
+        )
+        
+        # Rolling flow aggregates per market and wallet; trades that set off a
+        # spike rule are logged in the flow spike category whatever their size
+        self.FLOW_SPIKES = env_flag('FLOW_SPIKES')
+        self.flow_trackers = self.make_flow_trackers() if self.FLOW_SPIKES else []
+        self.flow_alerts = {}  # trade key -> spikes, until the trade is logged
+        
+        # Trader enrichment: 'concurrent' runs lookups on a bounded worker pool,
+        # 'serial' keeps the original one-trade-at-a-time behaviour
+        self.ENRICHMENT_MODE = os.getenv('ENRICHMENT_MODE', 'concurrent').lower()
+        self.ENRICHMENT_CONCURRENCY = max(1, int(os.getenv('ENRICHMENT_CONCURRENCY', '4')))
+        self._enrichment_pool = None
+        self._pool_lock = threading.Lock()  # guards lazy creation of the worker pools
+        
+        # Pipeline: 'inline' polls, enriches and logs in one loop; 'staged' hands
+        # qualifying trades to ENRICHMENT_CONCURRENCY workers through a bounded
+        # priority queue, so slow lookups never delay the next poll
+        self.PIPELINE_MODE = os.getenv('PIPELINE_MODE', 'inline').lower()
+        self.PIPELINE_QUEUE_SIZE = max(1, int(os.getenv('PIPELINE_QUEUE_SIZE', '1000')))
+        self.PIPELINE_DRAIN_TIMEOUT = float(os.getenv('PIPELINE_DRAIN_TIMEOUT', '30'))
+        # 'sharded' runs trader lookups in SHARD_PROCESSES worker processes instead,
+        # each owning the wallets that hash to it
+        self.SHARD_PROCESSES = max(1, int(os.getenv('SHARD_PROCESSES', '2')))
+        self.pipeline = None
+        self._stop = threading.Event()
+        
+        # Enrichment depth: 'tiered' only probes UNUSUAL_TRADER_THRESHOLD + 1 trades
+        # for non-whale trades, 'full' always fetches the full history.
+        # ENRICHMENT_DEFERRED_FULL fetches the full history of probed wallets in the background.
+        self.ENRICHMENT_DEPTH = os.getenv('ENRICHMENT_DEPTH', 'tiered').lower()
+        self.ENRICHMENT_DEFERRED_FULL = env_flag('ENRICHMENT_DEFERRED_FULL')
+        
+        # Full history mode: page past the 500-trade limit, fetching several pages
+        # at a time, up to a page cap
+        self.HISTORY_FULL_PAGINATION = env_flag('HISTORY_FULL_PAGINATION')
+        self.HISTORY_PARALLEL_PAGES = max(1, int(os.getenv('HISTORY_PARALLEL_PAGES', '4')))
+        self.HISTORY_MAX_PAGES = max(1, int(os.getenv('HISTORY_MAX_PAGES', '20')))
+        self._history_pool = None
+        
+        # API base URLs can be pointed elsewhere, e.g. at a local mock for benchmarks
+        self.BASE_URL = os.getenv('DATA_API_URL', self.BASE_URL).rstrip('/')
+        self.GAMMA_API_URL = os.getenv('GAMMA_API_URL', self.GAMMA_API_URL).rstrip('/')
+        
+        # Shared HTTP transport for all API calls (pooling, retries, per-host rate limits)
+        self.transport = HttpTransport(
+            timeout=float(os.getenv('HTTP_TIMEOUT', '10')),
+            max_retries=int(os.getenv('HTTP_MAX_RETRIES', '3')),
+            backoff_base=float(os.getenv('HTTP_BACKOFF_BASE', '0.5')),
+            pool_size=max(
+                self.ENRICHMENT_CONCURRENCY * (self.HISTORY_PARALLEL_PAGES if self.HISTORY_FULL_PAGINATION else 1),
+                int(os.getenv('HTTP_POOL_SIZE', '10'))
+            ),
+            rate_limits={
+                urlparse(self.BASE_URL).netloc: float(os.getenv('DATA_API_RATE_LIMIT', '10')),
+                urlparse(self.GAMMA_API_URL).netloc: float(os.getenv('GAMMA_API_RATE_LIMIT', '10'))
+            }
+        )
+        
+        # Paginated polling: keep paging back until the newest trade timestamp
+        # processed by the previous poll is reached, up to a per-cycle page cap
+        self.POLL_PAGE_SIZE = max(1, int(os.getenv('POLL_PAGE_SIZE', '100')))
+        self.POLL_MAX_PAGES = max(1, int(os.getenv('POLL_MAX_PAGES', '10')))
+        self.poll_watermark = None
+        self.poll_failed = False  # whether the last poll stopped at a page that failed to load
+        
+        # Trade feed filtering: 'cash' asks the data-api for trades worth at least the
+        # threshold only, so each page reaches much further back; 'none' fetches every trade
+        self.POLL_FILTER = os.getenv('POLL_FILTER', 'none').lower()
+        self.poll_stats = {
+            'cycles': 0,
+            'pages': 0,
+            'trades': 0,
+            'gaps': 0,
+            'samples': 0
+        }
+        
+        # Trade source for run(): 'rest' polls GET /trades, 'stream' subscribes to a
+        # WebSocket trade feed (with REST catch-up after reconnects), 'file' reads
+        # JSONL files from TRADE_SOURCE_FILES and stops at their end
+        self.TRADE_SOURCE = os.getenv('TRADE_SOURCE', 'rest').lower()
+        self.source = None
+        
+        # Per-stage latency: poll, dedup, classify, prefetch, enrich (waiting on lookups),
+        # analyze_trader, market_lookup, log, and the sink's file_write and store_insert
+        self.stage_timer = StageTimer()
+        
+        # Poll scheduling: 'fixed' sleeps poll_interval after each cycle, 'adaptive'
+        # tunes the interval between the bounds from batch overlap and keeps a steady cadence
+        self.POLL_MODE = os.getenv('POLL_MODE', 'fixed').lower()
+        self.scheduler = AdaptivePollScheduler(
+            interval=poll_interval,
+            min_interval=float(os.getenv('POLL_MIN_INTERVAL', '5')),
+            max_interval=float(os.getenv('POLL_MAX_INTERVAL', '120'))
+        )
+        
+        # Create data directory for JSON files
+        self.data_dir = data_dir or ('/app/data' if os.path.exists('/app/data') else 'data')
+        os.makedirs(self.data_dir, exist_ok=True)
+        
+        # Indexed trade store (each trade written once); the per-category JSONL
+        # files are an optional export, on by default only without the store
+        self.trade_store = None
+        use_trade_store = os.getenv('TRADE_STORE', 'sqlite').lower() == 'sqlite'
+        if use_trade_store and not self.profiles:
+            self.trade_store = TradeStore(os.getenv('TRADE_DB_PATH', os.path.join(self.data_dir, 'trades.db')))
+        self.OUTPUT_JSONL = env_flag('OUTPUT_JSONL', not use_trade_store)
+        
+        # Buffered writer for the JSON output files and the trade store
+        self.sink = self.make_sink(self.data_dir, self.trade_store)
+        
+        # Each profile writes its own output files and trade store
+        for profile in self.profiles:
+            profile.data_dir = profile.data_dir or os.path.join(self.data_dir, profile.name)
+            os.makedirs(profile.data_dir, exist_ok=True)
+            store = TradeStore(os.path.join(profile.data_dir, 'trades.db')) if use_trade_store else None
+            profile.sink = self.make_sink(profile.data_dir, store)
+        
+        # Persistent state for warm restarts: restored when run() starts, market and
+        # trader entries are read lazily on cache misses
+        self.state_store = None
+        if os.getenv('STATE_STORE', 'sqlite').lower() == 'sqlite':
+            self.state_store = StateStore(
+                os.getenv('STATE_DB_PATH', os.path.join(self.data_dir, 'state.db')),
+                retention=float(os.getenv('STATE_TRADER_RETENTION', '604800'))
+            )
+        self.STATE_CHECKPOINT_INTERVAL = float(os.getenv('STATE_CHECKPOINT_INTERVAL', '300'))
+        self._last_checkpoint = time.monotonic()
+        # The first checkpoint of a run (and the one after a failed write) saves
+        # everything; later ones only what changed since
+        self._checkpoint_full = True
+        
+        # Metrics: served over HTTP while run() is active when METRICS_PORT is set,
+        # and dumped to METRICS_FILE every METRICS_DUMP_INTERVAL seconds when it is set.
+        # Nothing is collected beyond the counters above until a scrape or dump asks for it
+        self.METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+        self.METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+        self.METRICS_FILE = os.getenv('METRICS_FILE', '')
+        self.METRICS_DUMP_INTERVAL = float(os.getenv('METRICS_DUMP_INTERVAL', '60'))
+        self.metrics_server = None
+        self._last_metrics_dump = time.monotonic()
+        self._started = time.time()
+        
+    def get_recent_trades(self, limit: int = 100, offset: int = 0,
+                          min_cash: Optional[float] = None) -> Optional[List[TradeRecord]]:
+        """
+        Fetch recent trades from Polymarket
+        
+        Args:
+            limit: Number of trades to fetch (max 10000)
+            offset: Number of most recent trades to skip
+            min_cash: Only return trades worth at least this many USDC (filtered server-side)
+            
+        Returns:
+            List of trade records, or None if the request failed (an empty list
+            means the feed has no trades at this offset)
+        """
+        url = f"{self.BASE_URL}/trades"
+        params = {
+            'limit': limit,
+            'offset': offset
+        }
+        if min_cash is not None:
+            params['filterType'] = 'CASH'
+            params['filterAmount'] = min_cash
+        
+        try:
+            return parse_trades(self.transport.get_json(url, params=params, endpoint='trades'))
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching trades: {e}")
+            return None
+    
+    def poll_trades(self) -> List[TradeRecord]:
+        """
+        Fetch every trade made since the previous poll
+        
+        Pages back through the feed until a page reaches a trade older than the
+        poll watermark (the newest trade timestamp seen by the previous poll).
+        The first poll fetches a single page. When the page cap is hit before
+        the watermark, a gap is recorded: trades may have been missed. A page that
+        fails to load also ends the poll with a gap, and the watermark stays where
+        it was so the next poll pages back over the same range.
+        
+        With POLL_FILTER=cash only trades at or above the threshold are fetched.
+        The first filtered poll samples one unfiltered page to find where the
+        window would have started and drops older trades, so a cold start does
+        not alert on hours of backlog.
+        
+        Returns:
+            List of trade records, newest first (pages may overlap)
+        """
+        start = time.perf_counter()
+        trades = []
+        page_size = self.POLL_PAGE_SIZE
+        watermark = self.poll_watermark
+        reached_watermark = watermark is None
+        pages = 0
+        
+        min_cash = None
+        window_start = None
+        watermark_floor = None
+        if self.POLL_FILTER == 'cash':
+            # Round down so trades exactly at the threshold are not lost to float
+            # rounding on the server; process_trades still checks the exact value
+            min_cash = math.floor(self.threshold)
+            if watermark is None:
+                sample = self.get_recent_trades(limit=page_size) or []
+                self.poll_stats['samples'] += 1
+                timestamps = [t['timestamp'] for t in sample if t.get('timestamp') is not None]
+                if timestamps:
+                    window_start = min(timestamps)
+                    # Also advances the watermark when no trade in the window qualifies
+                    watermark_floor = max(timestamps)
+        
+        failed = False
+        while True:
+            batch = self.get_recent_trades(limit=page_size, offset=pages * page_size, min_cash=min_cash)
+            pages += 1
+            if batch is None:
+                failed = True
+                break
+            trades.extend(batch)
+            
+            if watermark is None:
+                break
+            if len(batch) < page_size or any(
+                t.get('timestamp') is not None and t['timestamp'] < watermark for t in batch
+            ):
+                reached_watermark = True
+                break
+            if pages >= self.POLL_MAX_PAGES:
+                break
+        
+        if window_start is not None:
+            trades = [t for t in trades if t.get('timestamp') is None or t['timestamp'] >= window_start]
+        
+        self.poll_stats['cycles'] += 1
+        self.poll_stats['pages'] += pages
+        self.poll_stats['trades'] += len(trades)
+        
+        self.poll_failed = failed
+        if failed:
+            self.poll_stats['gaps'] += 1
+            logger.warning(
+                f"Gap detected: page {pages} of the trade feed failed to load after {len(trades)} trades; "
+                f"keeping the previous watermark so the next poll fetches the range again"
+            )
+        elif not reached_watermark:
+            self.poll_stats['gaps'] += 1
+            logger.warning(
+                f"Gap detected: {pages} pages ({len(trades)} trades) fetched without reaching the "
+                f"previous poll's newest trade; older trades may have been missed"
+            )
+        
+        timestamps = [t['timestamp'] for t in trades if t.get('timestamp') is not None]
+        if watermark_floor is not None:
+            timestamps.append(watermark_floor)
+        if timestamps and not failed:
+            newest = max(timestamps)
+            if self.poll_watermark is None or newest > self.poll_watermark:
+                self.poll_watermark = newest
+        
+        self.stage_timer.record('poll', time.perf_counter() - start)
+        return trades
+    
+    def get_user_trade_history(self, wallet_address: str, limit: int = 500,
+                               offset: int = 0) -> Optional[List[TradeRecord]]:
+        """
+        Get trades for a specific wallet address, newest first
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            limit: Number of trades to fetch (default: 500, the API maximum per request)
+            offset: Number of most recent trades to skip
+            
+        Returns:
+            List of trades by this user (max 500 due to API limit), or None if the
+            request failed
+        """
+        url = f"{self.BASE_URL}/trades"
+        params = {
+            'user': wallet_address,
+            'limit': limit
+        }
+        if offset:
+            params['offset'] = offset
+        
+        try:
+            return parse_trades(self.transport.get_json(url, params=params, endpoint='user_trades'))
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error fetching user history for {wallet_address}: {e}")
+            return None
+    
+    def get_user_trades_since(self, wallet_address: str, aggregate: TraderAggregate) -> Optional[List[Dict]]:
+        """
+        Get the trades a wallet made after the high-water mark of its aggregate
+        
+        Pages through the history newest first in small pages and stops at the
+        first trade the aggregate has already counted.
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            aggregate: Cached aggregate for the wallet
+            
+        Returns:
+            New trades, newest first, or None if the page cap was reached first
+            
+        Raises:
+            TradeFetchError: When a page failed to load
+        """
+        new_trades = []
+        page_size = self.HISTORY_SYNC_PAGE_SIZE
+        
+        for page in range(self.HISTORY_SYNC_MAX_PAGES):
+            batch = self.get_user_trade_history(wallet_address, limit=page_size, offset=page * page_size)
+            if batch is None:
+                raise TradeFetchError(f"History sync of {wallet_address} failed at page {page}")
+            for trade in batch:
+                if aggregate.is_known(trade):
+                    return new_trades
+                new_trades.append(trade)
+            if len(batch) < page_size:
+                return new_trades
+        
+        return None
+    
+    def get_market_details(self, condition_id: str) -> Optional[Dict]:
+        """
+        Get market details including category/tags from Gamma API
+        
+        Args:
+            condition_id: The market condition ID
+            
+        Returns:
+            Market details dictionary or None if not found
+        """
+        # Check cache first (including remembered misses)
+        found, market_details = self.market_cache.get(condition_id)
+        if found:
+            return market_details
+        
+        if self._load_markets([condition_id]):
+            return self.market_cache.get(condition_id)[1]
+        
+        url = f"{self.GAMMA_API_URL}/markets"
+        params = {
+            'condition_ids': condition_id,
+            'limit': 1
+        }
+        
+        try:
+            markets = self.transport.get_json(url, params=params, endpoint='markets')
+            market_details = markets[0] if markets else None
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Could not fetch market details for {condition_id}: {e}")
+            market_details = None
+        
+        # Cache the result; misses are kept for a shorter time
+        self.market_cache.put(condition_id, market_details)
+        return market_details
+    
+    def get_markets_details(self, condition_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Get market details for several markets in a single Gamma API request
+        
+        Args:
+            condition_ids: Market condition IDs
+            
+        Returns:
+            Market details keyed by condition ID, or None if the request failed
+        """
+        url = f"{self.GAMMA_API_URL}/markets"
+        params = {
+            'condition_ids': condition_ids,
+            'limit': len(condition_ids)
+        }
+        
+        try:
+            markets = self.transport.get_json(url, params=params, endpoint='markets_batch')
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"Could not fetch details for {len(condition_ids)} markets: {e}")
+            return None
+        
+        return {m['conditionId']: m for m in markets or [] if m.get('conditionId')}
+    
+    def prefetch_markets(self, trades: List[Dict]):
+        """
+        Load market details for every distinct uncached market in a batch
+        
+        In batch mode the condition IDs are requested in chunks of
+        MARKET_BATCH_SIZE, falling back to concurrent single lookups for a chunk
+        whose request fails. Markets missing from a response are cached as misses.
+        
+        Args:
+            trades: List of trade dictionaries
+        """
+        condition_ids = list(dict.fromkeys(
+            t['conditionId'] for t in trades
+            if t.get('conditionId') and t['conditionId'] not in self.market_cache
+        ))
+        restored = self._load_markets(condition_ids)
+        condition_ids = [c for c in condition_ids if c not in restored]
+        if not condition_ids:
+            return
+        
+        fanout_ids = []
+        if self.MARKET_PREFETCH_MODE == 'batch':
+            for i in range(0, len(condition_ids), self.MARKET_BATCH_SIZE):
+                chunk = condition_ids[i:i + self.MARKET_BATCH_SIZE]
+                markets = self.get_markets_details(chunk)
+                if markets is None:
+                    fanout_ids.extend(chunk)
+                    continue
+                for condition_id in chunk:
+                    self.market_cache.put(condition_id, markets.get(condition_id))
+        else:
+            fanout_ids = condition_ids
+        
+        if len(fanout_ids) > 1 and self.ENRICHMENT_MODE != 'serial':
+            list(self._get_enrichment_pool().map(self.get_market_details, fanout_ids))
+        else:
+            for condition_id in fanout_ids:
+                self.get_market_details(condition_id)
+        
+        logger.debug(f"Prefetched {len(condition_ids)} markets")
+    
+    def _load_markets(self, condition_ids: List[str]) -> List[str]:
+        """
+        Move saved market details from the state store into the cache
+        
+        Args:
+            condition_ids: Uncached market condition IDs
+            
+        Returns:
+            Condition IDs that were restored
+        """
+        if self.state_store is None or not condition_ids:
+            return []
+        
+        try:
+            saved = self.state_store.load_markets(condition_ids)
+        except sqlite3.Error as e:
+            logger.error(f"Error reading markets from state store: {e}")
+            return []
+        
+        for condition_id, (details, ttl) in saved.items():
+            self.market_cache.put(condition_id, details, ttl=ttl)
+        return list(saved)
+    
+    def calculate_trade_value(self, trade: Dict) -> float:
+        """
+        Calculate the USD value of a trade
+        
+        Args:
+            trade: Trade dictionary from API
+            
+        Returns:
+            Trade value in USD
+        """
+        if isinstance(trade, TradeRecord):
+            return trade.value
+        
+        # size is in tokens, price is per token (typically in USDC)
+        size = float(trade.get('size', 0))
+        price = float(trade.get('price', 0))
+        
+        # For SELL orders, calculate based on (1 - price) for the opposite outcome
+        # But for value calculation, we use the actual amount traded
+        return size * price
+    
+    def analyze_trader(self, wallet_address: str, trade: Optional[Dict] = None,
+                       full_history: bool = True) -> Dict:
+        """
+        Analyze a trader's history
+        
+        Fresh cached wallets are not re-fetched; the trade that triggered the
+        lookup is folded into the cached statistics instead. Stale cached wallets
+        only fetch the trades made since their last sync.
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            trade: Trade that triggered the lookup (optional)
+            full_history: Fetch the full history; when False, a probe of
+                UNUSUAL_TRADER_THRESHOLD + 1 trades is enough to classify the trader
+            
+        Returns:
+            Dictionary with trader statistics
+        """
+        trade_value = self.calculate_trade_value(trade) if trade else 0.0
+        cached_stats, aggregate = self.trader_cache.lookup(
+            wallet_address, trade, trade_value, allow_partial=not full_history
+        )
+        if cached_stats is not None:
+            return cached_stats
+        
+        if aggregate is None and self.state_store is not None:
+            # Aggregates saved by a previous run are synced like stale cache entries
+            try:
+                aggregate = self.state_store.load_trader(wallet_address)
+            except sqlite3.Error as e:
+                logger.error(f"Error reading trader from state store: {e}")
+            if aggregate is not None and aggregate.partial and full_history:
+                aggregate = None
+        
+        if aggregate is None and not full_history:
+            return self.probe_trader(wallet_address, trade, trade_value)
+        
+        if aggregate is not None:
+            try:
+                new_trades = self.get_user_trades_since(wallet_address, aggregate)
+            except TradeFetchError:
+                # Serve the old statistics this once without refreshing them; dropping
+                # the entry makes the wallet's next lookup fetch its history again
+                self.trader_cache.discard(wallet_address)
+                return aggregate.to_stats()
+            if new_trades is not None:
+                return self.trader_cache.store(
+                    aggregate, trade, trade_value,
+                    new_trades=new_trades,
+                    new_values=[self.calculate_trade_value(t) for t in new_trades]
+                )
+        
+        if self.HISTORY_FULL_PAGINATION:
+            aggregate = self.get_full_trader_history(wallet_address)
+            if aggregate is None:
+                return {
+                    'wallet': wallet_address,
+                    'total_trades': 0,
+                    'total_volume': 0,
+                    'markets_traded': 0,
+                    'has_more_trades': False
+                }
+            return self.trader_cache.store(aggregate, trade, trade_value)
+        
+        trades = self.get_user_trade_history(wallet_address)
+        
+        if not trades:
+            return {
+                'wallet': wallet_address,
+                'total_trades': 0,
+                'total_volume': 0,
+                'markets_traded': 0,
+                'has_more_trades': False
+            }
+        
+        # A full page may or may not be the whole history; probe one row past it
+        has_more_trades = False
+        if len(trades) >= 500:
+            # A failed probe leaves the count open ("500+") rather than claiming the full history
+            probe = self.get_user_trade_history(wallet_address, limit=1, offset=len(trades))
+            has_more_trades = probe is None or bool(probe)
+        
+        aggregate = TraderAggregate.from_history(
+            wallet_address,
+            trades,
+            [self.calculate_trade_value(t) for t in trades],
+            has_more_trades=has_more_trades
+        )
+        return self.trader_cache.store(aggregate, trade, trade_value)
+    
+    def get_full_trader_history(self, wallet_address: str) -> Optional[TraderAggregate]:
+        """
+        Build a trader's aggregate from their complete history
+        
+        After the first page, pages of 500 trades are requested
+        HISTORY_PARALLEL_PAGES at a time (the transport's rate limiter still applies) and each page is folded into the
+        aggregate as soon as it arrives, so the whole history is never held in
+        memory. Paging stops at the first short page or at HISTORY_MAX_PAGES.
+        If a page fails to load, paging stops and the aggregate is marked
+        partial, so it is never cached as the complete history.
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            
+        Returns:
+            TraderAggregate, or None if the wallet has no trades
+        """
+        page_size = 500
+        aggregate = TraderAggregate(wallet_address)
+        next_page = 0
+        last_page = None  # index of the first short page, once seen
+        failed_pages = []
+        
+        history_pool = self._get_history_pool()
+        
+        while last_page is None and not failed_pages and next_page < self.HISTORY_MAX_PAGES:
+            # Most wallets fit on the first page, so it is fetched on its own
+            wave_size = self.HISTORY_PARALLEL_PAGES if next_page else 1
+            wave = range(next_page, min(next_page + wave_size, self.HISTORY_MAX_PAGES))
+            futures = {
+                history_pool.submit(
+                    self.get_user_trade_history, wallet_address, limit=page_size, offset=page * page_size
+                ): page
+                for page in wave
+            }
+            for future in as_completed(futures):
+                page = futures[future]
+                trades = future.result()
+                if trades is None:
+                    failed_pages.append(page)
+                    continue
+                aggregate.add_history_page(
+                    trades, [self.calculate_trade_value(t) for t in trades], newest=page == 0
+                )
+                if len(trades) < page_size and (last_page is None or page < last_page):
+                    last_page = page
+            next_page = wave.stop
+        
+        if aggregate.total_trades == 0:
+            return None
+        
+        if failed_pages:
+            # Counts are a lower bound; a full lookup treats a partial aggregate as a miss
+            logger.warning(
+                f"History of {wallet_address} is incomplete: page(s) {sorted(failed_pages)} failed to load"
+            )
+            aggregate.has_more_trades = True
+            aggregate.partial = True
+        elif last_page is None:
+            # Past the page cap, one more row tells whether the history goes on
+            probe = self.get_user_trade_history(wallet_address, limit=1, offset=next_page * page_size)
+            aggregate.has_more_trades = probe is None or bool(probe)
+        return aggregate
+    
+    def probe_trader(self, wallet_address: str, trade: Optional[Dict] = None, trade_value: float = 0.0) -> Dict:
+        """
+        Classify a trader from their most recent UNUSUAL_TRADER_THRESHOLD + 1 trades
+        
+        A wallet with fewer trades than that is fully known from the probe. For
+        other wallets the statistics are marked partial; the full history can be
+        fetched later in the background (ENRICHMENT_DEFERRED_FULL).
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            trade: Trade that triggered the lookup (optional)
+            trade_value: USD value of the trade
+            
+        Returns:
+            Dictionary with trader statistics
+        """
+        limit = self.UNUSUAL_TRADER_THRESHOLD + 1
+        trades = self.get_user_trade_history(wallet_address, limit=limit)
+        
+        if not trades:
+            return {
+                'wallet': wallet_address,
+                'total_trades': 0,
+                'total_volume': 0,
+                'markets_traded': 0,
+                'has_more_trades': False
+            }
+        
+        partial = len(trades) >= limit
+        aggregate = TraderAggregate.from_history(
+            wallet_address,
+            trades,
+            [self.calculate_trade_value(t) for t in trades],
+            has_more_trades=partial,
+            partial=partial
+        )
+        stats = self.trader_cache.store(aggregate, trade, trade_value)
+        
+        if partial and self.ENRICHMENT_DEFERRED_FULL:
+            self._get_enrichment_pool().submit(self.analyze_trader, wallet_address)
+        return stats
+    
+    def log_trade(self, trade: Dict, trader_stats: Dict, profile: Optional[MonitorProfile] = None):
+        """
+        Log details about a trade and trader history to appropriate logs
+        
+        Args:
+            trade: Trade dictionary
+            trader_stats: Trader statistics dictionary
+            profile: Profile whose thresholds and output files to use (default: the monitor's own)
+        """
+        trade_value = self.calculate_trade_value(trade)
+        classifier = profile.classifier if profile is not None else self.classifier
+        unusual_threshold = profile.unusual_trader_threshold if profile is not None else self.UNUSUAL_TRADER_THRESHOLD
+        
+        # Determine trade categories
+        size_categories = classifier.size_categories(trade_value)
+        is_unusual = trader_stats['total_trades'] < unusual_threshold
+        is_tuna = bool(size_categories & CATEGORY_TUNA)
+        is_whale = bool(size_categories & CATEGORY_WHALE)
+        flow_spikes = self.flow_alerts.get(trade_key(trade)) if self.flow_alerts else None
+        is_flow_spike = bool(flow_spikes)
+        
+        # Extract fields from top-level trade object
+        market_title = trade.get('title', 'Unknown Market')
+        market_id = trade.get('conditionId', 'N/A')
+        market_slug = trade.get('slug', 'N/A')
+        event_slug = trade.get('eventSlug', 'N/A')
+        
+        # Try to get market category/tags from Gamma API
+        market_category = 'N/A'
+        market_tags = []
+        
+        if market_id and market_id != 'N/A':
+            # Details are prefetched per batch; never block on the network here
+            _, market_details = self.market_cache.get(market_id)
+            if market_details:
+                market_category = market_details.get('category', 'N/A')
                 # Some markets might have a tags field
                 if 'tags' in market_details:
                     market_tags = market_details.get('tags', [])
         
-        # Build trader display name
-        username = trader_stats.get('username', 'Anonymous')
-        pseudonym = trader_stats.get('pseudonym', '')
-        trader_display = f"{username} ({pseudonym})" if pseudonym else username
+        # Build category labels
+        categories = []
+        if is_whale:
+            categories.append("WHALE")
+        elif is_tuna:
+            categories.append("TUNA")
+        if is_unusual:
+            categories.append("UNUSUAL")
+        if is_flow_spike:
+            categories.append("FLOW SPIKE")
+        category_label = " + ".join(categories) if categories else "TRADE"
+        if profile is not None:
+            category_label += f" | {profile.name}"
+        
+        # Also save to JSON for easier parsing
+        trade_data = {
+            'timestamp': datetime.now().isoformat(),
+            'categories': {
+                'is_unusual': is_unusual,
+                'is_tuna': is_tuna,
+                'is_whale': is_whale,
+                'is_flow_spike': is_flow_spike
+            },
+            'trade': {
+                'value': trade_value,
+                'transaction_hash': trade.get('transactionHash'),
+                'market_title': market_title,
+                'market_id': market_id,
+                'market_slug': market_slug,
+                'event_slug': event_slug,
+                'market_category': market_category,
+                'market_tags': market_tags,
+                'outcome': trade.get('outcome'),
+                'side': trade.get('side'),
+                'size': trade.get('size'),
+                'price': trade.get('price'),
+                'trade_timestamp': trade.get('timestamp'),
+                'icon': trade.get('icon')
+            },
+            'trader': trader_stats
+        }
+        if is_flow_spike:
+            trade_data['flow'] = flow_spikes
+        if profile is not None:
+            trade_data['profile'] = profile.name
+            profile.count_trade(is_unusual, is_tuna, is_whale, is_flow_spike)
+        
+        # The banner is rendered by the logging thread, only if a handler emits it
+        log_message = TradeMessage(trade_data, category_label)
+        
+        # Log to main trades log (always)
+        logger.info(log_message)
+        
+        # Log to category-specific logs
+        if is_unusual:
+            unusual_logger.info(log_message)
+        if is_tuna:
+            tuna_logger.info(log_message)
+        if is_whale:
+            whale_logger.info(log_message)
+        if is_flow_spike:
+            flow_logger.info(log_message)
+        
+        # Save to appropriate JSON files (when the JSONL export is enabled)
+        json_files = []
+        if self.OUTPUT_JSONL:
+            json_files.append('trades.json')  # Always save to main trades file
+            if is_unusual:
+                json_files.append('unusual_trades.json')
+            if is_tuna:
+                json_files.append('tuna_trades.json')
+            if is_whale:
+                json_files.append('whale_trades.json')
+            if is_flow_spike:
+                json_files.append('flow_spike_trades.json')
+        
+        # Serialized once; the buffered sink writes the files and the trade store
+        sink = profile.sink if profile is not None else self.sink
+        sink.write(json_files, json.dumps(trade_data), trade_data)
+    
+    def _log_enriched(self, trade: Dict, trader_stats: Dict):
+        """
+        Log an enriched trade once for every profile whose threshold it meets
+        (flow spikes go to every profile)
+        
+        The lookups behind trader_stats ran once, whatever the number of profiles.
+        
+        Args:
+            trade: Trade dictionary
+            trader_stats: Trader statistics dictionary
+        """
+        key = trade_key(trade) if self.flow_alerts else None
+        if not self.profiles:
+            self.log_trade(trade, trader_stats)
+        else:
+            spiked = key in self.flow_alerts
+            trade_value = self.calculate_trade_value(trade)
+            for profile in self.profiles:
+                if spiked or trade_value >= profile.threshold:
+                    self.log_trade(trade, trader_stats, profile)
+        if key is not None:
+            self.flow_alerts.pop(key, None)
+    
+    def enrich_trade(self, trade: Dict) -> Dict:
+        """
+        Fetch everything log_trade needs for a trade (trader history and market details)
+        
+        Args:
+            trade: Trade dictionary
+            
+        Returns:
+            Trader statistics dictionary
+        """
+        # Tier 0 probe is enough to classify non-whale trades
+        full_history = (
+            self.ENRICHMENT_DEPTH == 'full' or self.calculate_trade_value(trade) >= self.WHALE_MIN
+        )
+        with self.stage_timer.time('analyze_trader'):
+            trader_stats = self.analyze_trader(trade.get('proxyWallet'), trade, full_history=full_history)
+        
+        # Fill in any market the batch prefetch could not load, so log_trade
+        # does not block on the Gamma API
+        condition_id = trade.get('conditionId')
+        if condition_id and condition_id not in self.market_cache:
+            with self.stage_timer.time('market_lookup'):
+                self.get_market_details(condition_id)
+        
+        return trader_stats
+    
+    def enrich_trades(self, trades: List[Dict]) -> Iterator[Tuple[Dict, Dict]]:
+        """
+        Enrich trades, yielding (trade, trader_stats) pairs in input order
+        
+        In concurrent mode lookups run on a bounded worker pool and results are
+        yielded as soon as the head of the batch is ready. In serial mode each
+        trade is enriched only when the previous one has been consumed.
+        
+        Args:
+            trades: List of qualifying trade dictionaries
+            
+        Returns:
+            Iterator of (trade, trader_stats) tuples
+        """
+        if self.ENRICHMENT_MODE == 'serial' or self.ENRICHMENT_CONCURRENCY <= 1 or len(trades) <= 1:
+            return zip(trades, map(self.enrich_trade, trades))
+        
+        return zip(trades, self._get_enrichment_pool().map(self.enrich_trade, trades))
+    
+    def _get_pipeline(self) -> Union[WorkQueue, ShardPool]:
+        """Get the pipeline's enrichment workers (threads, or processes when sharded), starting them on first use"""
+        if self.pipeline is None and self.PIPELINE_MODE == 'sharded':
+            self.pipeline = ShardPool(
+                processes=self.SHARD_PROCESSES,
+                threshold=self.threshold,
+                data_dir=self.data_dir,
+                on_result=self._log_result,
+                queue_size=self.PIPELINE_QUEUE_SIZE,
+                timer=self.stage_timer
+            )
+        elif self.pipeline is None:
+            self.pipeline = WorkQueue(
+                workers=self.ENRICHMENT_CONCURRENCY,
+                queue_size=self.PIPELINE_QUEUE_SIZE,
+                timer=self.stage_timer,
+                name='pipeline'
+            )
+        return self.pipeline
+    
+    def _prefetch_task(self, trades: List[Dict], done: threading.Event):
+        """Staged pipeline task: load market metadata for a batch, then release its trades"""
+        try:
+            with self.stage_timer.time('prefetch'):
+                self.prefetch_markets(trades)
+        finally:
+            done.set()
+    
+    def _enrich_and_log(self, trade: Dict, prefetched: threading.Event):
+        """Staged pipeline task: enrich one trade and hand it to the output sink"""
+        # The prefetch task sorts ahead of the batch's trades, so it is already running
+        prefetched.wait()
+        with self.stage_timer.time('enrich'):
+            trader_stats = self.enrich_trade(trade)
+        with self.stage_timer.time('log'):
+            self._log_enriched(trade, trader_stats)
+    
+    def _log_result(self, trade: Dict, trader_stats: Dict):
+        """Sharded pipeline callback: log a trade enriched by a worker process"""
+        with self.stage_timer.time('log'):
+            self._log_enriched(trade, trader_stats)
+    
+    def make_sink(self, directory: str, store: Optional[TradeStore] = None) -> JsonlSink:
+        """
+        Build an output sink with the OUTPUT_* settings
+        
+        Args:
+            directory: Directory holding the output files
+            store: Trade store receiving every record
+            
+        Returns:
+            JsonlSink
+        """
+        return JsonlSink(
+            directory,
+            flush_interval=float(os.getenv('OUTPUT_FLUSH_INTERVAL', '1.0')),
+            flush_records=int(os.getenv('OUTPUT_FLUSH_RECORDS', '100')),
+            fsync_interval=float(os.getenv('OUTPUT_FSYNC_INTERVAL', '10')),
+            max_bytes=int(os.getenv('OUTPUT_MAX_BYTES', '0')),
+            rotate_daily=env_flag('OUTPUT_ROTATE_DAILY'),
+            compress=env_flag('OUTPUT_COMPRESS'),
+            queue_size=int(os.getenv('OUTPUT_QUEUE_SIZE', '10000')),
+            store=store,
+            timer=self.stage_timer
+        )
+    
+    def make_flow_trackers(self) -> List[FlowTracker]:
+        """
+        Build the flow trackers from the FLOW_* settings
+        
+        Each of FLOW_MARKET_WINDOWS and FLOW_WALLET_WINDOWS is a comma-separated
+        list of window lengths in seconds; the rule settings are lists paired
+        with the windows (a single value applies to all of them).
+        
+        Returns:
+            One FlowTracker per market window and per wallet window
+        """
+        def values(name: str, default: str) -> List[float]:
+            return [float(v) for v in os.getenv(name, default).split(',') if v.strip()]
+        
+        def pick(items: List[float], i: int) -> float:
+            return items[min(i, len(items) - 1)] if items else 0
+        
+        buckets = int(os.getenv('FLOW_BUCKETS', '12'))
+        max_keys = int(os.getenv('FLOW_MAX_KEYS', '50000'))
+        trackers = []
+        
+        volume = values('FLOW_MARKET_VOLUME', '500000')
+        trades = values('FLOW_MARKET_TRADES', '0')
+        wallets = values('FLOW_MARKET_WALLETS', '0')
+        imbalance = values('FLOW_MARKET_IMBALANCE', '0')
+        imbalance_min_volume = values('FLOW_MARKET_IMBALANCE_MIN_VOLUME', '100000')
+        for i, window in enumerate(values('FLOW_MARKET_WINDOWS', '300')):
+            trackers.append(FlowTracker(
+                'market', window, buckets=buckets, max_keys=max_keys,
+                volume=pick(volume, i), trades=int(pick(trades, i)), distinct=int(pick(wallets, i)),
+                imbalance=pick(imbalance, i), imbalance_min_volume=pick(imbalance_min_volume, i)
+            ))
+        
+        # Wallet windows only count trades of FLOW_WALLET_MIN_VALUE and up (tuna-sized by
+        # default), which also keeps the many small wallets out of memory
+        volume = values('FLOW_WALLET_VOLUME', '0')
+        trades = values('FLOW_WALLET_TRADES', '5')
+        min_value = values('FLOW_WALLET_MIN_VALUE', str(self.TUNA_MIN))
+        for i, window in enumerate(values('FLOW_WALLET_WINDOWS', '3600')):
+            trackers.append(FlowTracker(
+                'wallet', window, buckets=buckets, max_keys=max_keys,
+                volume=pick(volume, i), trades=int(pick(trades, i)), min_value=pick(min_value, i)
+            ))
+        return trackers
+    
+    def observe_flow(self, trades: List[Dict], values: Sequence[float]) -> Dict[int, List[Dict]]:
+        """
+        Add a batch of new trades to the flow trackers
+        
+        Feeds arrive newest first, so the trades are observed in trade time order:
+        the windows only move forward and a spike lands on the trade that crossed
+        the threshold. Trades without a timestamp are observed last, as of now.
+        
+        Args:
+            trades: New (deduplicated) trades
+            values: Value of each trade in USD
+            
+        Returns:
+            Index in `trades` -> spikes set off by that trade
+        """
+        spikes = {}
+        order = sorted(range(len(trades)), key=lambda i: trades[i].get('timestamp') or math.inf)
+        for i in order:
+            trade = trades[i]
+            value = float(values[i])
+            for tracker in self.flow_trackers:
+                spike = tracker.observe(trade, value)
+                if spike is not None:
+                    spikes.setdefault(i, []).append(spike)
+        return spikes
+    
+    def make_trade_source(self) -> TradeSource:
+        """
+        Build the trade source selected by TRADE_SOURCE
+        
+        Returns:
+            Trade source for run()
+        """
+        if self.TRADE_SOURCE == 'stream':
+            return StreamTradeSource(
+                self,
+                url=os.getenv('STREAM_URL', 'wss://ws-live-data.polymarket.com'),
+                subscribe=os.getenv(
+                    'STREAM_SUBSCRIBE',
+                    '{"action": "subscribe", "subscriptions": [{"topic": "activity", "type": "trades"}]}'
+                ),
+                queue_size=int(os.getenv('STREAM_QUEUE_SIZE', '10000')),
+                backoff_base=float(os.getenv('STREAM_BACKOFF_BASE', '1')),
+                backoff_max=float(os.getenv('STREAM_BACKOFF_MAX', '60')),
+                ping_interval=float(os.getenv('STREAM_PING_INTERVAL', '20')),
+                idle_timeout=float(os.getenv('STREAM_IDLE_TIMEOUT', '60'))
+            )
+        if self.TRADE_SOURCE == 'file':
+            paths = [p for p in os.getenv('TRADE_SOURCE_FILES', '').split(',') if p.strip()]
+            return FileTradeSource([p.strip() for p in paths], batch_seconds=self.poll_interval)
+        return RestPollSource(self)
+    
+    def _get_enrichment_pool(self) -> ThreadPoolExecutor:
+        """Get the shared worker pool, creating it on first use"""
+        with self._pool_lock:
+            if self._enrichment_pool is None:
+                self._enrichment_pool = ThreadPoolExecutor(
+                    max_workers=self.ENRICHMENT_CONCURRENCY,
+                    thread_name_prefix='enrich'
+                )
+            return self._enrichment_pool
+    
+    def _get_history_pool(self) -> ThreadPoolExecutor:
+        """Get the pool fetching history pages in parallel, creating it on first use"""
+        with self._pool_lock:
+            if self._history_pool is None:
+                self._history_pool = ThreadPoolExecutor(
+                    max_workers=self.HISTORY_PARALLEL_PAGES,
+                    thread_name_prefix='history'
+                )
+            return self._history_pool
+    
+    def _dedup_key(self, trade: Dict) -> str:
+        """
+        Key a trade is recorded under in the dedup window
+        
+        Args:
+            trade: Trade dictionary
+            
+        Returns:
+            The transaction hash with DEDUP_KEY=transaction, else the composite trade_key()
+        """
+        return trade.get('transactionHash') if self.DEDUP_KEY == 'transaction' else trade_key(trade)
+    
+    def process_trades(self, trades: List[Dict]) -> int:
+        """
+        Process a list of trades, filtering and categorizing them
+        
+        Args:
+            trades: List of trade dictionaries
+            
+        Returns:
+            Number of trades that had not been seen before
+        """
+        unseen = []
+        timer = self.stage_timer
+        
+        with timer.time('dedup'):
+            for trade in trades:
+                key = self._dedup_key(trade)
+                
+                # Skip if we've already processed this trade
+                if not self.seen_transactions.add(key, trade.get('timestamp')):
+                    continue
+                unseen.append(trade)
         
-        # Build tags display
-        tags_display = ', '.join(market_tags) if market_tags else 'None'
+        # Threshold check for the whole batch at once; only survivors go further
+        with timer.time('classify'):
+            columns = self.classifier.columns(unseen)
+            indices, size_categories = self.classifier.classify(columns)
+        trades_found = len(indices)
+        flagged = dict(zip(indices, size_categories))
         
-        # Format trade count with "500+" indicator if applicable
-        trade_count = trader_stats['total_trades']
-        has_more = trader_stats.get('has_more_trades', False)
-        trade_count_display = f"{trade_count}+" if has_more else str(trade_count)
+        # Every new trade feeds the rolling flow windows; a trade that sets off a
+        # spike goes on to enrichment even when it is under the threshold
+        spikes = {}
+        if self.flow_trackers:
+            with timer.time('flow'):
+                spikes = self.observe_flow(unseen, columns.value)
+            for i in spikes:
+                if i not in flagged:
+                    flagged[i] = self.classifier.size_categories(columns.value[i])
         
-        # Build category labels
-        categories = []
-        if is_whale:
-            categories.append("WHALE")
-        elif is_tuna:
-            categories.append("TUNA")
-        if is_unusual:
-            categories.append("UNUSUAL")
-        category_label = " + ".join(categories) if categories else "TRADE"
+        qualifying_trades = []
+        whale_sized = []
         
-        log_message = f"""
-{'='*80}
-TRADE DETECTED: ${trade_value:,.2f} [{category_label}]
-{'='*80}
-Trade Details:
-  - Transaction Hash: {trade.get('transactionHash', 'N/A')}
-  - Market: {market_title}
-  - Market ID: {market_id}
-  - Market Slug: {market_slug}
-  - Event Slug: {event_slug}
-  - Category: {market_category}
-  - Tags: {tags_display}
-  - Outcome: {trade.get('outcome', 'N/A')}
-  - Side: {trade.get('side', 'N/A')}
-  - Size: {trade.get('size', 0)} tokens
-  - Price: ${trade.get('price', 0)}
-  - Timestamp: {trade.get('timestamp', 'N/A')}
-
-Trader Information:
-  - Wallet: {trader_stats['wallet']}
-  - Username: {trader_display}
-  - Total Historical Trades: {trade_count_display}
-  - Total Volume Traded: ${trader_stats['total_volume']:,.2f}
-  - Markets Traded: {trader_stats['markets_traded']}
-  - First Trade: {trader_stats.get('first_trade', 'N/A')}
-  - Latest Trade: {trader_stats.get('latest_trade', 'N/A')}
-{'='*80}
-        """
+        for i in sorted(flagged):
+            trade = unseen[i]
+            wallet = trade.get('proxyWallet')
+            if wallet:
+                logger.info(f"Found trade: ${columns.value[i]:,.2f} from wallet {wallet}")
+                if i in spikes:
+                    self.flow_alerts[trade_key(trade)] = spikes[i]
+                    for spike in spikes[i]:
+                        logger.info(f"Flow spike: {describe_flow(spike)}")
+                qualifying_trades.append(trade)
+                whale_sized.append(bool(flagged[i] & CATEGORY_WHALE))
         
-        # Log to main trades log (always)
-        logger.info(log_message)
+        if self.PIPELINE_MODE == 'staged':
+            # Hand the batch to the enrichment workers and return to polling;
+            # the market prefetch runs first, then whale-sized trades
+            if qualifying_trades:
+                pipeline = self._get_pipeline()
+                prefetched = threading.Event()
+                pipeline.submit(-1, self._prefetch_task, qualifying_trades, prefetched)
+                for trade, is_whale in zip(qualifying_trades, whale_sized):
+                    pipeline.submit(0 if is_whale else 1, self._enrich_and_log, trade, prefetched)
+            else:
+                logger.info(f"No transactions over ${self.threshold:,.2f} found in this batch")
+            return len(unseen)
         
-        # Log to category-specific logs
-        if is_unusual:
-            unusual_logger.info(log_message)
-        if is_tuna:
-            tuna_logger.info(log_message)
-        if is_whale:
-            whale_logger.info(log_message)
+        if self.PIPELINE_MODE == 'sharded':
+            # Markets are loaded here, trader lookups by the worker owning each wallet;
+            # trades are logged in feed order as the results are merged back
+            with timer.time('prefetch'):
+                self.prefetch_markets(qualifying_trades)
+            if qualifying_trades:
+                pipeline = self._get_pipeline()
+                for trade in qualifying_trades:
+                    pipeline.submit(trade)
+            else:
+                logger.info(f"No transactions over ${self.threshold:,.2f} found in this batch")
+            return len(unseen)
         
-        # Also save to JSON for easier parsing
-        trade_data = {
-            'timestamp': datetime.now().isoformat(),
-            'categories': {
-                'is_unusual': is_unusual,
-                'is_tuna': is_tuna,
-                'is_whale': is_whale
-            },
-            'trade': {
-                'value': trade_value,
-                'transaction_hash': trade.get('transactionHash'),
-                'market_title': market_title,
-                'market_id': market_id,
-                'market_slug': market_slug,
-                'event_slug': event_slug,
-                'market_category': market_category,
-                'market_tags': market_tags,
-                'outcome': trade.get('outcome'),
-                'side': trade.get('side'),
-                'size': trade.get('size'),
-                'price': trade.get('price'),
-                'trade_timestamp': trade.get('timestamp'),
-                'icon': trade.get('icon')
-            },
-            'trader': trader_stats
-        }
+        # Load market metadata for the whole batch up front
+        with timer.time('prefetch'):
+            self.prefetch_markets(qualifying_trades)
         
-        # Save to appropriate JSON files
-        json_files = [os.path.join(self.data_dir, 'trades.json')]  # Always save to main trades file
+        # Analyze trader history and log each trade, keeping the batch order;
+        # 'enrich' is the time spent waiting for the next trade's lookups
+        enriched = self.enrich_trades(qualifying_trades)
+        while True:
+            start = time.perf_counter()
+            pair = next(enriched, None)
+            if pair is None:
+                break
+            timer.record('enrich', time.perf_counter() - start)
+            with timer.time('log'):
+                self._log_enriched(*pair)
         
-        if is_unusual:
-            json_files.append(os.path.join(self.data_dir, 'unusual_trades.json'))
-        if is_tuna:
-            json_files.append(os.path.join(self.data_dir, 'tuna_trades.json'))
-        if is_whale:
-            json_files.append(os.path.join(self.data_dir, 'whale_trades.json'))
+        # Log if no qualifying trades were found
+        if trades_found == 0:
+            logger.info(f"No transactions over ${self.threshold:,.2f} found in this batch")
         
-        for json_file in json_files:
-            try:
-                with open(json_file, 'a') as f:
-                    f.write(json.dumps(trade_data) + '\n')
-            except Exception as e:
-                logger.error(f"Error writing to {json_file}: {e}")
+        return len(unseen)
     
-    def process_trades(self, trades: List[Dict]):
+    def restore_state(self):
         """
-        Process a list of trades, filtering and categorizing them
+        Restore the dedup window and poll watermark saved by the previous run
+        """
+        if self.state_store is None:
+            return
+        
+        try:
+            dedup = self.state_store.load_dedup()
+            watermark = self.state_store.load_meta('poll_watermark')
+        except (sqlite3.Error, ValueError) as e:
+            logger.error(f"Error restoring state from {self.state_store.path}: {e}")
+            return
+        
+        if dedup and dedup.get('mode') == self.seen_transactions.get_stats()['mode']:
+            self.seen_transactions.restore(dedup)
+        if watermark is not None:
+            self.poll_watermark = watermark
+        logger.info(
+            f"Restored state from {self.state_store.path}: {len(self.seen_transactions)} seen trades, "
+            f"poll watermark {self.poll_watermark}"
+        )
+    
+    def checkpoint_state(self):
+        """
+        Save the dedup window, poll watermark and caches to the state store
+        """
+        self._last_checkpoint = time.monotonic()
+        if self.state_store is None:
+            return
+        
+        start = time.monotonic()
+        changes = not self._checkpoint_full
+        self._checkpoint_full = True
+        try:
+            self.state_store.checkpoint(
+                meta={'poll_watermark': self.poll_watermark},
+                dedup=self.seen_transactions.snapshot(changes=changes),
+                markets=self.market_cache.snapshot(),
+                traders=self.trader_cache.snapshot(changes=changes)
+            )
+        except sqlite3.Error as e:
+            logger.error(f"Error writing checkpoint to {self.state_store.path}: {e}")
+            return
+        self._checkpoint_full = False
+        logger.debug(f"State checkpoint written in {time.monotonic() - start:.2f}s")
+    
+    def get_metrics(self) -> Dict:
+        """
+        Snapshot of every counter, gauge and latency histogram of the monitor
+        
+        Returns:
+            Dictionary of metric groups (poll, dedup, caches, sink, profiles, flow, pipeline, source, transport,
+            stages); pipeline is None unless the staged pipeline has started, source until run() starts
+        """
+        return {
+            'timestamp': time.time(),
+            'uptime': time.time() - self._started,
+            'poll': dict(
+                self.poll_stats,
+                watermark=self.poll_watermark,
+                interval=self.scheduler.interval if self.POLL_MODE == 'adaptive' else self.poll_interval
+            ),
+            'dedup': self.seen_transactions.get_stats(),
+            'market_cache': self.market_cache.get_stats(),
+            'trader_cache': self.trader_cache.get_stats(),
+            'sink': self.sink.get_stats(),
+            'profiles': {profile.name: profile.get_stats() for profile in self.profiles},
+            'flow': [tracker.get_stats() for tracker in self.flow_trackers],
+            'pipeline': self.pipeline.get_stats() if self.pipeline is not None else None,
+            'source': self.source.get_stats() if self.source is not None else None,
+            'transport': self.transport.get_stats(),
+            'stages': self.stage_timer.get_stats(),
+            'latency_buckets': list(LATENCY_BUCKETS)
+        }
+    
+    def dump_metrics(self):
+        """
+        Write the metrics snapshot to METRICS_FILE as JSON (replaced atomically)
+        """
+        self._last_metrics_dump = time.monotonic()
+        if not self.METRICS_FILE:
+            return
+        temp_path = f"{self.METRICS_FILE}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump(self.get_metrics(), f)
+            os.replace(temp_path, self.METRICS_FILE)
+        except OSError as e:
+            logger.error(f"Error writing metrics to {self.METRICS_FILE}: {e}")
+    
+    def release_trades(self, trades: List[Dict]):
+        """
+        Forget trades that were dropped before being logged, so the next
+        checkpoint does not record them as seen
+        
+        Their dedup keys are removed and the poll watermark is moved back to
+        the oldest of them, so the next run fetches and reports them again.
         
         Args:
-            trades: List of trade dictionaries
+            trades: Trades that were marked seen but never logged
+        """
+        if not trades:
+            return
+        self.seen_transactions.discard(self._dedup_key(trade) for trade in trades)
+        timestamps = [trade['timestamp'] for trade in trades if trade.get('timestamp') is not None]
+        if timestamps and self.poll_watermark is not None:
+            self.poll_watermark = min(self.poll_watermark, min(timestamps))
+        logger.info(f"Released {len(trades)} unlogged trades; they will be fetched again on restart")
+    
+    def drain_pipeline(self):
+        """
+        Let the pipeline's workers finish the queued trades (up to
+        PIPELINE_DRAIN_TIMEOUT, then the rest is discarded and released with
+        release_trades) and stop them
         """
-        trades_found = 0
+        if self.pipeline is None:
+            return
+        depth = self.pipeline.get_stats()['queue_depth']
+        if depth:
+            logger.info(f"Draining {depth} queued trades...")
+        discarded = self.pipeline.close(timeout=self.PIPELINE_DRAIN_TIMEOUT)
+        if self.PIPELINE_MODE == 'staged':
+            discarded = [args[0] for func, args in discarded if func == self._enrich_and_log]
+        self.release_trades(discarded)
+        pipeline_stats = self.pipeline.get_stats()
+        logger.info(
+            f"Pipeline: {pipeline_stats['completed']} tasks completed, {pipeline_stats['errors']} errors, "
+            f"{pipeline_stats['backpressure']} backpressure waits, {pipeline_stats['discarded']} discarded"
+        )
+        self.pipeline = None
+    
+    def stop(self):
+        """
+        Ask run() to stop after the current cycle (safe to call from a signal handler)
+        """
+        self._stop.set()
+    
+    def close(self):
+        """
+        Release background resources held by the monitor
+        """
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
         
-        for trade in trades:
-            tx_hash = trade.get('transactionHash')
-            
-            # Skip if we've already processed this transaction
-            if tx_hash in self.seen_transactions:
-                continue
-            
-            self.seen_transactions.add(tx_hash)
-            trade_value = self.calculate_trade_value(trade)
-            
-            # Check if trade exceeds threshold
-            if trade_value >= self.threshold:
-                trades_found += 1
-                wallet = trade.get('proxyWallet')
-                if wallet:
-                    logger.info(f"Found trade: ${trade_value:,.2f} from wallet {wallet}")
-                    
-                    # Analyze trader history
-                    trader_stats = self.analyze_trader(wallet)
-                    
-                    # Log the trade and trader info to appropriate logs
-                    self.log_trade(trade, trader_stats)
+        # Finish queued trades first; their lookups use the pools below
+        self.drain_pipeline()
         
-        # Log if no qualifying trades were found
-        if trades_found == 0:
-            logger.info(f"No transactions over ${self.threshold:,.2f} found in this batch")
+        with self._pool_lock:
+            pools = (self._enrichment_pool, self._history_pool)
+            self._enrichment_pool = self._history_pool = None
+        for pool in pools:
+            if pool is not None:
+                pool.shutdown(wait=True)
+        
+        self.sink.close()
+        sink_stats = self.sink.get_stats()
+        logger.info(
+            f"Output: {sink_stats['records']} records, {sink_stats['bytes']} bytes, "
+            f"{sink_stats['flushes']} flushes, {sink_stats['rotations']} rotations, "
+            f"{sink_stats['backpressure']} backpressure waits"
+        )
+        for profile in self.profiles:
+            profile.sink.close()
+            profile_stats = profile.get_stats()
+            logger.info(
+                f"Profile {profile.name}: {profile_stats['trades']} trades logged "
+                f"({profile_stats['whale']} whale, {profile_stats['tuna']} tuna, {profile_stats['unusual']} unusual, "
+                f"{profile_stats['flow_spike']} flow spikes), "
+                f"{profile_stats['sink']['records']} records"
+            )
+        
+        logger.info(
+            f"Polling: {self.poll_stats['cycles']} cycles, {self.poll_stats['pages']} pages, "
+            f"{self.poll_stats['trades']} trades fetched, {self.poll_stats['gaps']} gaps detected, "
+            f"{self.poll_stats['samples']} unfiltered samples"
+        )
+        
+        stage_stats = self.stage_timer.get_stats()
+        if stage_stats:
+            logger.info("Stages: " + ", ".join(
+                f"{stage} {stats['avg_ms']:.2f} ms avg / {stats['max_ms']:.2f} ms max ({stats['count']} runs)"
+                for stage, stats in stage_stats.items()
+            ))
+        
+        dedup_stats = self.seen_transactions.get_stats()
+        logger.info(
+            f"Dedup ({dedup_stats['mode']}): {dedup_stats['size']} trades remembered, "
+            f"{dedup_stats['evictions']} evicted, {dedup_stats['late']} late trades skipped"
+        )
+        
+        for tracker in self.flow_trackers:
+            flow_stats = tracker.get_stats()
+            logger.info(
+                f"Flow ({flow_stats['dimension']}, {flow_stats['window']:g}s): {flow_stats['keys']} keys, "
+                f"{flow_stats['observed']} trades, {flow_stats['spikes']} spikes, {flow_stats['evictions']} evicted"
+            )
+        
+        market_stats = self.market_cache.get_stats()
+        logger.info(
+            f"Market cache: {market_stats['size']} markets, {market_stats['hits']} hits, "
+            f"{market_stats['negative_hits']} negative hits, {market_stats['misses']} misses, "
+            f"{market_stats['evictions']} evictions"
+        )
+        
+        cache_stats = self.trader_cache.get_stats()
+        logger.info(
+            f"Trader cache: {cache_stats['size']} wallets, {cache_stats['hits']} hits, "
+            f"{cache_stats['misses']} misses, {cache_stats['stale']} stale, {cache_stats['syncs']} incremental syncs "
+            f"({cache_stats['synced_trades']} new trades), {cache_stats['evictions']} evictions"
+        )
+        
+        for endpoint, stats in self.transport.get_stats().items():
+            logger.info(
+                f"API {endpoint}: {stats['requests']} requests, {stats['errors']} errors, "
+                f"{stats['retries']} retries, avg {stats['avg_latency']:.3f}s, max {stats['max_latency']:.3f}s"
+            )
+        self.transport.close()
+        if self.state_store is not None:
+            self.state_store.close()
     
     def run(self):
         """
@@ -418,30 +5177,609 @@ Trader Information:
         logger.info(f"Tuna trades: ${self.TUNA_MIN:,.2f} - ${self.TUNA_MAX:,.2f}")
         logger.info(f"Whale trades: ${self.WHALE_MIN:,.2f}+")
         logger.info(f"Unusual trader threshold: < {self.UNUSUAL_TRADER_THRESHOLD} previous trades")
-        logger.info(f"Poll interval: {self.poll_interval} seconds")
+        for tracker in self.flow_trackers:
+            rules = ', '.join(f"{rule} >= {limit:g}" for rule, limit in tracker.rules.items() if limit)
+            logger.info(f"Flow spikes ({tracker.dimension}, {tracker.window:g}s window): {rules or 'no rules'}")
+        for profile in self.profiles:
+            logger.info(
+                f"Profile {profile.name}: ${profile.threshold:,.2f}+, tuna ${profile.tuna_min:,.2f} - "
+                f"${profile.tuna_max:,.2f}, whale ${profile.whale_min:,.2f}+, unusual < "
+                f"{profile.unusual_trader_threshold} previous trades, output {profile.data_dir}"
+            )
+        if self.POLL_MODE == 'adaptive':
+            logger.info(
+                f"Poll interval: adaptive, starting at {self.scheduler.interval:.1f} seconds "
+                f"({self.scheduler.min_interval:.1f}-{self.scheduler.max_interval:.1f}s)"
+            )
+        else:
+            logger.info(f"Poll interval: {self.poll_interval} seconds")
+        if self.POLL_FILTER == 'cash':
+            logger.info(f"Trade feed: filtered server-side to trades of ${math.floor(self.threshold):,}+")
+            if self.flow_trackers:
+                logger.warning(
+                    "FLOW_SPIKES with POLL_FILTER=cash: the flow windows only see trades over the "
+                    "threshold, so spikes made of smaller trades are not detected; use POLL_FILTER=none"
+                )
+        logger.info(f"Trader enrichment: {self.ENRICHMENT_MODE} (concurrency: {self.ENRICHMENT_CONCURRENCY})")
+        if self.PIPELINE_MODE == 'staged':
+            logger.info(f"Pipeline: staged, up to {self.PIPELINE_QUEUE_SIZE} queued trades")
+        elif self.PIPELINE_MODE == 'sharded':
+            logger.info(f"Pipeline: sharded over {self.SHARD_PROCESSES} worker processes by wallet")
         logger.info("Press Ctrl+C to stop")
         
+        # SIGTERM (e.g. docker stop) ends the loop like Ctrl+C, draining queued trades
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        
+        self.restore_state()
+        if self.METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(self, self.METRICS_HOST, self.METRICS_PORT)
+                logger.info(f"Metrics: http://{self.METRICS_HOST}:{self.metrics_server.port}/metrics")
+            except OSError as e:
+                logger.error(f"Could not start metrics server on port {self.METRICS_PORT}: {e}")
+        
+        self.source = self.make_trade_source()
+        logger.info(f"Trade source: {self.source.name}")
+        
         try:
-            while True:
+            self.source.start()
+            while not self._stop.is_set():
+                cycle_start = time.monotonic()
+                gaps = self.poll_stats['gaps']
+                
                 logger.debug("Fetching recent trades...")
-                trades = self.get_recent_trades()
+                trades = self.source.next_batch()
+                if trades is None:
+                    logger.info("Trade source exhausted")
+                    break
                 
+                new_trades = 0
                 if trades:
                     logger.debug(f"Processing {len(trades)} trades")
-                    self.process_trades(trades)
-                else:
+                    new_trades = self.process_trades(trades)
+                elif self.source.paced:
                     logger.warning("No trades received")
                 
-                time.sleep(self.poll_interval)
+                if time.monotonic() - self._last_checkpoint >= self.STATE_CHECKPOINT_INTERVAL:
+                    self.checkpoint_state()
+                if self.METRICS_FILE and time.monotonic() - self._last_metrics_dump >= self.METRICS_DUMP_INTERVAL:
+                    self.dump_metrics()
                 
+                if not self.source.paced:
+                    # Streaming and file sources wait for trades in next_batch()
+                    continue
+                if self.POLL_MODE == 'adaptive':
+                    interval = self.scheduler.update(len(trades), new_trades, gap=self.poll_stats['gaps'] > gaps)
+                    # Subtract the time spent on this cycle so cycles start on a steady cadence
+                    elapsed = time.monotonic() - cycle_start
+                    if elapsed > interval:
+                        logger.info(f"Cycle took {elapsed:.1f}s, longer than the {interval:.1f}s interval")
+                    self._stop.wait(max(0.0, interval - elapsed))
+                else:
+                    self._stop.wait(self.poll_interval)
+            
+            logger.info("Monitoring stopped")
         except KeyboardInterrupt:
             logger.info("\nMonitoring stopped by user")
         except Exception as e:
             logger.error(f"Unexpected error: {e}", exc_info=True)
+        finally:
+            self.source.close()
+            # Queued trades are logged before the dedup window is checkpointed
+            self.drain_pipeline()
+            self.checkpoint_state()
+            if self.METRICS_FILE:
+                self.dump_metrics()
+            self.close()
+
+
+class ShardMonitor(PolymarketMonitor):
+    """
+    Enrichment-only monitor run inside a shard worker process
+    
+    It owns the trader cache and HTTP transport for its share of wallets.
+    Polling, dedup, market prefetch and output stay in the parent process,
+    so market details are never fetched here.
+    """
+    
+    def __init__(self, threshold: float, data_dir: str, shard: int, shards: int):
+        """
+        Initialize the worker's monitor
+        
+        Args:
+            threshold: Minimum trade size in USD
+            data_dir: Parent's data directory
+            shard: Index of this worker
+            shards: Number of workers
+        """
+        # The configured API rate limits are shared by all workers; state and
+        # output belong to the parent
+        for name in ('DATA_API_RATE_LIMIT', 'GAMMA_API_RATE_LIMIT'):
+            os.environ[name] = str(float(os.getenv(name, '10')) / shards)
+        os.environ.update(STATE_STORE='none', TRADE_STORE='none', PIPELINE_MODE='inline')
+        super().__init__(threshold=threshold, data_dir=data_dir)
+        self.shard = shard
+    
+    def get_market_details(self, condition_id: str) -> Optional[Dict]:
+        """Markets are prefetched by the parent process for the whole batch"""
+        return None
+
+
+def _shard_worker(shard: int, shards: int, threshold: float, data_dir: str,
+                  tasks: 'multiprocessing.Queue', results: 'multiprocessing.Queue'):
+    """
+    Entry point of a shard worker process: enrich (seq, trade) tasks until a
+    None marker arrives and send ('result', seq, trader_stats, error) back
+    
+    Args:
+        shard: Index of this worker
+        shards: Number of workers
+        threshold: Minimum trade size in USD
+        data_dir: Parent's data directory
+        tasks: This worker's task queue
+        results: Result queue shared by all workers (also carries log records)
+    """
+    # Shutdown is coordinated by the parent, which drains the queues first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    
+    # Log through the parent's handlers; this process's file handlers were
+    # never opened (they open on first use) and are dropped with the listener
+    atexit.unregister(log_listener.stop)
+    log_listener.stop()
+    for handler in main_handlers + category_handlers:
+        handler.close()
+    logging.getLogger().handlers = [ShardLogHandler(results)]
+    
+    monitor = ShardMonitor(threshold=threshold, data_dir=data_dir, shard=shard, shards=shards)
+    stopping = False
+    try:
+        while not stopping:
+            item = tasks.get()
+            if item is None:
+                break
+            # Take whatever else is queued so lookups overlap on the worker's pool
+            batch = [item]
+            while len(batch) < monitor.ENRICHMENT_CONCURRENCY * 4:
+                try:
+                    item = tasks.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            
+            done = 0
+            try:
+                for (seq, _), (_, trader_stats) in zip(batch, monitor.enrich_trades([t for _, t in batch])):
+                    results.put(('result', seq, trader_stats, None))
+                    done += 1
+            except Exception as e:
+                for seq, _ in batch[done:]:
+                    results.put(('result', seq, None, str(e)))
+    finally:
+        cache_stats = monitor.trader_cache.get_stats()
+        requests_made = sum(stats['requests'] for stats in monitor.transport.get_stats().values())
+        logger.info(
+            f"Shard worker {shard}: {cache_stats['size']} wallets, {cache_stats['hits']} cache hits, "
+            f"{cache_stats['misses']} misses, {requests_made} API requests"
+        )
+        # The full per-process summary would repeat once per worker
+        logger.setLevel(logging.WARNING)
+        monitor.close()
+
+
+def read_jsonl(path: str) -> Iterator[Any]:
+    """
+    Stream the values of a JSONL file (gzip-compressed if the name ends in .gz)
+    
+    Args:
+        path: File path
+        
+    Returns:
+        Iterator of decoded lines (blank lines are skipped)
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield json_loads(line)
+
+
+def record_from_output(record: Dict) -> TradeRecord:
+    """
+    Rebuild the API trade behind a trades.json output record
+    
+    Args:
+        record: Record written by log_trade
+        
+    Returns:
+        Trade record
+    """
+    trade, trader = record['trade'], record['trader']
+    return TradeRecord.from_api({
+        'transactionHash': trade.get('transaction_hash'),
+        'proxyWallet': trader.get('wallet'),
+        'conditionId': trade.get('market_id'),
+        'side': trade.get('side'),
+        'outcome': trade.get('outcome'),
+        'size': trade.get('size'),
+        'price': trade.get('price'),
+        'timestamp': trade.get('trade_timestamp'),
+        'title': trade.get('market_title'),
+        'slug': trade.get('market_slug'),
+        'eventSlug': trade.get('event_slug'),
+        'icon': trade.get('icon'),
+        'name': trader.get('username'),
+        'pseudonym': trader.get('pseudonym')
+    })
+
+
+def _trade_from_item(item: Dict) -> TradeRecord:
+    """Parse one recorded line: an API trade or a trades.json output record"""
+    if 'trade' in item and 'trader' in item:
+        return record_from_output(item)
+    return TradeRecord.from_api(item)
+
+
+def read_trade_batches(paths: List[str], window: float,
+                       convert: Callable[[Dict], TradeRecord] = _trade_from_item) -> Iterator[List[TradeRecord]]:
+    """
+    Stream recorded trades as poll-sized batches
+    
+    A line holding a JSON array (a captured /trades response) is one batch.
+    Single trades are grouped into windows of `window` seconds of trade time
+    (files are expected in roughly chronological order). Each batch is ordered
+    newest first like the live feed.
+    
+    Args:
+        paths: JSONL files
+        window: Seconds of trade time per batch of single trades
+        convert: Parser for single-trade lines
+        
+    Returns:
+        Iterator of trade batches
+    """
+    batch = []
+    batch_end = None
+    
+    for path in paths:
+        for item in read_jsonl(path):
+            if isinstance(item, list):
+                if batch:
+                    yield sorted(batch, key=lambda t: t.timestamp or 0, reverse=True)
+                    batch, batch_end = [], None
+                yield parse_trades(item)
+                continue
+            
+            trade = convert(item)
+            timestamp = trade.timestamp or 0
+            if batch_end is not None and timestamp >= batch_end:
+                yield sorted(batch, key=lambda t: t.timestamp or 0, reverse=True)
+                batch, batch_end = [], None
+            if batch_end is None:
+                batch_end = timestamp + window
+            batch.append(trade)
+    
+    if batch:
+        yield sorted(batch, key=lambda t: t.timestamp or 0, reverse=True)
+
+
+class ReplayMonitor(PolymarketMonitor):
+    """
+    Monitor fed from recorded JSONL instead of the live API
+    
+    Trades go through the normal process_trades pipeline (dedup,
+    classification, enrichment, logging and the output sink). Wallet
+    histories and market details are served from recorded data, with
+    histories cut at the replay clock so a trade never sees later trades.
+    Accepted trade lines are captured /trades responses (a JSON array, replayed
+    as one batch), single API trades, or records from the monitor's own
+    trades.json output (their market details and trader statistics are reused).
+    """
+    
+    def __init__(self, threshold: float = 5000, poll_interval: int = 30, data_dir: str = 'data/replay',
+                 histories: Optional[Dict[str, List[TradeRecord]]] = None, markets: Optional[Dict[str, Dict]] = None):
+        """
+        Initialize the replay monitor
+        
+        Args:
+            threshold: Minimum trade size in USD to log
+            poll_interval: Seconds of trade time grouped into one batch
+            data_dir: Directory for the replay's JSON output and databases
+            histories: Recorded trades keyed by wallet
+            markets: Recorded Gamma market details keyed by condition ID
+        """
+        super().__init__(threshold=threshold, poll_interval=poll_interval, data_dir=data_dir)
+        # A replay starts cold and must not overwrite the live monitor's state
+        if self.state_store is not None:
+            self.state_store.close()
+            self.state_store = None
+        
+        self.histories = {}
+        self.history_times = {}
+        for wallet, trades in (histories or {}).items():
+            trades = sorted(trades, key=lambda t: t.get('timestamp', 0), reverse=True)
+            self.histories[wallet] = trades
+            self.history_times[wallet] = [-t.get('timestamp', 0) for t in trades]
+        self.markets = markets or {}
+        self.recorded_stats = {}
+        self.clock = None
+        # Cached trader statistics expire in trade time, as they would have live
+        self.trader_cache.clock = lambda: self.clock or 0
+        # Each batch is enriched before the clock moves on
+        self.PIPELINE_MODE = 'inline'
+    
+    @staticmethod
+    def load_histories(paths: List[str]) -> Dict[str, List[TradeRecord]]:
+        """
+        Read recorded wallet histories
+        
+        Lines are captured /trades?user= responses (JSON arrays), single trades,
+        or {"wallet": ..., "trades": [...]} objects. Overlapping captures are
+        deduplicated.
+        
+        Args:
+            paths: JSONL files
+            
+        Returns:
+            Trade records keyed by wallet
+        """
+        histories = {}
+        seen = set()
+        for path in paths:
+            for item in read_jsonl(path):
+                if isinstance(item, dict) and 'trades' in item:
+                    wallet, trades = item.get('wallet'), item['trades']
+                else:
+                    wallet, trades = None, item if isinstance(item, list) else [item]
+                for trade in parse_trades(trades):
+                    owner = wallet or trade.proxy_wallet
+                    if owner and (owner, trade.key) not in seen:
+                        seen.add((owner, trade.key))
+                        histories.setdefault(owner, []).append(trade)
+        return histories
+    
+    @staticmethod
+    def load_markets(paths: List[str]) -> Dict[str, Dict]:
+        """
+        Read recorded Gamma market details (lines are market objects or arrays of them)
+        
+        Args:
+            paths: JSONL files
+            
+        Returns:
+            Market details keyed by condition ID
+        """
+        markets = {}
+        for path in paths:
+            for item in read_jsonl(path):
+                for market in item if isinstance(item, list) else [item]:
+                    if isinstance(market, dict) and market.get('conditionId'):
+                        markets[market['conditionId']] = market
+        return markets
+    
+    def read_batches(self, paths: List[str]) -> Iterator[List[TradeRecord]]:
+        """
+        Stream recorded trades as batches of poll_interval seconds of trade time
+        
+        Args:
+            paths: JSONL files
+            
+        Returns:
+            Iterator of trade batches
+        """
+        return read_trade_batches(paths, self.poll_interval, self._record_from_item)
+    
+    def _record_from_item(self, item: Dict) -> TradeRecord:
+        """Parse a recorded line, keeping the market and trader data of output records"""
+        if 'trade' in item and 'trader' in item:
+            return self._record_from_output(item)
+        return TradeRecord.from_api(item)
+    
+    def _record_from_output(self, record: Dict) -> TradeRecord:
+        """Rebuild the API trade behind a trades.json record and keep its market and trader data"""
+        trade, trader = record['trade'], record['trader']
+        parsed = record_from_output(record)
+        condition_id = trade.get('market_id')
+        if condition_id and condition_id not in self.markets and trade.get('market_category', 'N/A') != 'N/A':
+            self.markets[condition_id] = {
+                'conditionId': condition_id,
+                'category': trade['market_category'],
+                'tags': trade.get('market_tags', [])
+            }
+        self.recorded_stats[parsed.key] = trader
+        return parsed
+    
+    def get_recent_trades(self, limit: int = 100, offset: int = 0,
+                          min_cash: Optional[float] = None) -> Optional[List[TradeRecord]]:
+        """There is no live feed in a replay"""
+        return []
+    
+    def get_user_trade_history(self, wallet_address: str, limit: int = 500,
+                               offset: int = 0) -> Optional[List[TradeRecord]]:
+        """
+        Get a page of a wallet's recorded trades made up to the replay clock, newest first
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            limit: Number of trades to return
+            offset: Number of most recent trades to skip
+            
+        Returns:
+            List of trade records
+        """
+        trades = self.histories.get(wallet_address)
+        if not trades:
+            return []
+        start = 0
+        if self.clock is not None:
+            start = bisect.bisect_left(self.history_times[wallet_address], -self.clock)
+        return trades[start + offset:start + offset + limit]
+    
+    def get_market_details(self, condition_id: str) -> Optional[Dict]:
+        """
+        Get recorded market details
+        
+        Args:
+            condition_id: The market condition ID
+            
+        Returns:
+            Market details dictionary or None if not recorded
+        """
+        found, market_details = self.market_cache.get(condition_id)
+        if not found:
+            market_details = self.markets.get(condition_id)
+            self.market_cache.put(condition_id, market_details)
+        return market_details
+    
+    def get_markets_details(self, condition_ids: List[str]) -> Optional[Dict[str, Dict]]:
+        """
+        Get recorded details for several markets
+        
+        Args:
+            condition_ids: Market condition IDs
+            
+        Returns:
+            Market details keyed by condition ID (markets not recorded are left out)
+        """
+        return {c: self.markets[c] for c in condition_ids if c in self.markets}
+    
+    def analyze_trader(self, wallet_address: str, trade: Optional[Dict] = None,
+                       full_history: bool = True) -> Dict:
+        """
+        Reuse the trader statistics recorded with a trades.json record, otherwise
+        analyze the recorded history
+        
+        Args:
+            wallet_address: The user's proxy wallet address
+            trade: The trade that triggered the lookup
+            full_history: Whether the full history is needed
+            
+        Returns:
+            Trader statistics dictionary
+        """
+        if trade is not None:
+            stats = self.recorded_stats.pop(trade_key(trade), None)
+            if stats is not None:
+                return stats
+        return super().analyze_trader(wallet_address, trade, full_history=full_history)
+    
+    def replay(self, batches: Iterator[List[TradeRecord]], speed: float = 0.0) -> Dict:
+        """
+        Run recorded batches through the pipeline
+        
+        Args:
+            batches: Trade batches, oldest first
+            speed: Trade time played per wall-clock second relative to real time
+                (e.g. 60 plays an hour per minute); 0 replays as fast as possible
+                
+        Returns:
+            Report with trade counts, throughput and per-stage latency
+        """
+        trades = 0
+        new_trades = 0
+        batch_count = 0
+        first_clock = None
+        start = time.perf_counter()
+        
+        for batch in batches:
+            timestamps = [t.timestamp for t in batch if t.timestamp is not None]
+            if timestamps:
+                self.clock = max(timestamps)
+                if first_clock is None:
+                    first_clock = self.clock
+            if speed > 0 and first_clock is not None:
+                delay = start + (self.clock - first_clock) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            
+            trades += len(batch)
+            batch_count += 1
+            new_trades += self.process_trades(batch)
+            # Statistics recorded for trades that were not logged are no longer needed
+            for trade in batch:
+                self.recorded_stats.pop(trade.key, None)
+        
+        self.sink.flush()
+        elapsed = time.perf_counter() - start
+        stages = self.stage_timer.get_stats()
+        return {
+            'trades': trades,
+            'batches': batch_count,
+            'new_trades': new_trades,
+            'logged_trades': stages.get('log', {}).get('count', 0),
+            'first_timestamp': first_clock,
+            'last_timestamp': self.clock,
+            'elapsed': round(elapsed, 3),
+            'trades_per_sec': round(trades / elapsed, 1) if elapsed > 0 else 0.0,
+            'stages': stages
+        }
+
+
+def replay_main(argv: Optional[List[str]] = None):
+    """
+    Replay entry point: python polymarket_monitor.py replay TRADES.jsonl [...]
+    
+    Args:
+        argv: Command line arguments after 'replay' (default: sys.argv[2:])
+    """
+    parser = argparse.ArgumentParser(
+        prog='polymarket_monitor.py replay',
+        description='Replay recorded trades through the monitor pipeline, fully offline'
+    )
+    parser.add_argument('trades', nargs='+', help='JSONL files of trades, captured /trades responses or trades.json records')
+    parser.add_argument('--histories', nargs='*', default=[], help='JSONL files of recorded wallet histories')
+    parser.add_argument('--markets', nargs='*', default=[], help='JSONL files of recorded Gamma market details')
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help='Trade time played per wall-clock second relative to real time (default: 0, as fast as possible)')
+    parser.add_argument('--batch-seconds', type=int, default=int(os.getenv('POLL_INTERVAL', '30')),
+                        help='Seconds of trade time per batch (default: POLL_INTERVAL)')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('TRADE_THRESHOLD', '5000')),
+                        help='Minimum trade value in USD (default: TRADE_THRESHOLD)')
+    parser.add_argument('--output-dir', default=os.path.join('data', 'replay'),
+                        help='Directory for the replay output (default: data/replay)')
+    parser.add_argument('--log-trades', action='store_true', help='Write trade banners to the logs as well')
+    parser.add_argument('--report', help='Also save the report as JSON to this file')
+    args = parser.parse_args(argv if argv is not None else sys.argv[2:])
+    
+    # Trade banners for months of data would flood the live logs
+    if not args.log_trades:
+        for trade_logger in (logger, unusual_logger, tuna_logger, whale_logger, flow_logger):
+            trade_logger.setLevel(logging.WARNING)
+    
+    monitor = ReplayMonitor(
+        threshold=args.threshold,
+        poll_interval=args.batch_seconds,
+        data_dir=args.output_dir,
+        histories=ReplayMonitor.load_histories(args.histories),
+        markets=ReplayMonitor.load_markets(args.markets)
+    )
+    try:
+        report = monitor.replay(monitor.read_batches(args.trades), speed=args.speed)
+    finally:
+        monitor.close()
+    
+    print(f"Replayed {report['trades']:,} trades in {report['batches']:,} batches in {report['elapsed']:.2f}s "
+          f"({report['trades_per_sec']:,.0f} trades/sec)")
+    print(f"New trades: {report['new_trades']:,}, logged: {report['logged_trades']:,} (output in {args.output_dir})")
+    for stage, stats in report['stages'].items():
+        print(f"  {stage:<10} {stats['count']:>9,} runs  {stats['avg_ms']:>9.3f} ms avg  "
+              f"{stats['max_ms']:>9.3f} ms max  {stats['total']:>8.2f}s total")
+    
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
 
 
 def main():
     """Main entry point"""
+    if sys.argv[1:2] == ['replay']:
+        replay_main()
+        return
+    
     # Support environment variables for Docker deployment
     threshold = float(os.getenv('TRADE_THRESHOLD', '5000'))
     poll_interval = int(os.getenv('POLL_INTERVAL', '30'))
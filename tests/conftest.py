@@ -0,0 +1,16 @@
+"""
+pytest setup: keep the log files of the test run out of the working tree
+"""
+
+import os
+import shutil
+import tempfile
+
+# The log directory is chosen when polymarket_monitor is imported, so it is set
+# before any test module is collected
+_log_dir = tempfile.mkdtemp(prefix='polymarket-test-logs-')
+os.environ.setdefault('LOG_DIR', _log_dir)
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(_log_dir, ignore_errors=True)
@@ -3,14 +3,17 @@
 Quick test to verify Polymarket API connection
 """
 
+import tempfile
+from pathlib import Path
+
 import requests
 from polymarket_monitor import PolymarketMonitor
 
-def test_api_connection():
+def test_api_connection(tmp_path):
     """Test basic API connectivity"""
     print("Testing Polymarket API connection...\n")
     
-    monitor = PolymarketMonitor()
+    monitor = PolymarketMonitor(data_dir=str(tmp_path))
     
     # Test 1: Fetch recent trades
     print("1. Fetching recent trades...")
@@ -35,7 +38,7 @@ def test_api_connection():
     
     # Test 2: Check for large trades
     print("\n2. Checking for trades over $5,000 in last 100 trades...")
-    trades_100 = monitor.get_recent_trades(limit=100)
+    trades_100 = monitor.get_recent_trades(limit=100) or []
     large_trades = [t for t in trades_100 if monitor.calculate_trade_value(t) >= 5000]
     
     print(f"   Found {len(large_trades)} large trades (>${monitor.threshold:,})")
@@ -65,7 +68,7 @@ def test_api_connection():
 
 if __name__ == "__main__":
     try:
-        test_api_connection()
+        test_api_connection(Path(tempfile.mkdtemp()))
     except Exception as e:
         print(f"\n✗ Error during testing: {e}")
         print("\nPlease check your internet connection and try again.")
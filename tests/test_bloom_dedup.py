@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Test the Bloom filter dedup mode: generation rotation, released keys and fill keys (runs offline)
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from polymarket_monitor import BloomDedup, PolymarketMonitor
+
+
+def test_bloom_rotation():
+    """A full generation replaces the previous one, whose newest timestamp becomes the floor"""
+
+    print("Testing Bloom filter rotation...\n")
+
+    bloom = BloomDedup(capacity=3)
+    for i, key in enumerate('abc'):
+        assert bloom.add(key, 100 + i)
+    assert not bloom.add('a', 100)
+    # The first rotation keeps 'abc' in the previous generation and sets no floor
+    assert bloom.rotations == 1 and bloom.floor is None and 'a' in bloom
+
+    for i, key in enumerate('def'):
+        assert bloom.add(key, 200 + i)
+    assert bloom.rotations == 2 and bloom.floor == 102 and bloom.evictions == 3
+    assert 'a' not in bloom and 'd' in bloom and len(bloom) == 3
+    # A forgotten key at or below the floor is late; above it, it is new again
+    assert not bloom.add('a', 102) and bloom.late == 1
+    assert bloom.add('a', 150)
+
+    stats = bloom.get_stats()
+    assert stats['rotations'] == 2 and stats['late'] == 1 and stats['memory_bytes'] == 2 * len(bloom.current)
+
+    print(f"   {bloom.num_bits} bits, {bloom.num_hashes} hashes per generation")
+    print("\n✓ Generations rotated and raised the floor")
+
+
+def test_bloom_released_snapshot():
+    """Discarded keys survive a snapshot and restore and are let through once"""
+
+    print("Testing released keys across a snapshot...\n")
+
+    bloom = BloomDedup(capacity=10)
+    for i, key in enumerate('abc'):
+        bloom.add(key, 100 + i)
+    assert bloom.discard(['b', 'b', 'missing']) == 1
+    assert 'b' not in bloom and bloom.discard(['b']) == 0
+
+    restored = BloomDedup(capacity=10)
+    restored.restore(bloom.snapshot(changes=True))
+    assert restored.released == {'b'} and restored.count == 3
+    assert 'a' in restored and 'b' not in restored
+    # Let through once, then a duplicate again
+    assert restored.add('b', 101) and not restored.add('b', 101)
+    assert not restored.released
+
+    # A snapshot from filters of another size is ignored
+    other = BloomDedup(capacity=1000)
+    other.restore(bloom.snapshot())
+    assert 'a' not in other and not other.released
+
+    print("✓ The released key round-tripped and was reported once")
+
+
+def test_bloom_fills(tmp_path):
+    """Two fills settled in one transaction are both reported under DEDUP_KEY=composite"""
+
+    print("Testing fills of one transaction in Bloom mode...\n")
+
+    settings = {'DEDUP_MODE': 'bloom', 'DEDUP_BLOOM_CAPACITY': '1000'}
+    os.environ.update(settings)
+    try:
+        monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    finally:
+        for name in settings:
+            del os.environ[name]
+    assert isinstance(monitor.seen_transactions, BloomDedup) and monitor.DEDUP_KEY == 'composite'
+
+    monitor.prefetch_markets = lambda trades: None
+    monitor.analyze_trader = lambda wallet, trade=None, full_history=True: {
+        'wallet': wallet, 'total_trades': 50, 'total_volume': 0, 'markets_traded': 0
+    }
+    fills = [
+        {'transactionHash': '0xtx', 'proxyWallet': '0xwallet', 'asset': asset, 'side': 'BUY',
+         'size': size, 'price': 1, 'timestamp': 1000}
+        for asset, size in (('0xyes', 5000), ('0xno', 2000))
+    ]
+    assert monitor.process_trades(fills) == 2
+    assert monitor.process_trades(fills) == 0
+    monitor.close()
+    logged = monitor.trade_store.query()
+    monitor.trade_store.close()
+
+    assert sorted(r['trade']['size'] for r in logged) == [2000, 5000]
+    assert {r['trade']['transaction_hash'] for r in logged} == {'0xtx'}
+
+    print(f"   {len(logged)} fills of one transaction logged")
+    print("\n✓ Both fills were reported once")
+
+
+if __name__ == "__main__":
+    test_bloom_rotation()
+    test_bloom_released_snapshot()
+    test_bloom_fills(Path(tempfile.mkdtemp()))
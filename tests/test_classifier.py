@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Test that the NumPy and pure-Python batch classifiers agree (runs offline)
+"""
+
+import random
+
+from polymarket_monitor import CATEGORY_TUNA, CATEGORY_WHALE, BatchClassifier, np, parse_trades
+
+
+def make_batch(count=2000, seed=7):
+    """Random trades around the thresholds, half as records and half as raw dictionaries"""
+    rng = random.Random(seed)
+    trades = [
+        {
+            'transactionHash': f'0xtx{i}',
+            'proxyWallet': f'0xw{rng.randrange(50)}',
+            'size': rng.choice([rng.randrange(1, 200000), rng.uniform(1, 200000), 5000, 100000]),
+            'price': rng.choice([1, 0.5, rng.random()]),
+            'timestamp': 1000 + i
+        }
+        for i in range(count)
+    ]
+    half = count // 2
+    return parse_trades(trades[:half]) + trades[half:]
+
+
+def test_backends_agree():
+    """Both backends pick the same trades and size categories"""
+
+    print("Testing classifier backends...\n")
+
+    if np is None:
+        print("NumPy is not installed; only the pure-Python backend is available")
+        return
+
+    trades = make_batch()
+    results = {}
+    for backend in (True, False):
+        classifier = BatchClassifier(threshold=5000, tuna_min=5000, tuna_max=100000, whale_min=100000,
+                                     use_numpy=backend)
+        columns = classifier.columns(trades)
+        assert len(columns) == len(trades)
+        results[backend] = classifier.classify(columns)
+
+    assert results[True] == results[False]
+    indices, categories = results[False]
+    assert indices and set(categories) == {CATEGORY_TUNA, CATEGORY_WHALE}
+    # Exactly at the threshold qualifies; exactly at whale_min is a whale, not a tuna
+    edge = BatchClassifier(5000, 5000, 100000, 100000, use_numpy=False)
+    assert edge.classify(edge.columns([{'size': 5000, 'price': 1}, {'size': 100000, 'price': 1},
+                                       {'size': 4999.99, 'price': 1}])) == ([0, 1], [CATEGORY_TUNA, CATEGORY_WHALE])
+    assert all(type(i) is int and type(c) is int for i, c in zip(*results[True]))
+
+    print(f"   {len(indices)} of {len(trades)} trades qualified on both backends")
+    print("\n✓ The NumPy and pure-Python backends agreed")
+
+
+if __name__ == "__main__":
+    test_backends_agree()
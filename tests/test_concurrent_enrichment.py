@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Test that concurrent trader enrichment keeps log output in batch order
+"""
+
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from polymarket_monitor import PolymarketMonitor
+
+
+def make_trades(count):
+    """Build qualifying trades from distinct wallets"""
+    return [
+        {
+            'transactionHash': f'0xtx{i}',
+            'proxyWallet': f'0xwallet{i}',
+            'size': 10000,
+            'price': 1,
+        }
+        for i in range(count)
+    ]
+
+
+def run_batch(mode, data_dir):
+    """Process a batch with slow, randomly delayed lookups and return the log order"""
+    monitor = PolymarketMonitor(threshold=5000, data_dir=str(data_dir))
+    monitor.ENRICHMENT_MODE = mode
+    monitor.ENRICHMENT_CONCURRENCY = 8
+    logged = []
+
+    def analyze_trader(wallet, trade=None, full_history=True):
+        time.sleep(random.uniform(0, 0.05))
+        return {'wallet': wallet, 'total_trades': 50}
+
+    monitor.analyze_trader = analyze_trader
+    monitor.log_trade = lambda trade, stats: logged.append((trade['proxyWallet'], stats['wallet']))
+
+    trades = make_trades(20)
+    start = time.time()
+    monitor.process_trades(trades)
+    elapsed = time.time() - start
+    monitor.close()
+
+    return [t['proxyWallet'] for t in trades], logged, elapsed
+
+
+def test_concurrent_enrichment(tmp_path):
+    """Concurrent and serial modes log the same trades in the same order"""
+
+    print("Testing concurrent trader enrichment...\n")
+
+    for mode in ('serial', 'concurrent'):
+        expected, logged, elapsed = run_batch(mode, tmp_path / mode)
+        print(f"   {mode}: {len(logged)} trades logged in {elapsed:.2f}s")
+
+        assert [wallet for wallet, _ in logged] == expected
+        # Each trade must be paired with its own trader's stats
+        assert all(trade_wallet == stats_wallet for trade_wallet, stats_wallet in logged)
+
+    print("\n✓ Output order matches input order in both modes")
+
+
+if __name__ == "__main__":
+    test_concurrent_enrichment(Path(tempfile.mkdtemp()))
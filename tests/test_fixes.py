@@ -3,14 +3,17 @@
 Test the fixed monitor to ensure market names and usernames display correctly
 """
 
+import tempfile
+from pathlib import Path
+
 from polymarket_monitor import PolymarketMonitor
 
-def test_fixes():
+def test_fixes(tmp_path):
     """Test that market names and usernames are correctly displayed"""
     
     print("Testing updated monitor with correct field names...\n")
     
-    monitor = PolymarketMonitor(threshold=1000)  # Lower threshold for testing
+    monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))  # Lower threshold for testing
     
     # Fetch recent trades
     print("1. Fetching recent trades...")
@@ -84,5 +87,5 @@ def test_fixes():
     print("then the fixes are working correctly!")
 
 if __name__ == "__main__":
-    test_fixes()
+    test_fixes(Path(tempfile.mkdtemp()))
 
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Test rolling market and wallet flow windows and flow spike logging (runs offline)
+"""
+
+import os
+import tempfile
+
+from polymarket_monitor import FlowTracker, PolymarketMonitor
+
+
+def make_trade(i, wallet, market, value, timestamp, side='BUY'):
+    """Build an API-style trade"""
+    return {
+        'transactionHash': f'0xtx{i}',
+        'proxyWallet': wallet,
+        'conditionId': market,
+        'side': side,
+        'size': value,
+        'price': 1,
+        'timestamp': timestamp
+    }
+
+
+def test_flow_tracker():
+    """Windows roll over by trade time, alert once per window and evict cold keys"""
+
+    print("Testing flow tracker...\n")
+
+    tracker = FlowTracker('market', 300, buckets=10, max_keys=3, volume=100000, distinct=5)
+    spikes = [tracker.observe(make_trade(i, f'0xw{i}', '0xm', 30000, 1000 + i), 30000) for i in range(6)]
+    # The 4th trade takes the window to $120,000; the rest of the window stays quiet
+    assert [s is not None for s in spikes] == [False, False, False, True, False, False]
+    assert spikes[3]['rules'] == ['volume'] and spikes[3]['trades'] == 4
+    assert spikes[3]['buy_volume'] == 120000 and spikes[3]['imbalance'] == 1.0
+
+    # A window later the old trades have rolled out and the key can alert again
+    later = [tracker.observe(make_trade(10 + i, f'0xv{i}', '0xm', 1000, 1400 + i), 1000) for i in range(5)]
+    assert later[-1] is not None and later[-1]['rules'] == ['distinct']
+    assert later[-1]['volume'] == 5000 and later[-1]['unique_wallets'] == 5
+
+    # Trades behind the window are ignored; keys past max_keys are evicted oldest first
+    assert tracker.observe(make_trade(20, '0xw', '0xm', 1000, 900), 1000) is None
+    for i in range(4):
+        tracker.observe(make_trade(30 + i, '0xw', f'0xother{i}', 10, 1500), 10)
+    stats = tracker.get_stats()
+    assert stats['late'] == 1 and stats['keys'] == 3 and stats['evictions'] == 2
+    assert '0xm' not in tracker.keys
+
+    print("✓ Flow windows rolled, alerted and evicted as expected")
+
+
+def log_flow_spikes(trades):
+    """Run a batch through a monitor with flow spikes on; returns the spike records oldest first, all records and metrics"""
+    settings = {'FLOW_SPIKES': 'true', 'FLOW_MARKET_VOLUME': '500000', 'FLOW_WALLET_TRADES': '5'}
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(settings)
+        try:
+            monitor = PolymarketMonitor(threshold=100000, data_dir=tmp)
+        finally:
+            for name in settings:
+                del os.environ[name]
+
+        monitor.prefetch_markets = lambda trades: None
+        monitor.analyze_trader = lambda wallet, trade=None, full_history=True: {
+            'wallet': wallet, 'total_trades': 50, 'total_volume': 0, 'markets_traded': 0
+        }
+        monitor.process_trades(trades)
+        metrics = monitor.get_metrics()
+        monitor.close()
+        assert not monitor.flow_alerts
+
+        # The trade store returns newest first
+        records = monitor.trade_store.query(category='flow_spike')[::-1]
+        logged = monitor.trade_store.query()
+        monitor.trade_store.close()
+    return records, logged, metrics
+
+
+def test_flow_spikes():
+    """Trades under the threshold that set off a market or wallet spike are logged as flow spikes"""
+
+    print("Testing flow spike logging...\n")
+
+    # Twelve $50k trades in one market within two minutes, then five tuna
+    # trades from one wallet across different markets within the hour
+    trades = [make_trade(i, f'0xa{i}', '0xmarket', 50000, 1000 + 10 * i) for i in range(12)]
+    trades += [make_trade(100 + i, '0xfresh', f'0xm{i}', 10000, 2000 + 600 * i, 'SELL') for i in range(5)]
+    records, logged, metrics = log_flow_spikes(trades)
+
+    assert len(logged) == len(records) == 2
+    market, wallet = (r['flow'][0] for r in records)
+    assert records[0]['trade']['transaction_hash'] == '0xtx9'
+    assert market['dimension'] == 'market' and market['key'] == '0xmarket' and market['volume'] == 500000
+    assert records[1]['trade']['transaction_hash'] == '0xtx104'
+    assert wallet['dimension'] == 'wallet' and wallet['trades'] == 5 and wallet['imbalance'] == -1.0
+    assert all(r['categories']['is_flow_spike'] for r in records)
+    assert sum(t['spikes'] for t in metrics['flow']) == 2
+
+    print(f"   {len(records)} flow spikes: {market['key']} ${market['volume']:,.0f}, "
+          f"{wallet['key']} {wallet['trades']} trades")
+    print("\n✓ Flow spikes were enriched and logged in their own category")
+
+
+def test_flow_spikes_newest_first():
+    """A newest-first batch, as the live feeds send it, alerts on the same trades"""
+
+    print("Testing flow spikes in a newest-first batch...\n")
+
+    trades = [make_trade(i, f'0xa{i}', '0xmarket', 50000, 1000 + 10 * i) for i in range(12)]
+    trades += [make_trade(100 + i, '0xfresh', f'0xm{i}', 10000, 2000 + 600 * i, 'SELL') for i in range(5)]
+    records, logged, metrics = log_flow_spikes(trades[::-1])
+
+    # The spikes land on the trades that crossed the thresholds, not the oldest in the burst
+    assert sorted(r['trade']['transaction_hash'] for r in records) == ['0xtx104', '0xtx9']
+    assert sum(t['spikes'] for t in metrics['flow']) == 2
+    # None of the older trades was dropped as late against a window that had already moved on
+    assert all(t['late'] == 0 for t in metrics['flow'])
+
+    print(f"   Spikes on {', '.join(r['trade']['transaction_hash'] for r in records)}")
+    print("\n✓ Newest-first batches were observed in trade time order")
+
+
+if __name__ == "__main__":
+    test_flow_tracker()
+    test_flow_spikes()
+    test_flow_spikes_newest_first()
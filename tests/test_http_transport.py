@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Test HTTP transport retries, Retry-After handling and the per-host rate limiter (runs offline)
+"""
+
+import requests
+
+import polymarket_monitor
+from polymarket_monitor import HttpTransport, TokenBucket
+
+URL = 'https://data-api.example/trades'
+
+
+class FakeClock:
+    """Stands in for the time module; sleeping only advances the clock"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+
+
+class StubSession:
+    """Session answering GETs from a list of (status, headers) or exceptions"""
+
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        answer = self.answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response.url = url
+        response._content = b'[{"ok": true}]'
+        return response
+
+    def close(self):
+        pass
+
+
+def run(answers, **options):
+    """GET through a transport with a stub session and a fake clock"""
+    transport = HttpTransport(backoff_base=0.5, backoff_max=30, **options)
+    transport.session = StubSession(answers)
+    clock = FakeClock()
+    real_time, polymarket_monitor.time = polymarket_monitor.time, clock
+    try:
+        try:
+            result = transport.get_json(URL, endpoint='trades')
+        except requests.exceptions.RequestException as e:
+            result = e
+    finally:
+        polymarket_monitor.time = real_time
+    return result, transport.session.calls, transport.get_stats()['trades'], clock.sleeps
+
+
+def test_retries():
+    """Retryable statuses and connection errors are retried up to max_retries"""
+
+    print("Testing transport retries...\n")
+
+    result, calls, stats, sleeps = run([(503, {}), requests.exceptions.ConnectionError('reset'), (200, {})])
+    assert result == [{'ok': True}]
+    assert calls == 3 and stats['requests'] == 3 and stats['errors'] == 2 and stats['retries'] == 2
+    # Full-jitter backoff: attempt n waits at most backoff_base * 2**n
+    assert len(sleeps) == 2 and sleeps[0] <= 0.5 and sleeps[1] <= 1.0
+
+    result, calls, stats, sleeps = run([(502, {})] * 3, max_retries=2)
+    assert isinstance(result, requests.exceptions.HTTPError) and result.response.status_code == 502
+    assert calls == 3 and stats['retries'] == 2 and len(sleeps) == 2
+
+    print("✓ Transient failures were retried, then raised")
+
+
+def test_retry_after():
+    """A Retry-After header replaces the backoff delay, capped at backoff_max"""
+
+    print("Testing Retry-After...\n")
+
+    result, calls, stats, sleeps = run([(429, {'Retry-After': '7'}), (429, {'Retry-After': '120'}), (200, {})])
+    assert result == [{'ok': True}] and calls == 3
+    assert sleeps == [7.0, 30.0]
+
+    print("✓ Retry-After was honoured")
+
+
+def test_no_retry_on_client_error():
+    """Non-retryable 4xx responses raise at once"""
+
+    print("Testing non-retryable responses...\n")
+
+    for status in (400, 404):
+        result, calls, stats, sleeps = run([(status, {}), (200, {})])
+        assert isinstance(result, requests.exceptions.HTTPError) and result.response.status_code == status
+        assert calls == 1 and stats['retries'] == 0 and stats['errors'] == 1 and sleeps == []
+
+    print("✓ Client errors were not retried")
+
+
+def test_token_bucket():
+    """The bucket allows a burst of its capacity, then one request per 1/rate seconds"""
+
+    print("Testing token bucket...\n")
+
+    clock = FakeClock()
+    real_time, polymarket_monitor.time = polymarket_monitor.time, clock
+    try:
+        bucket = TokenBucket(rate=2)
+        waits = [bucket.acquire() for _ in range(5)]
+    finally:
+        polymarket_monitor.time = real_time
+
+    assert waits[:2] == [0.0, 0.0]
+    assert all(abs(wait - 0.5) < 1e-9 for wait in waits[2:])
+    assert abs(clock.now - 1001.5) < 1e-9
+
+    print("✓ Requests were limited to the configured rate")
+
+
+if __name__ == "__main__":
+    test_retries()
+    test_retry_after()
+    test_no_retry_on_client_error()
+    test_token_bucket()
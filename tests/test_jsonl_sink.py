@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Test the buffered JSON Lines writer's flush and fsync cadence (runs offline)
+"""
+
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from polymarket_monitor import JsonlSink
+
+
+def test_idle_fsync(tmp_path):
+    """Written records are fsynced on schedule even when no further records arrive"""
+
+    print("Testing fsync on an idle feed...\n")
+
+    sink = JsonlSink(str(tmp_path), flush_interval=0.05, fsync_interval=0.2)
+    sink.write(['trades.json'], '{"n": 1}')
+    time.sleep(0.6)
+    stats = sink.get_stats()
+    assert stats['records'] == 1 and stats['flushes'] == 1
+    # One fsync for the one write; an idle writer with nothing unsynced does not fsync again
+    assert stats['fsyncs'] == 1
+    sink.close()
+
+    with open(os.path.join(tmp_path, 'trades.json')) as f:
+        assert f.read() == '{"n": 1}\n'
+
+    print("✓ The idle writer fsynced within the interval")
+
+
+if __name__ == "__main__":
+    test_idle_fsync(Path(tempfile.mkdtemp()))
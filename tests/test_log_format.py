@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test deferred trade message rendering and the text, compact and JSON log formats (runs offline)
+"""
+
+import json
+import logging
+import queue
+import sys
+
+from polymarket_monitor import LazyQueueHandler, TradeLogFormatter, TradeMessage
+
+
+class CountingMessage(TradeMessage):
+    """Trade message that counts how often its banner is built"""
+
+    renders = 0
+
+    def banner(self):
+        CountingMessage.renders += 1
+        return super().banner()
+
+
+def make_record():
+    """Trade record shaped like log_trade's JSON output"""
+    return {
+        'timestamp': '2024-01-01T00:00:00',
+        'categories': {'is_unusual': True, 'is_tuna': False, 'is_whale': True, 'is_flow_spike': False},
+        'trade': {
+            'value': 125000.0, 'transaction_hash': '0xtx', 'market_title': 'Will it rain?',
+            'market_id': '0xm', 'market_slug': 'rain', 'event_slug': 'weather', 'market_category': 'Weather',
+            'market_tags': ['Climate'], 'outcome': 'Yes', 'side': 'BUY', 'size': 250000, 'price': 0.5,
+            'trade_timestamp': 1700000000, 'icon': None
+        },
+        'trader': {'wallet': '0xwallet', 'username': 'rainmaker', 'total_trades': 3, 'total_volume': 1500.0,
+                   'markets_traded': 2, 'has_more_trades': False}
+    }
+
+
+def log_record(message, level=logging.INFO, name='polymarket_monitor'):
+    """A log record carrying `message`, as logger.info(message) would create it"""
+    return logging.LogRecord(name, level, __file__, 1, message, None, None)
+
+
+def test_deferred_rendering():
+    """The banner is not built for a disabled level, nor by the queue handler on the calling thread"""
+
+    print("Testing deferred trade message rendering...\n")
+
+    CountingMessage.renders = 0
+    logger = logging.getLogger('test_log_format.quiet')
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+    logger.info(CountingMessage(make_record(), 'WHALE'))
+    assert CountingMessage.renders == 0
+
+    # Enabled, but the queue handler hands the message over unrendered
+    records = queue.Queue()
+    logger.setLevel(logging.INFO)
+    handler = LazyQueueHandler(records)
+    logger.addHandler(handler)
+    try:
+        logger.info(CountingMessage(make_record(), 'WHALE'))
+    finally:
+        logger.removeHandler(handler)
+    record = records.get_nowait()
+    assert isinstance(record.msg, CountingMessage) and CountingMessage.renders == 0
+
+    # The listener renders it once, when a handler formats it
+    TradeLogFormatter('text').format(record)
+    assert CountingMessage.renders == 1
+
+    print("✓ The banner was only built by the formatter")
+
+
+def test_formatters():
+    """Each format renders trade records in its own shape; other records stay plain"""
+
+    print("Testing log formats...\n")
+
+    message = TradeMessage(make_record(), 'WHALE + UNUSUAL')
+
+    text = TradeLogFormatter('text').format(log_record(message))
+    assert ' - INFO - ' in text and 'TRADE DETECTED: $125,000.00 [WHALE + UNUSUAL]' in text
+    assert 'Username: rainmaker' in text and 'Tags: Climate' in text and 'Total Historical Trades: 3\n' in text
+
+    compact = TradeLogFormatter('compact').format(log_record(message))
+    assert '\n' not in compact and compact.endswith(
+        'TRADE $125,000.00 [WHALE + UNUSUAL] BUY Yes "Will it rain?" wallet=0xwallet '
+        'trades=3 volume=$1,500.00 tx=0xtx'
+    )
+    # Records that are not trades are formatted as usual
+    assert TradeLogFormatter('compact').format(log_record('Polling')).endswith(' - INFO - Polling')
+
+    line = TradeLogFormatter('json').format(log_record(message, name='whale_trades'))
+    entry = json.loads(line)
+    assert '\n' not in line
+    assert entry['level'] == 'INFO' and entry['logger'] == 'whale_trades' and entry['label'] == 'WHALE + UNUSUAL'
+    assert entry['trade']['value'] == 125000.0 and entry['trader']['wallet'] == '0xwallet'
+    assert entry['categories']['is_whale'] and 'message' not in entry
+
+    try:
+        raise ValueError('boom')
+    except ValueError:
+        error = logging.LogRecord('polymarket_monitor', logging.ERROR, __file__, 1, 'Failed %s', ('poll',),
+                                  sys.exc_info())
+    entry = json.loads(TradeLogFormatter('json').format(error))
+    assert entry['message'] == 'Failed poll' and entry['level'] == 'ERROR'
+    assert 'ValueError: boom' in entry['exception']
+
+    print("✓ Text, compact and JSON records had the expected shape")
+
+
+if __name__ == "__main__":
+    test_deferred_rendering()
+    test_formatters()
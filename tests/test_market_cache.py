@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+Test the market cache and batched market prefetch with a stub transport (runs offline)
+"""
+
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
+
+import polymarket_monitor
+from polymarket_monitor import MarketCache, PolymarketMonitor
+
+
+class FakeClock:
+    """Stands in for the time module's clocks; only moves when told to"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+class StubTransport:
+    """Answers Gamma /markets requests from a dict of known markets and records them"""
+
+    def __init__(self, markets, failing=()):
+        self.markets = markets
+        self.failing = set(failing)
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_json(self, url, params=None, endpoint=None):
+        ids = params['condition_ids']
+        ids = ids if isinstance(ids, list) else [ids]
+        with self.lock:
+            self.calls.append((endpoint, tuple(ids)))
+        if self.failing.intersection(ids) and endpoint == 'markets_batch':
+            raise requests.exceptions.ConnectionError('reset')
+        return [self.markets[c] for c in ids if c in self.markets]
+
+    def get_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def make_monitor(tmp_path, transport, **settings):
+    """A monitor whose API requests go to the stub transport"""
+    os.environ.update(settings)
+    try:
+        monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    finally:
+        for name in settings:
+            del os.environ[name]
+    monitor.transport = transport
+    return monitor
+
+
+def test_market_cache():
+    """Misses expire after the negative TTL and the least recently used market is evicted"""
+
+    print("Testing market cache...\n")
+
+    clock = FakeClock()
+    real_time, polymarket_monitor.time = polymarket_monitor.time, clock
+    try:
+        cache = MarketCache(max_size=2, ttl=100, negative_ttl=10)
+        cache.put('a', {'conditionId': 'a'})
+        cache.put('b', {'conditionId': 'b'})
+        assert cache.get('a') == (True, {'conditionId': 'a'})
+        cache.put('missing', None)  # evicts b, the least recently used
+        assert cache.get('b') == (False, None) and len(cache) == 2
+        assert cache.get('missing') == (True, None)
+        # Misses are not persisted
+        assert [condition_id for condition_id, _, _ in cache.snapshot()] == ['a']
+
+        clock.now += 11
+        assert cache.get('missing') == (False, None)
+        assert 'a' in cache
+        clock.now += 90
+        assert 'a' not in cache
+    finally:
+        polymarket_monitor.time = real_time
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1 and stats['hits'] == 1 and stats['negative_hits'] == 1 and stats['misses'] == 2
+
+    print("✓ Negative TTL and LRU bound were applied")
+
+
+def test_market_details(tmp_path):
+    """Single lookups are cached, unknown markets as misses"""
+
+    print("Testing market detail lookups...\n")
+
+    transport = StubTransport({'0xm1': {'conditionId': '0xm1', 'question': 'One?'}})
+    monitor = make_monitor(tmp_path, transport)
+    assert monitor.get_market_details('0xm1')['question'] == 'One?'
+    assert monitor.get_market_details('0xm1')['question'] == 'One?'
+    assert monitor.get_market_details('0xunknown') is None
+    assert monitor.get_market_details('0xunknown') is None
+    monitor.close()
+
+    assert transport.calls == [('markets', ('0xm1',)), ('markets', ('0xunknown',))]
+    assert monitor.market_cache.get_stats()['negative_hits'] == 1
+
+    print("✓ Each market was requested once")
+
+
+def test_prefetch_markets(tmp_path):
+    """Distinct uncached markets are requested in batches; a failed batch falls back to single lookups"""
+
+    print("Testing batched market prefetch...\n")
+
+    markets = {f'0xm{i}': {'conditionId': f'0xm{i}'} for i in range(5)}
+    transport = StubTransport(markets, failing={'0xm4'})
+    monitor = make_monitor(tmp_path, transport, MARKET_BATCH_SIZE='2')
+    monitor.market_cache.put('0xcached', {'conditionId': '0xcached'})
+    ids = ['0xm0', '0xm1', '0xm0', '0xm2', '0xcached', '0xm3', '0xgone', '0xm4']
+    monitor.prefetch_markets([{'conditionId': c} for c in ids] + [{'conditionId': None}])
+    monitor.close()
+
+    batches = [ids for endpoint, ids in transport.calls if endpoint == 'markets_batch']
+    singles = sorted(ids[0] for endpoint, ids in transport.calls if endpoint == 'markets')
+    assert batches == [('0xm0', '0xm1'), ('0xm2', '0xm3'), ('0xgone', '0xm4')]
+    # The failed chunk is looked up one market at a time
+    assert singles == ['0xgone', '0xm4']
+    assert all(monitor.market_cache.get(f'0xm{i}') == (True, markets[f'0xm{i}']) for i in range(5))
+    assert monitor.market_cache.get('0xgone') == (True, None)
+
+    print(f"   {len(batches)} batch requests, {len(singles)} single lookups")
+    print("\n✓ Markets were prefetched in batches")
+
+
+if __name__ == "__main__":
+    test_market_cache()
+    test_market_details(Path(tempfile.mkdtemp()))
+    test_prefetch_markets(Path(tempfile.mkdtemp()))
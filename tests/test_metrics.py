@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Test the Prometheus exposition text and the metrics HTTP server (runs offline)
+"""
+
+import json
+import re
+import tempfile
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from polymarket_monitor import LATENCY_BUCKETS, MetricsServer, PolymarketMonitor, render_prometheus
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{.*\})? (\S+)$')
+LABEL = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"(,|$)')
+
+
+def parse_labels(text):
+    """Parse a {name="value",...} label set, undoing the text format's escapes"""
+    if not text:
+        return {}
+    body, labels, position = text[1:-1], {}, 0
+    while position < len(body):
+        match = LABEL.match(body, position)
+        assert match, f"Bad label set {text}"
+        labels[match.group(1)] = re.sub(r'\\(.)', lambda m: '\n' if m.group(1) == 'n' else m.group(1), match.group(2))
+        position = match.end()
+    return labels
+
+
+def parse_exposition(text):
+    """
+    Parse exposition text strictly enough to catch malformed output
+
+    Returns:
+        (metric family -> type, list of (sample name, labels, value))
+    """
+    assert text.endswith('\n')
+    types, helped, samples = {}, set(), []
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            helped.add(line.split(' ', 3)[2])
+        elif line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert name in helped and name not in types and kind in ('counter', 'gauge', 'histogram')
+            types[name] = kind
+        else:
+            match = SAMPLE.match(line)
+            assert match, f"Bad sample line {line!r}"
+            name, labels, value = match.groups()
+            family = name
+            if family not in types:
+                family = re.sub(r'_(bucket|sum|count)$', '', name)
+                assert types.get(family) == 'histogram', f"{name} has no TYPE line"
+            samples.append((name, parse_labels(labels), float(value)))
+    return types, samples
+
+
+def test_render_prometheus(tmp_path):
+    """Every sample belongs to a declared family, and label values survive escaping"""
+
+    print("Testing Prometheus rendering...\n")
+
+    monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    monitor.stage_timer.record('poll', 0.2)
+    monitor.stage_timer.record('poll', 20)
+    metrics = monitor.get_metrics()
+    monitor.close()
+    awkward = 'desk "a"\\b\nc'
+    metrics['profiles'] = {awkward: {'trades': 3, 'unusual': 1, 'tuna': 1, 'whale': 0, 'flow_spike': 0}}
+    metrics['transport'] = {'trades': {'host': 'data-api.polymarket.com', 'requests': 4, 'errors': 1, 'retries': 1,
+                                       'buckets': [0] * len(LATENCY_BUCKETS) + [4], 'total_latency': 48.0}}
+
+    types, samples = parse_exposition(render_prometheus(metrics))
+    values = {(name, tuple(sorted(labels.items()))): value for name, labels, value in samples}
+
+    assert types['polymarket_poll_cycles_total'] == 'counter'
+    assert types['polymarket_dedup_entries'] == 'gauge'
+    assert types['polymarket_stage_duration_seconds'] == 'histogram'
+    assert all(name.endswith('_total') for name, kind in types.items() if kind == 'counter')
+    assert values[('polymarket_profile_trades_total', (('category', 'tuna'), ('profile', awkward)))] == 1
+    endpoint = (('endpoint', 'trades'), ('host', 'data-api.polymarket.com'))
+    assert values[('polymarket_api_errors_total', endpoint)] == 1
+
+    # Histogram buckets are cumulative and end in +Inf, which equals the count
+    buckets = [(labels['le'], value) for name, labels, value in samples
+               if name == 'polymarket_stage_duration_seconds_bucket' and labels['stage'] == 'poll']
+    assert [le for le, _ in buckets] == [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
+    counts = [value for _, value in buckets]
+    assert counts == sorted(counts) and counts[-1] == 2
+    assert values[('polymarket_stage_duration_seconds_count', (('stage', 'poll'),))] == 2
+    assert values[('polymarket_stage_duration_seconds_sum', (('stage', 'poll'),))] == 20.2
+
+    print(f"   {len(types)} metric families, {len(samples)} samples")
+    print("\n✓ The exposition text parsed cleanly")
+
+
+def test_metrics_server(tmp_path):
+    """The server answers /metrics and /metrics.json on a free port, and 404 elsewhere"""
+
+    print("Testing metrics server...\n")
+
+    monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    server = MetricsServer(monitor, port=0)
+    base = f"http://127.0.0.1:{server.port}"
+    try:
+        with urllib.request.urlopen(f"{base}/metrics", timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            types, samples = parse_exposition(response.read().decode())
+        with urllib.request.urlopen(f"{base}/metrics.json?pretty=1", timeout=5) as response:
+            snapshot = json.loads(response.read())
+        try:
+            urllib.request.urlopen(f"{base}/other", timeout=5)
+            raise AssertionError("Unknown path was served")
+        except urllib.error.HTTPError as e:
+            assert e.code == 404
+    finally:
+        server.close()
+        monitor.close()
+
+    assert 'polymarket_uptime_seconds' in types and samples
+    assert snapshot['latency_buckets'] == list(LATENCY_BUCKETS) and 'poll' in snapshot
+
+    print(f"   Scraped {len(samples)} samples from port {server.port}")
+    print("\n✓ Metrics were served over HTTP")
+
+
+if __name__ == "__main__":
+    test_render_prometheus(Path(tempfile.mkdtemp()))
+    test_metrics_server(Path(tempfile.mkdtemp()))
@@ -3,22 +3,25 @@
 Test that the monitor logs when no large trades are found
 """
 
+import tempfile
+from pathlib import Path
+
 from polymarket_monitor import PolymarketMonitor
 import time
 
-def test_no_trades_log():
+def test_no_trades_log(tmp_path):
     """Test the new log message for when no large trades are found"""
     
     print("Testing 'no large trades' log message...\n")
     
     # Create monitor with very high threshold to ensure no trades qualify
-    monitor = PolymarketMonitor(threshold=1000000)  # $1 million threshold
+    monitor = PolymarketMonitor(threshold=1000000, data_dir=str(tmp_path / 'high'))  # $1 million threshold
     
     print(f"Monitor threshold set to: ${monitor.threshold:,.2f}")
     print(f"Fetching trades...\n")
     
     # Fetch recent trades
-    trades = monitor.get_recent_trades(limit=100)
+    trades = monitor.get_recent_trades(limit=100) or []
     
     print(f"Processing {len(trades)} trades...")
     print("Expected: Log message saying 'No transactions over $1,000,000.00 found'\n")
@@ -32,7 +35,7 @@ def test_no_trades_log():
     print("\nNow testing with normal threshold ($5,000)...\n")
     
     # Test with normal threshold
-    monitor2 = PolymarketMonitor(threshold=5000)
+    monitor2 = PolymarketMonitor(threshold=5000, data_dir=str(tmp_path / 'normal'))
     print(f"Monitor threshold set to: ${monitor2.threshold:,.2f}")
     print(f"Processing {len(trades)} trades...")
     print("-" * 80)
@@ -43,5 +46,5 @@ def test_no_trades_log():
     print("\n✓ All tests complete!")
 
 if __name__ == "__main__":
-    test_no_trades_log()
+    test_no_trades_log(Path(tempfile.mkdtemp()))
 
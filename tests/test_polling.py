@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Test watermark pagination of the trade feed, the adaptive poll interval and the dedup window's late-trade floor (runs offline)
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+from polymarket_monitor import AdaptivePollScheduler, DedupWindow, PolymarketMonitor, render_prometheus
+
+
+def make_feed(timestamps):
+    """API-style trades, newest first"""
+    return [{'transactionHash': f'0xtx{ts}', 'size': 1, 'price': 1, 'timestamp': ts}
+            for ts in sorted(timestamps, reverse=True)]
+
+
+def make_monitor(tmp_path, feed, fail_offsets=(), max_pages=10):
+    """Monitor polling a fixed feed in pages of 100; pages at fail_offsets fail to load"""
+    monitor = PolymarketMonitor(data_dir=str(tmp_path))
+    monitor.POLL_PAGE_SIZE = 100
+    monitor.POLL_MAX_PAGES = max_pages
+    requests_made = []
+
+    def get_recent_trades(limit=100, offset=0, min_cash=None):
+        requests_made.append(offset)
+        if offset in fail_offsets:
+            return None
+        return feed[offset:offset + limit]
+
+    monitor.get_recent_trades = get_recent_trades
+    return monitor, requests_made
+
+
+def test_poll_pagination(tmp_path):
+    """Polls page back to the watermark, count a gap at the page cap and never skip a failed page"""
+
+    print("Testing watermark pagination...\n")
+
+    # 250 trades since the watermark at 100, then older ones
+    feed = make_feed(range(1, 351))
+
+    # The first poll fetches one page and sets the watermark
+    monitor, offsets = make_monitor(tmp_path / 'first', feed)
+    assert len(monitor.poll_trades()) == 100 and offsets == [0]
+    assert monitor.poll_watermark == 350
+    monitor.close()
+
+    # Paging stops at the page holding a trade older than the watermark
+    monitor, offsets = make_monitor(tmp_path / 'pages', feed)
+    monitor.poll_watermark = 100
+    trades = monitor.poll_trades()
+    assert offsets == [0, 100, 200] and len(trades) == 300
+    assert monitor.poll_watermark == 350 and monitor.poll_stats['gaps'] == 0
+    monitor.close()
+
+    # Hitting the page cap first is a gap
+    monitor, offsets = make_monitor(tmp_path / 'cap', feed, max_pages=2)
+    monitor.poll_watermark = 100
+    monitor.poll_trades()
+    assert offsets == [0, 100] and monitor.poll_stats['gaps'] == 1
+    monitor.close()
+
+    # A failed page is a gap too, and the watermark stays put so the range is fetched again
+    monitor, offsets = make_monitor(tmp_path / 'failed', feed, fail_offsets={100})
+    monitor.poll_watermark = 100
+    trades = monitor.poll_trades()
+    assert offsets == [0, 100] and len(trades) == 100
+    assert monitor.poll_watermark == 100 and monitor.poll_stats['gaps'] == 1 and monitor.poll_failed
+    monitor.close()
+
+    print("✓ Polls stopped at the watermark and kept it when a page failed")
+
+
+class StubTransport:
+    """Serves /trades from an unfiltered and a cash-filtered feed and records each request's params"""
+
+    def __init__(self, feed, filtered):
+        self.feed = feed
+        self.filtered = filtered
+        self.requests = []
+
+    def get_json(self, url, params=None, endpoint=None):
+        self.requests.append(dict(params))
+        feed = self.filtered if params.get('filterType') == 'CASH' else self.feed
+        return feed[params['offset']:params['offset'] + params['limit']]
+
+    def get_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def test_cash_filter(tmp_path):
+    """Filtered polls ask for trades over the threshold; the first one cuts the backlog at an unfiltered sample"""
+
+    print("Testing cash-filtered polling...\n")
+
+    os.environ['POLL_FILTER'] = 'cash'
+    try:
+        monitor = PolymarketMonitor(threshold=5000.5, data_dir=str(tmp_path))
+    finally:
+        del os.environ['POLL_FILTER']
+    monitor.POLL_PAGE_SIZE = 100
+    # The unfiltered page covers 900-999; the filtered feed reaches back to a backlog at 100
+    filtered = make_feed([950, 920, 500, 100])
+    transport = StubTransport(make_feed(range(900, 1000)), filtered)
+    monitor.transport = transport
+
+    trades = monitor.poll_trades()
+    sample, page = transport.requests
+    assert sample == {'limit': 100, 'offset': 0}
+    # Rounded down so trades exactly at the threshold survive the server's comparison
+    assert page == {'limit': 100, 'offset': 0, 'filterType': 'CASH', 'filterAmount': 5000}
+    assert [t['timestamp'] for t in trades] == [950, 920]
+    # The watermark starts at the newest sampled trade, not the newest qualifying one
+    assert monitor.poll_watermark == 999
+
+    # Later polls only request the filtered feed, back to the watermark
+    filtered.insert(0, make_feed([1010])[0])
+    assert [t['timestamp'] for t in monitor.poll_trades()] == [1010, 950, 920, 500, 100]
+    assert transport.requests[2:] == [{'limit': 100, 'offset': 0, 'filterType': 'CASH', 'filterAmount': 5000}]
+    assert monitor.poll_watermark == 1010
+
+    metrics = monitor.get_metrics()
+    monitor.close()
+    assert metrics['poll']['samples'] == 1 and metrics['poll']['gaps'] == 0
+    assert 'polymarket_poll_samples_total 1\n' in render_prometheus(metrics)
+
+    print(f"   {len(transport.requests)} requests, {metrics['poll']['samples']} unfiltered sample")
+    print("\n✓ The cash filter was sent and the cold start was cut at the sample")
+
+
+def test_adaptive_interval(tmp_path):
+    """The interval shrinks on fresh or failed polls, grows on duplicate ones and stays within its bounds"""
+
+    print("Testing adaptive poll interval...\n")
+
+    scheduler = AdaptivePollScheduler(interval=20, min_interval=5, max_interval=40)
+    # An empty poll says nothing about the trade rate
+    assert scheduler.update(0, 0) == 20
+    # A full page of new trades: polls are falling behind
+    assert scheduler.update(100, 100) == 10
+    # In-between overlap leaves the interval alone
+    assert scheduler.update(100, 50) == 10
+    # Mostly duplicates: requests are wasted
+    assert scheduler.update(100, 10) == 12.5
+    # A gap shrinks the interval whatever the overlap
+    assert scheduler.update(100, 0, gap=True) == 6.25
+    # Clamped at both ends
+    assert scheduler.update(100, 100) == 5 and scheduler.update(100, 100) == 5
+    for _ in range(10):
+        scheduler.update(100, 0)
+    assert scheduler.interval == 40
+    # A starting interval outside the bounds is clamped too
+    assert AdaptivePollScheduler(interval=1, min_interval=5, max_interval=40).interval == 5
+    assert AdaptivePollScheduler(interval=60, min_interval=5, max_interval=40).interval == 40
+
+    # A poll with a failed page counts a gap, which run() passes on
+    monitor, _ = make_monitor(tmp_path, make_feed(range(1, 351)), fail_offsets={100})
+    monitor.poll_watermark = 100
+    gaps = monitor.poll_stats['gaps']
+    trades = monitor.poll_trades()
+    interval = monitor.scheduler.interval
+    assert monitor.scheduler.update(len(trades), 0, gap=monitor.poll_stats['gaps'] > gaps) == max(
+        monitor.scheduler.min_interval, interval * monitor.scheduler.shrink_factor)
+    # A poll that failed outright returned nothing and leaves the interval as it was
+    monitor.get_recent_trades = lambda limit=100, offset=0, min_cash=None: None
+    gaps = monitor.poll_stats['gaps']
+    interval = monitor.scheduler.interval
+    trades = monitor.poll_trades()
+    assert monitor.poll_failed and not trades
+    assert monitor.scheduler.update(len(trades), 0, gap=monitor.poll_stats['gaps'] > gaps) == interval
+    monitor.close()
+
+    print("✓ The interval followed the overlap and stayed within its bounds")
+
+
+def test_dedup_late_trades():
+    """Evicted entries raise a floor; trades at or below it count as late"""
+
+    print("Testing dedup floor...\n")
+
+    window = DedupWindow(window=100, max_entries=10)
+    assert window.add('a', 1000)
+    assert window.add('b', 1200)  # evicts 'a': older than 1200 - 100
+    assert 'a' not in window and window.floor == 1000
+
+    # Trades at or below the floor are dropped as late, even though their keys were forgotten
+    assert not window.add('a', 1000) and not window.add('c', 990)
+    assert window.add('d', 1001)
+    assert window.get_stats()['late'] == 2
+
+    # Only the head of the ring is checked: an older trade behind a newer one is kept
+    # until the entries in front of it are evicted, then the floor jumps past both
+    window = DedupWindow(window=100, max_entries=10)
+    window.add('new', 1200)
+    window.add('old', 1150)
+    window.add('newer', 1290)  # cutoff 1190: 'old' is behind 'new' and survives
+    assert 'old' in window and window.floor is None
+    window.add('newest', 1310)  # cutoff 1210: 'new' goes, and 'old' with it
+    assert 'new' not in window and 'old' not in window and window.floor == 1200
+    assert not window.add('old', 1150)
+
+    # The entry cap evicts oldest first and raises the floor the same way
+    window = DedupWindow(window=10000, max_entries=2)
+    for i, key in enumerate('xyz'):
+        window.add(key, 100 + i)
+    assert 'x' not in window and window.floor == 100 and window.get_stats()['evictions'] == 1
+
+    print("✓ Late trades were dropped at the eviction floor")
+
+
+if __name__ == "__main__":
+    test_poll_pagination(Path(tempfile.mkdtemp()))
+    test_cash_filter(Path(tempfile.mkdtemp()))
+    test_adaptive_interval(Path(tempfile.mkdtemp()))
+    test_dedup_late_trades()
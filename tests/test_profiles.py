@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Test that several monitor profiles share one enrichment per trade (runs offline)
+"""
+
+import json
+import os
+import tempfile
+import threading
+
+from polymarket_monitor import MonitorProfile, PolymarketMonitor
+
+
+def read_records(path):
+    """Records of a JSONL output file, or [] when it was never written"""
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_profiles():
+    """Each trade is looked up once and logged to every profile whose threshold it meets"""
+
+    print("Testing monitor profiles...\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profiles_file = os.path.join(tmp, 'profiles.json')
+        with open(profiles_file, 'w') as f:
+            json.dump([
+                {'name': 'small', 'threshold': 1000, 'tuna_min': 1000, 'tuna_max': 5000, 'whale_min': 5000},
+                {'name': 'large', 'threshold': 50000, 'unusual_trader_threshold': 30}
+            ], f)
+
+        os.environ.update(PROFILES_FILE=profiles_file, OUTPUT_JSONL='true')
+        try:
+            monitor = PolymarketMonitor(threshold=5000, data_dir=tmp)
+        finally:
+            del os.environ['PROFILES_FILE'], os.environ['OUTPUT_JSONL']
+        # The shared screen is the loosest of the profiles
+        assert monitor.threshold == 1000
+        assert monitor.UNUSUAL_TRADER_THRESHOLD == 30
+
+        lookups = []
+
+        def analyze_trader(wallet, trade=None, full_history=True):
+            lookups.append(wallet)
+            return {'wallet': wallet, 'total_trades': 20, 'total_volume': 0, 'markets_traded': 0}
+
+        monitor.analyze_trader = analyze_trader
+        trades = [
+            {'transactionHash': f'0xtx{i}', 'proxyWallet': f'0xwallet{i}', 'size': size, 'price': 1}
+            for i, size in enumerate([500, 2000, 10000, 80000])
+        ]
+        monitor.process_trades(trades)
+        monitor.close()
+        counters = {profile.name: profile.get_stats() for profile in monitor.profiles}
+
+        small = read_records(os.path.join(tmp, 'small', 'trades.json'))
+        large = read_records(os.path.join(tmp, 'large', 'trades.json'))
+        large_unusual = read_records(os.path.join(tmp, 'large', 'unusual_trades.json'))
+        small_whales = read_records(os.path.join(tmp, 'small', 'whale_trades.json'))
+
+    print(f"   {len(lookups)} trader lookups, {len(small)} trades for 'small', {len(large)} for 'large'")
+    assert sorted(lookups) == ['0xwallet1', '0xwallet2', '0xwallet3']
+    assert [r['trade']['value'] for r in small] == [2000, 10000, 80000]
+    assert [r['trade']['value'] for r in large] == [80000]
+    assert all(r['profile'] == 'small' for r in small) and large[0]['profile'] == 'large'
+    assert [r['trade']['value'] for r in small_whales] == [10000, 80000]
+    # 20 previous trades is unusual for 'large' only
+    assert len(large_unusual) == 1 and not any(r['categories']['is_unusual'] for r in small)
+    assert (counters['small']['trades'], counters['small']['whale'], counters['small']['unusual']) == (3, 2, 0)
+    assert (counters['large']['trades'], counters['large']['unusual'], counters['large']['sink']['records']) == (1, 1, 1)
+
+    print("\n✓ Profiles shared the lookups and wrote their own outputs")
+
+
+def test_profile_counters():
+    """Trades counted from several worker threads at once are all counted"""
+
+    print("Testing profile counters under concurrency...\n")
+
+    profile = MonitorProfile('desk', threshold=1000, tuna_min=5000, tuna_max=100000, whale_min=100000,
+                             unusual_trader_threshold=10)
+
+    def worker():
+        for i in range(20000):
+            profile.count_trade(i % 2 == 0, i % 4 == 0, False, True)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stats = profile.get_stats()
+    assert (stats['trades'], stats['unusual'], stats['tuna'], stats['whale'], stats['flow_spike']) == \
+        (160000, 80000, 40000, 0, 160000)
+    assert stats['threshold'] == 1000 and stats['sink'] is None
+
+    print(f"   {stats['trades']} trades counted from {len(threads)} threads")
+    print("\n✓ No counts were lost")
+
+
+if __name__ == "__main__":
+    test_profiles()
+    test_profile_counters()
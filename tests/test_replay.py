@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Test offline replay of recorded trades and wallet histories
+"""
+
+import json
+import os
+import tempfile
+
+from polymarket_monitor import ReplayMonitor
+
+
+def write_jsonl(path, items):
+    """Write one JSON value per line"""
+    with open(path, 'w') as f:
+        for item in items:
+            f.write(json.dumps(item) + '\n')
+
+
+def make_trade(i, wallet, size, timestamp):
+    """Build an API-style trade"""
+    return {
+        'transactionHash': f'0xtx{i}',
+        'proxyWallet': wallet,
+        'conditionId': '0xmarket',
+        'title': 'Test market',
+        'side': 'BUY',
+        'outcome': 'Yes',
+        'size': size,
+        'price': 1,
+        'timestamp': timestamp
+    }
+
+
+def test_replay():
+    """Replayed trades are classified, logged and only see history up to their own time"""
+
+    print("Testing offline replay...\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Two qualifying trades from the same wallet, an hour apart, plus small trades
+        trades = [make_trade(i, f'0xsmall{i}', 10, 1000 + i) for i in range(50)]
+        trades.append(make_trade(100, '0xwhale', 200000, 1100))
+        trades.append(make_trade(101, '0xwhale', 20000, 4700))
+        write_jsonl(os.path.join(tmp, 'trades.jsonl'), trades)
+
+        # The whale's history: 5 trades before the first replayed trade, 20 between the two
+        history = [make_trade(200 + i, '0xwhale', 1, 500 + i) for i in range(5)]
+        history += [make_trade(300 + i, '0xwhale', 1, 2000 + i) for i in range(20)]
+        write_jsonl(os.path.join(tmp, 'history.jsonl'), [history])
+        write_jsonl(os.path.join(tmp, 'markets.jsonl'), [{'conditionId': '0xmarket', 'category': 'Test'}])
+
+        monitor = ReplayMonitor(
+            threshold=5000,
+            poll_interval=30,
+            data_dir=os.path.join(tmp, 'out'),
+            histories=ReplayMonitor.load_histories([os.path.join(tmp, 'history.jsonl')]),
+            markets=ReplayMonitor.load_markets([os.path.join(tmp, 'markets.jsonl')])
+        )
+        monitor.ENRICHMENT_DEPTH = 'full'
+        report = monitor.replay(monitor.read_batches([os.path.join(tmp, 'trades.jsonl')]))
+        monitor.close()
+
+        print(f"   {report['trades']} trades in {report['batches']} batches, "
+              f"{report['trades_per_sec']:,.0f} trades/sec")
+        assert report['trades'] == 52
+        assert report['new_trades'] == 52
+        assert report['logged_trades'] == 2
+        assert {'dedup', 'classify', 'prefetch', 'enrich', 'log'} <= set(report['stages'])
+
+        # The trade store returns newest first
+        records = monitor.trade_store.query()[::-1]
+        monitor.trade_store.close()
+
+    assert [r['trade']['value'] for r in records] == [200000, 20000]
+    # Sizes and prices are written as the feed sent them (ints stay ints)
+    assert [(r['trade']['size'], r['trade']['price']) for r in records] == [(200000, 1), (20000, 1)]
+    assert all(type(r['trade']['size']) is int and type(r['trade']['price']) is int for r in records)
+    assert records[0]['categories']['is_whale'] and records[0]['categories']['is_unusual']
+    assert records[1]['categories']['is_tuna'] and not records[1]['categories']['is_unusual']
+    assert records[0]['trade']['market_category'] == 'Test'
+    # The first lookup must not see the 20 later history trades (5 earlier + the trade itself)
+    assert records[0]['trader']['total_trades'] == 6
+    assert records[1]['trader']['total_trades'] == 27
+
+    print("\n✓ Replay classified and logged trades using point-in-time history")
+
+
+if __name__ == "__main__":
+    test_replay()
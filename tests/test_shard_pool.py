@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Test the sharded pipeline: wallet partitioning and the ordered merge (runs offline)
+"""
+
+import os
+import queue
+import tempfile
+import time
+from pathlib import Path
+
+from polymarket_monitor import PolymarketMonitor, ShardPool, shard_for
+
+
+def echo_worker(shard, shards, threshold, data_dir, tasks, results):
+    """Shard worker stand-in: report which shard handled each trade, shard 0 slowest"""
+    while True:
+        item = tasks.get()
+        if item is None:
+            return
+        seq, trade = item
+        if shard == 0:
+            time.sleep(0.05)
+        stats = {'wallet': trade['proxyWallet'], 'shard': shard, 'total_trades': 50,
+                 'total_volume': 0, 'markets_traded': 0}
+        results.put(('result', seq, stats, None))
+
+
+def crashing_worker(shard, shards, threshold, data_dir, tasks, results):
+    """Shard worker stand-in: shard 1 dies on its first trade, shard 0 never stops putting results"""
+    while True:
+        try:
+            item = tasks.get(timeout=0.05)
+        except queue.Empty:
+            # A result for no pending trade, so the result queue never goes quiet
+            results.put(('result', 0, {}, None))
+            continue
+        if item is None:
+            return
+        if shard == 1:
+            os._exit(1)
+        seq, trade = item
+        results.put(('result', seq, {'wallet': trade['proxyWallet']}, None))
+
+
+def test_shard_merge(tmp_path):
+    """Trades go to the shard owning their wallet and are logged in feed order"""
+
+    print("Testing shard partitioning and ordered merge...\n")
+
+    settings = {'PIPELINE_MODE': 'sharded', 'SHARD_PROCESSES': '2'}
+    os.environ.update(settings)
+    try:
+        monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    finally:
+        for name in settings:
+            del os.environ[name]
+
+    merged = []
+
+    def on_result(trade, trader_stats):
+        merged.append((trade['transactionHash'], trader_stats['shard']))
+        monitor._log_result(trade, trader_stats)
+
+    monitor.prefetch_markets = lambda trades: None
+    monitor.pipeline = ShardPool(
+        processes=monitor.SHARD_PROCESSES, threshold=monitor.threshold, data_dir=monitor.data_dir,
+        on_result=on_result, worker=echo_worker
+    )
+    wallets = [f'0xwallet{i % 5}' for i in range(12)]
+    trades = [
+        {'transactionHash': f'0xtx{i}', 'proxyWallet': wallet, 'size': 5000, 'price': 1, 'timestamp': 1000 + i}
+        for i, wallet in enumerate(wallets)
+    ]
+    monitor.process_trades(trades)
+    assert monitor.pipeline.drain(30)
+    stats = monitor.pipeline.get_stats()
+    monitor.close()
+
+    # Both shards had work, and shard 0's slower results did not reorder the output
+    assert {shard_for(wallet, 2) for wallet in wallets} == {0, 1}
+    assert merged == [(f'0xtx{i}', shard_for(wallet, 2)) for i, wallet in enumerate(wallets)]
+    assert stats['completed'] == 12 and stats['errors'] == 0 and stats['queue_depth'] == 0
+    logged = [record['trade']['transaction_hash'] for record in monitor.trade_store.query()[::-1]]
+    monitor.trade_store.close()
+    assert logged == [f'0xtx{i}' for i in range(12)]
+
+    print(f"   {len(merged)} trades merged in order from {monitor.SHARD_PROCESSES} shards")
+    print("\n✓ Trades were partitioned by wallet and merged in feed order")
+
+
+def test_worker_crash(tmp_path):
+    """A worker that dies is restarted while another shard keeps the result queue busy"""
+
+    print("Testing shard worker restart under load...\n")
+
+    merged = []
+    pool = ShardPool(processes=2, threshold=1000, data_dir=str(tmp_path),
+                     on_result=lambda trade, stats: merged.append(trade['transactionHash']),
+                     worker=crashing_worker, check_interval=0.2)
+    wallets = [f'0xwallet{i % 5}' for i in range(10)]
+    for i, wallet in enumerate(wallets):
+        pool.submit({'transactionHash': f'0xtx{i}', 'proxyWallet': wallet})
+    drained = pool.drain(10)
+    stats = pool.get_stats()
+    pool.close(5)
+
+    crashed = [f'0xtx{i}' for i, wallet in enumerate(wallets) if shard_for(wallet, 2) == 1]
+    assert crashed and drained
+    assert stats['restarts'] >= 1 and stats['errors'] == len(crashed)
+    assert merged == [f'0xtx{i}' for i, wallet in enumerate(wallets) if shard_for(wallet, 2) == 0]
+
+    print(f"   {stats['restarts']} restarts, {len(crashed)} trades lost, {len(merged)} merged")
+    print("\n✓ The dead worker was noticed and its trades released while the other shard kept producing")
+
+
+if __name__ == "__main__":
+    test_shard_merge(Path(tempfile.mkdtemp()))
+    test_worker_crash(Path(tempfile.mkdtemp()))
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Test incremental state checkpoints and warm restarts (runs offline)
+"""
+
+import tempfile
+from pathlib import Path
+
+from polymarket_monitor import DedupWindow, PolymarketMonitor, TraderAggregate
+
+
+def saved_keys(monitor):
+    """Keys of the seen_trades rows in the monitor's state database"""
+    with monitor.state_store.lock:
+        rows = monitor.state_store._connect().execute('SELECT key FROM seen_trades').fetchall()
+    return sorted(key for key, in rows)
+
+
+def test_incremental_checkpoint(tmp_path):
+    """Later checkpoints only write what changed and prune seen trades behind the floor"""
+
+    print("Testing incremental checkpoints...\n")
+
+    monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    monitor.seen_transactions = DedupWindow(window=100)
+    for i in range(3):
+        monitor.seen_transactions.add(f'k{i}', 1000 + i)
+    monitor.trader_cache.store(TraderAggregate('0xa'))
+    monitor.trader_cache.store(TraderAggregate('0xb'))
+    monitor.checkpoint_state()
+    assert saved_keys(monitor) == ['k0', 'k1', 'k2']
+
+    # Only the new entries, the discarded key and the updated trader are handed to the store
+    written = []
+    checkpoint = monitor.state_store.checkpoint
+    monitor.state_store.checkpoint = lambda **state: written.append(state) or checkpoint(**state)
+    monitor.seen_transactions.add('k3', 1050)
+    monitor.seen_transactions.add('k4', 1101)  # evicts k0: floor 1000
+    monitor.seen_transactions.discard(['k3'])
+    monitor.trader_cache.store(TraderAggregate('0xb'))
+    monitor.checkpoint_state()
+    dedup, traders = written[0]['dedup'], written[0]['traders']
+    assert dedup['changes'] and dedup['entries'] == [(1101, 'k4')] and dedup['removed'] == ['k3']
+    assert [data['wallet'] for data in traders] == ['0xb']
+    assert saved_keys(monitor) == ['k1', 'k2', 'k4']
+
+    monitor.seen_transactions.add('k5', 1102)  # evicts k1: floor 1001
+    monitor.checkpoint_state()
+    assert written[1]['dedup']['entries'] == [(1102, 'k5')] and written[1]['traders'] == []
+    assert saved_keys(monitor) == ['k2', 'k4', 'k5']
+    monitor.close()
+
+    # The incremental rows restore the same window, trader aggregates included
+    restarted = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    restarted.seen_transactions = DedupWindow(window=100)
+    restarted.restore_state()
+    assert sorted(restarted.seen_transactions.keys) == ['k2', 'k4', 'k5']
+    assert restarted.state_store.load_trader('0xa') is not None
+    restarted.close()
+
+    print("✓ Checkpoints after the first one wrote only the changes")
+
+
+if __name__ == "__main__":
+    test_incremental_checkpoint(Path(tempfile.mkdtemp()))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Test the streaming and file trade sources against the local API mock (runs offline)
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+import mock_api  # noqa: E402
+from polymarket_monitor import (  # noqa: E402
+    FileTradeSource, PolymarketMonitor, StreamTradeSource, TradeRecord, TradeSource
+)
+
+
+def start_mock(initial_trades):
+    """Start the data-api mock (REST and WebSocket) on a free port"""
+    data = mock_api.MockMarketData(wallets=50, markets=10)
+    data.advance(initial_trades)
+    server = mock_api.make_server(0, data, {}, threading.Lock())
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"127.0.0.1:{server.server_address[1]}"
+
+
+def control(address, query):
+    """Call the mock's WebSocket control endpoint"""
+    with urllib.request.urlopen(f"http://{address}/__ws?{query}", timeout=5) as response:
+        return json.loads(response.read())
+
+
+def collect(source, monitor, seen, expected, timeout=10.0):
+    """Feed batches through dedup until `expected` distinct trades were seen"""
+    deadline = time.monotonic() + timeout
+    while len(seen) < expected and time.monotonic() < deadline:
+        for trade in source.next_batch():
+            if monitor.seen_transactions.add(trade.key, trade.timestamp):
+                seen.add(trade.key)
+
+
+def test_stream_source():
+    """Streamed trades arrive live; trades missed while disconnected are caught up over REST"""
+
+    print("Testing streaming trade source...\n")
+
+    server, address = start_mock(initial_trades=40)
+    with tempfile.TemporaryDirectory() as tmp:
+        monitor = PolymarketMonitor(threshold=5000, data_dir=tmp)
+        monitor.BASE_URL = f"http://{address}"
+        source = StreamTradeSource(monitor, f"ws://{address}/ws", subscribe='{"action": "subscribe"}',
+                                   max_wait=0.1, backoff_base=0.05, backoff_max=0.2)
+        source.start()
+        try:
+            seen = set()
+            # The first batch is a REST poll of the existing feed
+            collect(source, monitor, seen, 40)
+            assert len(seen) == 40
+            assert source.connected.wait(5)
+            # Every (re)connect is followed by a REST catch-up poll
+            source.next_batch()
+
+            # New trades are pushed over the stream
+            server.data.advance(25)
+            collect(source, monitor, seen, 65)
+            assert len(seen) == 65
+            assert source.stats['streamed'] >= 25
+
+            # Trades made while the stream is down come from the REST catch-up
+            control(address, 'accept=0&drop=1')
+            deadline = time.monotonic() + 5
+            while source.connected.is_set() and time.monotonic() < deadline:
+                time.sleep(0.02)
+            server.data.advance(30)
+            control(address, 'accept=1')
+            collect(source, monitor, seen, 95)
+            stats = source.get_stats()
+        finally:
+            source.close()
+            monitor.close()
+            server.shutdown()
+            server.server_close()
+
+    print(f"   {len(seen)} trades, {stats['connects']} connects, {stats['disconnects']} disconnects, "
+          f"{stats['catchups']} catch-up polls")
+    assert len(seen) == 95
+    assert stats['connects'] >= 2 and stats['disconnects'] >= 1
+    assert stats['catchups'] >= 2
+
+    print("\n✓ Stream source reconnected and recovered the trades it missed")
+
+
+class CatchupMonitor:
+    """Stands in for the monitor's REST catch-up: records the watermark each poll starts from"""
+
+    def __init__(self):
+        self.poll_interval = 10
+        self.poll_watermark = None
+        self.poll_failed = False
+        self.fail_next = False
+        self.during_poll = None
+        self.polled_from = []
+
+    def poll_trades(self):
+        self.polled_from.append(self.poll_watermark)
+        self.poll_failed, self.fail_next = self.fail_next, False
+        if self.during_poll is not None:
+            self.during_poll()
+            self.during_poll = None
+        return []
+
+
+def test_stream_watermark():
+    """Streamed trades do not move the watermark past trades dropped before a catch-up succeeded"""
+
+    print("Testing stream watermark after dropped trades...\n")
+
+    monitor = CatchupMonitor()
+    source = StreamTradeSource(monitor, 'ws://127.0.0.1:1/ws', max_wait=0)
+
+    def stream(timestamp):
+        source.queue.put(TradeRecord.from_api({'transactionHash': f'0x{timestamp}', 'size': 1, 'price': 1,
+                                               'timestamp': timestamp}))
+        return source.next_batch()
+
+    def overflow():
+        # What the reader thread does when the buffer is full
+        source.stats['dropped'] += 1
+        source.resync.set()
+
+    assert len(stream(100)) == 1 and monitor.poll_watermark == 100
+
+    # The buffer overflowed and the catch-up failed: later streamed trades leave the watermark alone
+    overflow()
+    monitor.fail_next = True
+    stream(200)
+    assert source.resync.is_set() and monitor.poll_watermark == 100
+    # The retried catch-up pages back to before the drop, then the stream moves the watermark again
+    stream(300)
+    assert monitor.polled_from == [None, 100, 100] and monitor.poll_watermark == 300
+
+    # A drop counted while the catch-up poll runs holds the watermark until the next catch-up
+    overflow()
+    monitor.during_poll = lambda: source.stats.__setitem__('dropped', source.stats['dropped'] + 1)
+    stream(400)
+    assert monitor.poll_watermark == 300
+    source.resync.set()
+    stream(500)
+    assert monitor.polled_from[-1] == 300 and monitor.poll_watermark == 500
+
+    # The base class only leaves next_batch() to the sources
+    try:
+        TradeSource()
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("TradeSource without next_batch() was instantiated")
+
+    print(f"   Catch-up polls started from watermarks {monitor.polled_from}")
+    print("\n✓ The watermark was held until the dropped trades were caught up")
+
+
+def test_file_source():
+    """A file source yields captured batches, then single trades by trade time, then stops"""
+
+    print("Testing file trade source...\n")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'trades.jsonl')
+        with open(path, 'w') as f:
+            f.write(json.dumps([{'transactionHash': '0xa', 'size': 1, 'price': 1, 'timestamp': 100}]) + '\n')
+            for i in range(6):
+                f.write(json.dumps({'transactionHash': f'0x{i}', 'size': 1, 'price': 1, 'timestamp': 200 + 10 * i}) + '\n')
+
+        source = FileTradeSource([path], batch_seconds=30)
+        batches = []
+        while True:
+            batch = source.next_batch()
+            if batch is None:
+                break
+            batches.append([t.timestamp for t in batch])
+
+    assert batches == [[100], [220, 210, 200], [250, 240, 230]]
+    assert source.get_stats()['trades'] == 7
+
+    print("✓ File source replayed the recorded batches")
+
+
+if __name__ == "__main__":
+    test_stream_source()
+    test_stream_watermark()
+    test_file_source()
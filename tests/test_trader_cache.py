@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Test the trader statistics cache: TTL expiry, LRU eviction and folding in new trades (runs offline)
+"""
+
+from polymarket_monitor import TraderAggregate, TraderStatsCache
+
+
+def make_aggregate(wallet, count=3, newest=1000):
+    """Aggregate built from a newest-first history of $10 trades"""
+    history = [
+        {'transactionHash': f'0x{wallet}{i}', 'proxyWallet': wallet, 'conditionId': f'0xm{i % 2}',
+         'size': 10, 'price': 1, 'timestamp': newest - i}
+        for i in range(count)
+    ]
+    return TraderAggregate.from_history(wallet, history, [10.0] * count)
+
+
+def test_ttl_expiry():
+    """An entry past its TTL is returned stale, counted apart from hits and misses"""
+
+    print("Testing trader cache TTL...\n")
+
+    now = [0.0]
+    cache = TraderStatsCache(max_size=10, ttl=100, clock=lambda: now[0])
+    cache.store(make_aggregate('0xa'))
+    stats, aggregate = cache.lookup('0xa')
+    assert stats['total_trades'] == 3 and aggregate is cache.entries['0xa']
+
+    now[0] = 100
+    stats, stale = cache.lookup('0xa')
+    assert stats is None and stale is aggregate
+    assert cache.lookup('0xunknown') == (None, None)
+
+    # Syncing the stale entry refreshes its TTL
+    cache.store(stale, new_trades=[{'transactionHash': '0xnew', 'timestamp': 1050}], new_values=[5.0])
+    assert cache.lookup('0xa')[0]['total_trades'] == 4
+
+    counters = cache.get_stats()
+    assert (counters['hits'], counters['misses'], counters['stale'], counters['syncs']) == (2, 1, 1, 1)
+    assert counters['hit_ratio'] == 0.5 and counters['synced_trades'] == 1
+
+    print("✓ The expired entry was reported stale and synced")
+
+
+def test_lru_eviction():
+    """The least recently looked-up wallet is evicted first; partial aggregates only serve probes"""
+
+    print("Testing trader cache eviction...\n")
+
+    cache = TraderStatsCache(max_size=2, ttl=100, clock=lambda: 0.0)
+    cache.store(make_aggregate('0xa'))
+    cache.store(make_aggregate('0xb'))
+    cache.lookup('0xa')
+    cache.store(make_aggregate('0xc'))
+    assert list(cache.entries) == ['0xa', '0xc'] and cache.get_stats()['evictions'] == 1
+
+    probe = make_aggregate('0xd')
+    probe.partial = True
+    cache.store(probe)
+    assert cache.lookup('0xd') == (None, None)
+    assert cache.lookup('0xd', allow_partial=True)[0]['partial']
+    # Disabled cache keeps nothing
+    disabled = TraderStatsCache(max_size=0)
+    disabled.store(make_aggregate('0xa'))
+    assert len(disabled) == 0
+
+    print("✓ Wallets were evicted least recently used first")
+
+
+def test_fold_repeat_trade():
+    """A fresh hit folds the triggering trade in place, and only once"""
+
+    print("Testing trade folding on cache hits...\n")
+
+    cache = TraderStatsCache(max_size=10, ttl=100, clock=lambda: 0.0)
+    cache.store(make_aggregate('0xa'))
+    cache.snapshot(changes=True)
+    trade = {'transactionHash': '0xfill', 'proxyWallet': '0xa', 'conditionId': '0xm9',
+             'size': 25, 'price': 1, 'timestamp': 1000}
+
+    stats, aggregate = cache.lookup('0xa', trade, 25.0)
+    assert stats['total_trades'] == 4 and stats['total_volume'] == 55 and stats['markets_traded'] == 3
+    assert [data['wallet'] for data in cache.snapshot(changes=True)] == ['0xa']
+
+    # The same trade again (another profile, a re-poll) is already counted
+    stats, same = cache.lookup('0xa', trade, 25.0)
+    assert same is aggregate and stats['total_trades'] == 4 and stats['total_volume'] == 55
+    assert cache.snapshot(changes=True) == []
+    # A trade behind the history's newest one is part of the history
+    older = dict(trade, transactionHash='0xold', timestamp=990)
+    assert cache.lookup('0xa', older, 25.0)[0]['total_trades'] == 4
+
+    print("✓ The repeat trade was folded once")
+
+
+if __name__ == "__main__":
+    test_ttl_expiry()
+    test_lru_eviction()
+    test_fold_repeat_trade()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Test trader history lookups: failed requests are never cached as complete statistics, and tiered probes (runs offline)
+"""
+
+import tempfile
+from pathlib import Path
+
+from polymarket_monitor import PolymarketMonitor, TradeMessage
+
+
+def make_history(count, newest=10000):
+    """API-style history of a wallet, newest first"""
+    return [
+        {'transactionHash': f'0xtx{i}', 'proxyWallet': '0xwallet', 'conditionId': f'0xm{i % 3}',
+         'side': 'BUY', 'size': 10, 'price': 1, 'timestamp': newest - i}
+        for i in range(count)
+    ]
+
+
+def stub_history(monitor, history, fail_offsets=()):
+    """Serve a wallet's history from a list; pages at fail_offsets fail to load"""
+    requests_made = []
+
+    def get_user_trade_history(wallet_address, limit=500, offset=0):
+        requests_made.append(offset)
+        if offset in fail_offsets:
+            return None
+        return history[offset:offset + limit]
+
+    monitor.get_user_trade_history = get_user_trade_history
+    return requests_made
+
+
+class StubTransport:
+    """Serves wallet histories for /trades?user= requests and records their limit and offset"""
+
+    def __init__(self, histories):
+        self.histories = histories
+        self.requests = []
+
+    def get_json(self, url, params=None, endpoint=None):
+        assert endpoint == 'user_trades'
+        limit, offset = params['limit'], params.get('offset', 0)
+        self.requests.append((params['user'], limit, offset))
+        return self.histories.get(params['user'], [])[offset:offset + limit]
+
+    def get_stats(self):
+        return {}
+
+    def close(self):
+        pass
+
+
+def test_failed_sync(tmp_path):
+    """A stale wallet whose sync fails is served once from the old aggregate and dropped"""
+
+    print("Testing failed incremental sync...\n")
+
+    monitor = PolymarketMonitor(data_dir=str(tmp_path))
+    history = make_history(3)
+    stub_history(monitor, history)
+    assert monitor.analyze_trader('0xwallet')['total_trades'] == 3
+
+    # Expire the entry; two new trades were made but the sync request fails
+    monitor.trader_cache.entries['0xwallet'].expires = 0
+    stub_history(monitor, make_history(2, newest=20000) + history, fail_offsets={0})
+    stats = monitor.analyze_trader('0xwallet')
+    assert stats['total_trades'] == 3
+    assert '0xwallet' not in monitor.trader_cache.entries
+
+    # The next lookup fetches the history again instead of serving the old figures
+    stub_history(monitor, make_history(2, newest=20000) + history)
+    assert monitor.analyze_trader('0xwallet')['total_trades'] == 5
+    monitor.close()
+
+    print("✓ The failed sync did not refresh the cached statistics")
+
+
+def test_failed_history_page(tmp_path):
+    """A full history with a page that failed to load is marked partial, not exact"""
+
+    print("Testing failed history page...\n")
+
+    monitor = PolymarketMonitor(data_dir=str(tmp_path))
+    monitor.HISTORY_FULL_PAGINATION = True
+    monitor.HISTORY_PARALLEL_PAGES = 2
+    history = make_history(1200)
+
+    offsets = stub_history(monitor, history, fail_offsets={500})
+    stats = monitor.analyze_trader('0xwallet')
+    assert sorted(offsets) == [0, 500, 1000]
+    assert stats['total_trades'] == 700 and stats['has_more_trades'] and stats['partial']
+
+    # A full lookup does not accept the partial aggregate and fetches the history again
+    offsets = stub_history(monitor, history)
+    stats = monitor.analyze_trader('0xwallet')
+    assert sorted(offsets) == [0, 500, 1000]
+    assert stats['total_trades'] == 1200 and not stats['has_more_trades'] and 'partial' not in stats
+    monitor.close()
+
+    print("✓ The incomplete history was not cached as exact")
+
+
+def test_tiered_enrichment(tmp_path):
+    """Non-whale trades probe UNUSUAL_TRADER_THRESHOLD + 1 trades; whale trades fetch the full history"""
+
+    print("Testing tiered enrichment...\n")
+
+    monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    limit = monitor.UNUSUAL_TRADER_THRESHOLD + 1
+    transport = StubTransport({'0xactive': make_history(30), '0xnew': make_history(limit - 3)})
+    monitor.transport = transport
+
+    def trade(wallet, value):
+        return {'transactionHash': f'0x{wallet}{value}', 'proxyWallet': wallet, 'size': value, 'price': 1,
+                'timestamp': 20000}
+
+    # An active wallet's probe is a lower bound (the triggering trade is folded in on top)
+    active = monitor.enrich_trade(trade('0xactive', 10000))
+    assert transport.requests == [('0xactive', limit, 0)]
+    assert active['total_trades'] == limit + 1 and active['has_more_trades'] and active['partial']
+    # A wallet with fewer trades than the probe limit is fully known
+    fresh = monitor.enrich_trade(trade('0xnew', 10000))
+    assert transport.requests[-1] == ('0xnew', limit, 0)
+    assert fresh['total_trades'] == limit - 2 and not fresh['has_more_trades'] and not fresh.get('partial')
+
+    # A whale trade does not settle for the cached probe and fetches the full history
+    whale = monitor.enrich_trade(trade('0xactive', monitor.WHALE_MIN))
+    assert transport.requests[-1] == ('0xactive', 500, 0)
+    assert whale['total_trades'] == 31 and not whale['has_more_trades'] and 'partial' not in whale
+
+    monitor.log_trade(trade('0xactive', 10000), active)
+    monitor.log_trade(trade('0xnew', 10000), fresh)
+    monitor.close()
+    records = {r['trader']['wallet']: r for r in monitor.trade_store.query()}
+    monitor.trade_store.close()
+
+    # The probe is shown as "N+" over "the last N trades"; an exact count is shown as is
+    probed = TradeMessage(records['0xactive'], 'TUNA')
+    assert f"Total Historical Trades: {limit + 1}+\n" in probed.banner()
+    assert f"(last {limit + 1} trades)" in probed.banner() and f"trades={limit + 1}+ " in probed.compact()
+    assert not records['0xactive']['categories']['is_unusual']
+    exact = TradeMessage(records['0xnew'], 'TUNA + UNUSUAL')
+    assert f"Total Historical Trades: {limit - 2}\n" in exact.banner()
+    assert '(last' not in exact.banner() and f"trades={limit - 2} " in exact.compact()
+    assert records['0xnew']['categories']['is_unusual']
+
+    print(f"   Requests: {transport.requests}")
+    print("\n✓ Probes were limited and labelled, whale trades got the full history")
+
+
+if __name__ == "__main__":
+    test_failed_sync(Path(tempfile.mkdtemp()))
+    test_failed_history_page(Path(tempfile.mkdtemp()))
+    test_tiered_enrichment(Path(tempfile.mkdtemp()))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Test the staged pipeline's work queue: priority order, backpressure and the
+drain timeout (runs offline)
+"""
+
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from polymarket_monitor import BloomDedup, PolymarketMonitor, WorkQueue, trade_key
+
+
+def blocked_queue(**options):
+    """A one-worker queue whose worker is held until the returned event is set"""
+    work_queue = WorkQueue(workers=1, **options)
+    gate = threading.Event()
+    started = threading.Event()
+
+    def hold():
+        started.set()
+        gate.wait()
+
+    work_queue.submit(0, hold)
+    started.wait(5)
+    return work_queue, gate
+
+
+def test_priority_order():
+    """Whale-sized tasks run before smaller ones, equal priorities in submission order"""
+
+    print("Testing work queue priority order...\n")
+
+    work_queue, gate = blocked_queue()
+    ran = []
+    for name, priority in [('tuna-1', 1), ('whale-1', 0), ('tuna-2', 1), ('prefetch', -1), ('whale-2', 0)]:
+        work_queue.submit(priority, ran.append, name)
+    gate.set()
+    assert work_queue.drain(5)
+    assert work_queue.close() == []
+
+    assert ran == ['prefetch', 'whale-1', 'whale-2', 'tuna-1', 'tuna-2']
+    assert work_queue.get_stats()['completed'] == 6
+
+    print("✓ Tasks ran in priority order")
+
+
+def test_backpressure():
+    """A full queue blocks the submitter until a worker takes a task"""
+
+    print("Testing work queue backpressure...\n")
+
+    work_queue, gate = blocked_queue(queue_size=1)
+    work_queue.submit(1, lambda: None)
+    submitted = threading.Event()
+
+    def submit():
+        work_queue.submit(1, lambda: None)
+        submitted.set()
+
+    producer = threading.Thread(target=submit)
+    producer.start()
+    assert not submitted.wait(0.3)
+    assert work_queue.get_stats()['backpressure'] == 1
+
+    gate.set()
+    assert submitted.wait(5)
+    producer.join()
+    work_queue.close()
+    assert work_queue.get_stats()['completed'] == 3
+
+    print("✓ The producer waited for the workers")
+
+
+def test_drain_timeout():
+    """Tasks still queued after the drain timeout are discarded and handed back"""
+
+    print("Testing work queue drain timeout...\n")
+
+    work_queue, gate = blocked_queue()
+    for i in range(3):
+        work_queue.submit(1, print, f'task {i}')
+    threading.Timer(0.3, gate.set).start()
+    discarded = work_queue.close(timeout=0.1)
+
+    assert discarded == [(print, (f'task {i}',)) for i in range(3)]
+    stats = work_queue.get_stats()
+    assert stats['discarded'] == 3 and stats['completed'] == 1 and stats['workers'] == 0
+
+    print("✓ Queued tasks were discarded and returned")
+
+
+def test_discarded_trades_released(tmp_path):
+    """Trades discarded at shutdown are not checkpointed as seen, so a restart reports them"""
+
+    print("Testing release of discarded trades...\n")
+
+    settings = {'PIPELINE_MODE': 'staged', 'ENRICHMENT_CONCURRENCY': '1', 'PIPELINE_DRAIN_TIMEOUT': '0.1'}
+    os.environ.update(settings)
+    try:
+        monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    finally:
+        for name in settings:
+            del os.environ[name]
+
+    gate = threading.Event()
+
+    def analyze_trader(wallet, trade=None, full_history=True):
+        gate.wait()
+        return {'wallet': wallet, 'total_trades': 50, 'total_volume': 0, 'markets_traded': 0}
+
+    monitor.prefetch_markets = lambda trades: None
+    monitor.analyze_trader = analyze_trader
+    trades = [
+        {'transactionHash': f'0xtx{i}', 'proxyWallet': f'0xwallet{i}', 'size': 5000, 'price': 1,
+         'timestamp': 1000 + i}
+        for i in range(4)
+    ]
+    monitor.process_trades(trades)
+    monitor.poll_watermark = 1003
+    # The first trade is held by the worker; the other three are still queued at shutdown
+    time.sleep(0.2)
+    threading.Timer(0.3, gate.set).start()
+    monitor.drain_pipeline()
+    monitor.checkpoint_state()
+    monitor.close()
+
+    restarted = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    restarted.restore_state()
+    keys = [trade_key(trade) for trade in trades]
+    assert keys[0] in restarted.seen_transactions
+    assert not any(key in restarted.seen_transactions for key in keys[1:])
+    assert restarted.poll_watermark == 1001
+    restarted.close()
+
+    # The Bloom filter cannot clear bits; released keys are let through once
+    bloom = BloomDedup(capacity=100)
+    assert bloom.add('a', 1) and bloom.add('b', 2)
+    assert bloom.discard(['a', 'c']) == 1 and 'a' not in bloom
+    bloom_copy = BloomDedup(capacity=100)
+    bloom_copy.restore(bloom.snapshot())
+    assert bloom_copy.add('a', 1) and not bloom_copy.add('a', 1) and not bloom_copy.add('b', 2)
+
+    print("✓ Discarded trades were released from the dedup window and watermark")
+
+
+def test_release_transaction_keys(tmp_path):
+    """With DEDUP_KEY=transaction released trades are forgotten by transaction hash"""
+
+    print("Testing release with transaction dedup keys...\n")
+
+    os.environ['DEDUP_KEY'] = 'transaction'
+    try:
+        monitor = PolymarketMonitor(threshold=1000, data_dir=str(tmp_path))
+    finally:
+        del os.environ['DEDUP_KEY']
+
+    trades = [
+        {'transactionHash': f'0xtx{i}', 'proxyWallet': '0xwallet', 'size': 10, 'price': 1, 'timestamp': 1000 + i}
+        for i in range(3)
+    ]
+    assert monitor.process_trades(trades) == 3
+    monitor.release_trades(trades[1:])
+    assert '0xtx0' in monitor.seen_transactions
+    assert '0xtx1' not in monitor.seen_transactions and '0xtx2' not in monitor.seen_transactions
+    # Only the released trades count as new when they are fetched again
+    assert monitor.process_trades(trades) == 2
+    monitor.close()
+
+    print("✓ Released trades were new again")
+
+
+if __name__ == "__main__":
+    test_priority_order()
+    test_backpressure()
+    test_drain_timeout()
+    test_discarded_trades_released(Path(tempfile.mkdtemp()))
+    test_release_transaction_keys(Path(tempfile.mkdtemp()))